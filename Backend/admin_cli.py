@@ -0,0 +1,249 @@
+# admin_cli.py
+# Admin CLI for the database named by DATABASE_URL (replaces the old view_data.py dump).
+# Rows are streamed with server-side cursors (`yield_per`) and written batch by batch, so memory
+# stays bounded whatever the table size; aggregates are computed by the database.
+#   python admin_cli.py show [--user a@example.com]
+#   python admin_cli.py export --format jsonl|csv|parquet --out emails.jsonl [--since 2025-01-01] [--until 2025-02-01] [--user ...] [--no-body]
+#   python admin_cli.py stats [--since ...] [--top 20] [--json]
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from models import EmailRequest, User
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("jsonl", "csv", "parquet")
+EXPORT_COLUMNS = ("id", "user_id", "user_email", "tone", "length", "prompt", "created_at", "generated_email")
+
+
+def email_filters(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  users: Sequence[str] = ()) -> list:
+    """WHERE clauses on email_requests; `until` is exclusive. Users are matched by address."""
+    conditions = []
+    if since is not None:
+        conditions.append(EmailRequest.created_at >= since)
+    if until is not None:
+        conditions.append(EmailRequest.created_at < until)
+    if users:
+        conditions.append(EmailRequest.user_id.in_(select(User.id).where(User.email.in_(users))))
+    return conditions
+
+
+def iter_email_batches(db: Session, conditions: list, batch_size: int, body: bool = True) -> Iterator[List[Any]]:
+    """Email rows (EXPORT_COLUMNS, minus the body with body=False) in id order, one batch of
+    `batch_size` rows at a time. Plain column rows: no ORM identity map, no lazy loads."""
+    columns = [EmailRequest.id, EmailRequest.user_id, User.email.label("user_email"), EmailRequest.tone,
+               EmailRequest.length, EmailRequest.prompt, EmailRequest.created_at]
+    if body:
+        columns.append(EmailRequest.generated_email)
+    stmt = (
+        select(*columns)
+        .join(User, User.id == EmailRequest.user_id)
+        .where(*conditions)
+        .order_by(EmailRequest.id)
+        .execution_options(yield_per=batch_size)  # a server-side cursor on PostgreSQL/MySQL
+    )
+    yield from db.execute(stmt).partitions()
+
+
+def _open(path: str, binary: bool):
+    if path == "-":
+        return sys.stdout.buffer if binary else sys.stdout
+    return open(path, "wb") if binary else open(path, "w", newline="", encoding="utf-8")
+
+
+def write_jsonl(batches: Iterator[List[Any]], path: str) -> int:
+    from responses import dumps
+
+    rows = 0
+    out = _open(path, binary=True)
+    try:
+        for batch in batches:
+            out.write(b"".join(dumps(row._asdict()) + b"\n" for row in batch))
+            rows += len(batch)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return rows
+
+
+def write_csv(batches: Iterator[List[Any]], path: str, columns: Sequence[str]) -> int:
+    rows = 0
+    out = _open(path, binary=False)
+    try:
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return rows
+
+
+def write_parquet(batches: Iterator[List[Any]], path: str, columns: Sequence[str]) -> int:
+    """One row group per batch (pip install pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet export needs pyarrow (pip install pyarrow)")
+    if path == "-":
+        raise SystemExit("Parquet export needs --out FILE")
+    types = {"id": pa.int64(), "user_id": pa.int64(), "created_at": pa.timestamp("us")}
+    schema = pa.schema([(name, types.get(name, pa.string())) for name in columns])
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in batches:
+            data = {name: [row[i] for row in batch] for i, name in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def export(db: Session, fmt: str, path: str, conditions: list, batch_size: int, body: bool = True) -> int:
+    columns = EXPORT_COLUMNS if body else EXPORT_COLUMNS[:-1]
+    batches = iter_email_batches(db, conditions, batch_size, body)
+    if fmt == "jsonl":
+        return write_jsonl(batches, path)
+    if fmt == "csv":
+        return write_csv(batches, path, columns)
+    return write_parquet(batches, path, columns)
+
+
+def show(db: Session, conditions: list, users: Sequence[str], batch_size: int, out=sys.stdout) -> int:
+    """The old view_data.py listing, as one ordered stream of user+email rows (the history index
+    serves the order). Batched selectinload of User.emails still holds every email of a batch of
+    users at once, which is what made the old dump take gigabytes."""
+    stmt = (
+        select(User.id, User.name, User.email, User.created_at, User.is_verified,
+               EmailRequest.prompt, EmailRequest.generated_email, EmailRequest.created_at.label("email_created_at"))
+        .outerjoin(EmailRequest, and_(EmailRequest.user_id == User.id, *conditions))
+        .order_by(User.id, EmailRequest.created_at, EmailRequest.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if users:
+        stmt = stmt.where(User.email.in_(users))
+    count, current = 0, None
+    for row in db.execute(stmt):
+        if row.id != current:
+            current, count = row.id, count + 1
+            out.write(f"\nUser: {row.name} ({row.email})\nCreated at: {row.created_at}\n"
+                      f"Verified: {row.is_verified}\nGenerated Emails:\n")
+        if row.prompt is not None:
+            out.write(f"  - Prompt: {row.prompt}\n    → Generated: {row.generated_email}\n"
+                      f"    Created at: {row.email_created_at}\n")
+    return count
+
+
+def stats(db: Session, conditions: list, top: int = 20) -> Dict[str, Any]:
+    """Emails per user, tone/length mix and volume per day, each a single GROUP BY."""
+    per_user = (
+        select(EmailRequest.user_id, func.count().label("emails"))
+        .where(*conditions)
+        .group_by(EmailRequest.user_id)
+        .subquery()
+    )
+    emails, active, average, most = db.execute(
+        select(func.coalesce(func.sum(per_user.c.emails), 0), func.count(), func.avg(per_user.c.emails),
+               func.max(per_user.c.emails)).select_from(per_user)
+    ).one()
+    top_users = db.execute(
+        select(User.email, per_user.c.emails)
+        .join(per_user, per_user.c.user_id == User.id)
+        .order_by(per_user.c.emails.desc(), User.id)
+        .limit(top)
+    ).all()
+    mix = db.execute(
+        select(EmailRequest.tone, EmailRequest.length, func.count())
+        .where(*conditions)
+        .group_by(EmailRequest.tone, EmailRequest.length)
+        .order_by(EmailRequest.tone, EmailRequest.length)
+    ).all()
+    day = func.date(EmailRequest.created_at)
+    per_day = db.execute(select(day, func.count()).where(*conditions).group_by(day).order_by(day)).all()
+    return {
+        "users": db.scalar(select(func.count()).select_from(User)),
+        "active_users": active,
+        "emails": int(emails),
+        "emails_per_user": {"avg": round(float(average or 0), 2), "max": most or 0},
+        "top_users": [{"email": email, "emails": n} for email, n in top_users],
+        "tone_length": [{"tone": tone, "length": length, "emails": n} for tone, length, n in mix],
+        "per_day": [{"day": str(d), "emails": n} for d, n in per_day],
+    }
+
+
+def _print_stats(result: Dict[str, Any], out=sys.stdout) -> None:
+    per_user = result["emails_per_user"]
+    out.write(f"Users: {result['users']} ({result['active_users']} with emails)\n"
+              f"Emails: {result['emails']} (avg {per_user['avg']} per active user, max {per_user['max']})\n")
+    out.write("\nTop users:\n")
+    for row in result["top_users"]:
+        out.write(f"  {row['emails']:>10}  {row['email']}\n")
+    out.write("\nTone / length:\n")
+    for row in result["tone_length"]:
+        out.write(f"  {row['emails']:>10}  {row['tone']:<13} {row['length']}\n")
+    out.write("\nPer day:\n")
+    for row in result["per_day"]:
+        out.write(f"  {row['day']}  {row['emails']:>10}\n")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument("--since", type=datetime.fromisoformat, help="created_at >= this (ISO date or datetime)")
+    filters.add_argument("--until", type=datetime.fromisoformat, help="created_at < this")
+    filters.add_argument("--user", action="append", default=[], help="user email; repeat for several")
+    filters.add_argument("--batch-size", type=int, default=2000, help="rows per fetch and per written batch")
+
+    parser = argparse.ArgumentParser(description="Inspect and export the email database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", parents=[filters], help="print users and their emails")
+    export_parser = commands.add_parser("export", parents=[filters], help="stream emails to JSONL, CSV or Parquet")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    export_parser.add_argument("--out", default="-", help="file path, or - for stdout")
+    export_parser.add_argument("--no-body", action="store_true", help="skip generated_email (no decompression)")
+    stats_parser = commands.add_parser("stats", parents=[filters], help="aggregate counts computed in SQL")
+    stats_parser.add_argument("--top", type=int, default=20)
+    stats_parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal
+
+    conditions = email_filters(args.since, args.until, args.user)
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        if args.command == "show":
+            count = show(db, conditions, args.user, args.batch_size)
+            logger.info(f"✅ Listed {count} users in {time.perf_counter() - start:.1f}s")
+        elif args.command == "export":
+            rows = export(db, args.format, args.out, conditions, args.batch_size, body=not args.no_body)
+            logger.info(f"📤 Exported {rows} emails as {args.format} to {args.out} in {time.perf_counter() - start:.1f}s")
+        else:
+            result = stats(db, conditions, args.top)
+            if args.json:
+                print(json.dumps(result, indent=2))
+            else:
+                _print_stats(result)
+    except BrokenPipeError:
+        # Piped into `head` and the reader left: stop quietly, as other CLI tools do.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+# admission.py
+# Admission control in front of the LLM: a per-user token bucket on generation requests,
+# a global cap on concurrent upstream generations (plus a per-user share of it), and a
+# fair queue that hands freed slots to waiting users round-robin, with a bounded wait.
+# Rejections raise AdmissionRejected, which main.py turns into 429 + Retry-After.
+# Buckets and slots live in a store: in-process by default, or Redis so that several
+# uvicorn workers share one budget (each worker still round-robins its own waiters).
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from settings import load_env
+
+from llm_client import llm
+from metrics import Counter, Gauge, Histogram
+
+load_env()
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED         = os.getenv("ADMISSION_ENABLED", "true").lower() in {"1", "true", "yes"}
+ADMISSION_STORE           = os.getenv("ADMISSION_STORE", "memory").lower()  # memory | redis
+ADMISSION_REDIS_URL       = os.getenv("ADMISSION_REDIS_URL", "redis://localhost:6379/0")
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 0))  # 0 = the LLM backends' total capacity
+ADMISSION_MAX_QUEUE       = int(os.getenv("ADMISSION_MAX_QUEUE", 256))
+ADMISSION_MAX_WAIT        = float(os.getenv("ADMISSION_MAX_WAIT", 30))
+ADMISSION_LEASE_SECONDS   = float(os.getenv("ADMISSION_LEASE_SECONDS", 300))  # shared store: slots of dead workers expire
+ADMISSION_POLL_INTERVAL   = float(os.getenv("ADMISSION_POLL_INTERVAL", 0.05))  # shared store: recheck for remote releases
+USER_RATE_PER_MIN         = float(os.getenv("USER_RATE_PER_MIN", 30))  # 0 disables the rate limit
+USER_BURST                = float(os.getenv("USER_BURST", 10))
+USER_MAX_CONCURRENCY      = int(os.getenv("USER_MAX_CONCURRENCY", 4))  # 0 = no per-user cap
+USER_MAX_QUEUED           = int(os.getenv("USER_MAX_QUEUED", 32))
+
+ADMISSION_DECISIONS = Counter("admission_decisions_total", "Admission outcomes by reason.", ("outcome",))
+ADMISSION_WAIT = Histogram("admission_wait_seconds", "Time queued for an LLM slot.")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class MemoryAdmissionStore:
+    """Per-process state; only touched from the event loop, so no locking."""
+
+    name = "memory"
+    shared = False
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # user -> (tokens, updated_at)
+        self._holders: Dict[str, str] = {}  # holder -> user
+        self._per_user: Dict[str, int] = {}
+
+    async def take(self, user: str, rate: float, burst: float, cost: float, force: bool = False) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(user, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1 and not force:
+            self._buckets[user] = (tokens, now)
+            return (1 - tokens) / rate
+        self._buckets[user] = (max(-burst, tokens - cost), now)
+        if len(self._buckets) > 10000:
+            self._prune(now, rate, burst)
+        return 0.0
+
+    def _prune(self, now: float, rate: float, burst: float) -> None:
+        for user, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[user]
+
+    async def try_acquire(self, user: str, holder: str, limit: int, user_limit: int) -> Optional[str]:
+        """None when the slot was taken, else which cap is full ("global" or "user")."""
+        if len(self._holders) >= limit:
+            return "global"
+        if user_limit and self._per_user.get(user, 0) >= user_limit:
+            return "user"
+        self._holders[holder] = user
+        self._per_user[user] = self._per_user.get(user, 0) + 1
+        return None
+
+    async def release(self, user: str, holder: str) -> None:
+        if self._holders.pop(holder, None) is None:
+            return
+        remaining = self._per_user.get(user, 1) - 1
+        if remaining:
+            self._per_user[user] = remaining
+        else:
+            self._per_user.pop(user, None)
+
+    async def in_flight(self) -> int:
+        return len(self._holders)
+
+
+_TAKE = """
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = math.min(burst, (tonumber(state[1]) or burst) + (now - (tonumber(state[2]) or now)) * rate)
+local retry = 0
+if tokens < 1 and ARGV[5] ~= '1' then retry = (1 - tokens) / rate else tokens = math.max(-burst, tokens - cost) end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 60)
+return tostring(retry)
+"""
+
+_ACQUIRE = """
+local now, expires = ARGV[4], ARGV[5]
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then return 'global' end
+if tonumber(ARGV[3]) > 0 and redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[3]) then return 'user' end
+redis.call('ZADD', KEYS[1], expires, ARGV[1])
+redis.call('ZADD', KEYS[2], expires, ARGV[1])
+redis.call('EXPIRE', KEYS[2], math.ceil(tonumber(expires) - tonumber(now)))
+return 'ok'
+"""
+
+
+class RedisAdmissionStore:
+    """Buckets and slot leases shared by every worker. Slots are sorted-set members scored by
+    lease expiry, so a worker that dies without releasing only holds them for the lease."""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, lease: float, prefix: str = "adm:"):
+        import redis.asyncio as redis  # optional dependency
+
+        self.lease = lease
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE)
+        self._acquire = self._redis.register_script(_ACQUIRE)
+
+    async def take(self, user: str, rate: float, burst: float, cost: float, force: bool = False) -> float:
+        retry = await self._take(keys=[f"{self.prefix}bucket:{user}"],
+                                 args=[rate, burst, cost, time.time(), "1" if force else "0"])
+        return float(retry)
+
+    async def try_acquire(self, user: str, holder: str, limit: int, user_limit: int) -> Optional[str]:
+        now = time.time()
+        result = await self._acquire(
+            keys=[f"{self.prefix}slots", f"{self.prefix}slots:{user}"],
+            args=[holder, limit, user_limit, now, now + self.lease],
+        )
+        result = result.decode() if isinstance(result, bytes) else result
+        return None if result == "ok" else result
+
+    async def release(self, user: str, holder: str) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            await pipe.zrem(f"{self.prefix}slots", holder).zrem(f"{self.prefix}slots:{user}", holder).execute()
+
+    async def in_flight(self) -> int:
+        return await self._redis.zcount(f"{self.prefix}slots", time.time(), "+inf")
+
+
+class _Waiter:
+    __slots__ = ("user", "holder", "future", "enqueued_at")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.holder = uuid.uuid4().hex
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class Ticket:
+    """A held slot; `release()` is idempotent so a streamed response can call it from several exits."""
+
+    def __init__(self, controller: "AdmissionController" = None, user: str = "", holder: str = ""):
+        self.controller = controller
+        self.user = user
+        self.holder = holder
+        self.acquired_at = time.monotonic()
+
+    async def release(self) -> None:
+        controller, self.controller = self.controller, None
+        if controller is not None:
+            controller._observe_hold(time.monotonic() - self.acquired_at)
+            await controller.release(self.user, self.holder)
+
+
+class AdmissionController:
+    """Per-user rate limit, global + per-user concurrency caps and a round-robin wait queue.
+
+    `check_rate(user)` is called once per generation request (a batch is checked with no cost
+    and `charge`s each item that reaches the LLM); `slot(user)` wraps each upstream call.
+    A freed slot goes to the next user in rotation, not the next request, so one user's
+    burst (or a big batch) cannot starve everyone else.
+    """
+
+    def __init__(self, store, max_concurrency: int):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._rotation: Deque[str] = deque()
+        self._waiting = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._hold_ewma = 1.0  # seconds a slot is held, for Retry-After estimates
+        self._user_limits: Dict[str, int] = {}
+
+    def set_user_limit(self, user: Any, limit: int) -> None:
+        """Override USER_MAX_CONCURRENCY for one identity (e.g. the offline job worker)."""
+        self._user_limits[str(user)] = limit
+
+    def _retry_after(self) -> float:
+        return self._hold_ewma * (self._waiting + 1) / max(1, self.max_concurrency)
+
+    async def check_rate(self, user: Any, cost: float = 1.0) -> None:
+        """Charge `cost` generations to the user's bucket; raises AdmissionRejected when it is empty.
+        A request is admitted whenever a token is left, so a larger cost runs the bucket into
+        debt, but never below -USER_BURST: the longest lockout is two bursts' worth of refill."""
+        if not ADMISSION_ENABLED or USER_RATE_PER_MIN <= 0:
+            return
+        try:
+            retry_after = await self.store.take(str(user), USER_RATE_PER_MIN / 60, USER_BURST, cost)
+        except Exception as e:
+            logger.warning(f"[ADMISSION ERROR] rate check: {e}")  # fail open
+            return
+        if retry_after > 0:
+            ADMISSION_DECISIONS.labels("rate_limited").inc()
+            raise AdmissionRejected("Rate limit exceeded", retry_after)
+
+    async def charge(self, user: Any, cost: float = 1.0) -> None:
+        """Debit a generation that was already admitted (a batch item that reached the LLM);
+        never rejects, and the bucket stops at -USER_BURST like check_rate."""
+        if not ADMISSION_ENABLED or USER_RATE_PER_MIN <= 0:
+            return
+        try:
+            await self.store.take(str(user), USER_RATE_PER_MIN / 60, USER_BURST, cost, force=True)
+        except Exception as e:
+            logger.warning(f"[ADMISSION ERROR] charge: {e}")
+
+    def _observe_hold(self, seconds: float) -> None:
+        self._hold_ewma += 0.2 * (seconds - self._hold_ewma)
+
+    @asynccontextmanager
+    async def slot(self, user: Any):
+        """Hold one upstream generation slot for the duration of the block."""
+        ticket = await self.acquire(user)
+        try:
+            yield
+        finally:
+            await ticket.release()
+
+    async def acquire(self, user: Any) -> Ticket:
+        """Take a slot, queueing fairly behind other users; raises AdmissionRejected."""
+        if not ADMISSION_ENABLED:
+            return Ticket()
+        user = str(user)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        holder = uuid.uuid4().hex
+        if not self._queues and await self._try(user, holder) is None:
+            ADMISSION_DECISIONS.labels("admitted").inc()
+            ADMISSION_WAIT.observe(0.0)
+            return Ticket(self, user, holder)
+
+        queue = self._queues.get(user)
+        if self._waiting >= ADMISSION_MAX_QUEUE or (queue and len(queue) >= USER_MAX_QUEUED):
+            ADMISSION_DECISIONS.labels("queue_full").inc()
+            raise AdmissionRejected("Too many queued generations", self._retry_after())
+
+        waiter = _Waiter(user)
+        if queue is None:
+            queue = self._queues[user] = deque()
+            self._rotation.append(user)
+        queue.append(waiter)
+        self._waiting += 1
+        try:
+            await self._dispatch()
+            deadline = waiter.enqueued_at + ADMISSION_MAX_WAIT
+            while not waiter.future.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                timeout = min(remaining, ADMISSION_POLL_INTERVAL) if self.store.shared else remaining
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+                except asyncio.TimeoutError:
+                    if self.store.shared:
+                        await self._dispatch()  # a slot may have been freed by another worker
+        except BaseException:
+            await self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            await self._abandon(waiter)
+            ADMISSION_DECISIONS.labels("timed_out").inc()
+            raise AdmissionRejected("Timed out waiting for a generation slot", self._retry_after())
+        ADMISSION_DECISIONS.labels("admitted").inc()
+        ADMISSION_WAIT.observe(time.monotonic() - waiter.enqueued_at)
+        return Ticket(self, user, waiter.holder)
+
+    async def _try(self, user: str, holder: str) -> Optional[str]:
+        try:
+            limit = self._user_limits.get(user, USER_MAX_CONCURRENCY)
+            return await self.store.try_acquire(user, holder, self.max_concurrency, limit)
+        except Exception as e:
+            logger.warning(f"[ADMISSION ERROR] acquire: {e}")  # fail open
+            return None
+
+    async def release(self, user: str, holder: str) -> None:
+        try:
+            await self.store.release(user, holder)
+        except Exception as e:
+            logger.warning(f"[ADMISSION ERROR] release: {e}")
+        await self._dispatch()
+
+    async def _dispatch(self) -> None:
+        """Grant free slots to queued waiters, one user at a time in rotation."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            skipped = 0
+            while self._rotation and skipped < len(self._rotation):
+                user = self._rotation[0]
+                waiter = self._queues[user][0]
+                blocked = await self._try(user, waiter.holder)
+                if blocked == "global":
+                    return
+                self._rotation.rotate(-1)
+                if blocked == "user":
+                    skipped += 1
+                    continue
+                skipped = 0
+                self._pop(waiter)
+                waiter.future.set_result(None)
+
+    def _pop(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.user]
+        queue.remove(waiter)
+        self._waiting -= 1
+        if not queue:
+            del self._queues[waiter.user]
+            self._rotation.remove(waiter.user)
+
+    async def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            # Granted just as the caller gave up: hand the slot back.
+            await self.release(waiter.user, waiter.holder)
+        else:
+            waiter.future.cancel()
+            self._pop(waiter)
+
+    async def stats(self) -> Dict[str, Any]:
+        try:
+            in_flight = await self.store.in_flight()
+        except Exception:
+            in_flight = None
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "store": self.store.name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": in_flight,
+            "waiting": self._waiting,
+            "waiting_users": len(self._rotation),
+            "user_rate_per_min": USER_RATE_PER_MIN,
+            "user_burst": USER_BURST,
+            "user_max_concurrency": USER_MAX_CONCURRENCY,
+            "max_wait_seconds": ADMISSION_MAX_WAIT,
+        }
+
+
+def _build_store():
+    if ADMISSION_STORE == "redis":
+        try:
+            return RedisAdmissionStore(ADMISSION_REDIS_URL, ADMISSION_LEASE_SECONDS)
+        except ImportError:
+            logger.warning("⚠️ ADMISSION_STORE=redis but the redis package is missing; using in-process admission.")
+    return MemoryAdmissionStore()
+
+
+admission = AdmissionController(_build_store(), ADMISSION_MAX_CONCURRENCY or llm.max_concurrency)
+Gauge("admission_waiting", "Generations queued for an LLM slot in this worker.",
+      fn=lambda: {(): admission._waiting})
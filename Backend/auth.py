@@ -1,66 +1,227 @@
 # auth.py
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Callable, Optional, Dict, Any, Tuple
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import hashlib
 import os
-from dotenv import load_dotenv
+import secrets
+import threading
+import time
+from settings import load_env
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from schemas import TokenData  # unified token schema
+from metrics import Gauge, span
 
-load_dotenv()
+load_env()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
 
+# bcrypt work factor; hashes with a different cost are re-hashed on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Hashing runs on a dedicated bounded pool so a login burst can't starve the event loop or the
+# request threadpool. bcrypt releases the GIL, so threads scale; 0 workers hashes inline (legacy).
+PASSWORD_HASH_WORKERS  = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()  # thread | process
+# Tokens whose signature already checked out are remembered until their own `exp`; 0 disables.
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000))
+# Operational endpoints (startup, mail, job worker and maintenance internals) want `X-Ops-Token`;
+# without OPS_TOKEN they are hidden unless OPS_ENDPOINTS_OPEN=true (local development).
+OPS_TOKEN          = os.getenv("OPS_TOKEN", "")
+OPS_ENDPOINTS_OPEN = os.getenv("OPS_ENDPOINTS_OPEN", "false").lower() in {"1", "true", "yes"}
+
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable not set")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib and jose are imported on first use (or by startup.warm_imports) rather than at boot.
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
 bearer_scheme = HTTPBearer()
 
+_hash_executor: Optional[Executor] = None
+
+def _get_hash_executor() -> Optional[Executor]:
+    global _hash_executor
+    if PASSWORD_HASH_WORKERS <= 0:
+        return None
+    if _hash_executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+    return _hash_executor
+
+def _hash(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+def _run_sync(fn, *args):
+    executor = _get_hash_executor()
+    return fn(*args) if executor is None else executor.submit(fn, *args).result()
+
+async def _run_async(fn, *args):
+    executor = _get_hash_executor()
+    if executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return _run_sync(_hash, password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run_sync(_verify_and_update, plain_password, hashed_password)[0]
+
+async def hash_password_async(password: str) -> str:
+    with span("password_hash"):
+        return await _run_async(_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses an outdated work factor."""
+    with span("password_verify"):
+        return await _run_async(_verify_and_update, plain_password, hashed_password)
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire, "type": "access"})
+    from jose import jwt
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
-    to_encode.update({"exp": expire, "type": "refresh"})
+    # jti identifies this refresh token in the revocation list once it has been rotated.
+    to_encode.update({"exp": expire, "type": "refresh", "jti": secrets.token_urlsafe(12)})
+    from jose import jwt
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def token_id(token: str, payload: TokenData) -> str:
+    """The jti, or for tokens issued before jti existed, a digest of the token itself."""
+    return payload.jti or token_digest(token).hex()[:32]
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of sha256(token) -> TokenData for tokens whose signature and claims already
+    checked out. An entry is dropped at the token's own `exp`, so nothing is accepted longer than
+    jose would accept it. Sync handlers run in the threadpool, hence the lock."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[int, TokenData]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> Optional[TokenData]:
+        with self._lock:
+            item = self._entries.get(digest)
+            if item is None or item[0] <= time.time():
+                if item is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return item[1]
+
+    def put(self, digest: bytes, payload: TokenData) -> None:
+        if self.max_entries <= 0 or payload.exp is None:
+            return
+        with self._lock:
+            self._entries[digest] = (payload.exp, payload)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_MAX_ENTRIES)
+Gauge("token_cache_entries", "Verified JWTs held by the token cache.", fn=lambda: {(): len(token_cache._entries)})
+
+
 def decode_access_token(token: str) -> Optional[TokenData]:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return TokenData(**payload)
-    except JWTError:
-        return None
+    """Verified claims of any of our tokens (access or refresh), or None. Callers must not mutate the result."""
+    digest = token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+    from jose import JWTError, jwt
 
-# NEW: return the full TokenData (type-safe)
-def get_current_token(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> TokenData:
-    if not credentials:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authorization header")
-    payload = decode_access_token(credentials.credentials)
-    if not payload or payload.type != "access":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"}
-        )
+    with span("token_decode"):
+        try:
+            payload = TokenData(**jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
+        except JWTError:
+            return None
+    token_cache.put(digest, payload)
     return payload
 
+def require_token(*types: str) -> Callable[..., TokenData]:
+    """Build the bearer dependency for the given token types. Every router shares the instances
+    below, so FastAPI resolves them once per request."""
+    allowed = frozenset(types)
+
+    def dependency(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> TokenData:
+        if not credentials:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authorization header")
+        payload = decode_access_token(credentials.credentials)
+        if not payload or payload.type not in allowed or not payload.sub:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        return payload
+
+    return dependency
+
+# The full TokenData of an access token (type-safe)
+get_current_token = require_token("access")
+# /api/auth/me has always accepted either token
+get_any_token = require_token("access", "refresh")
+
 # Legacy helper: just email (kept for compatibility with other routers)
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> str:
-    payload = get_current_token(credentials)
+def get_current_user(payload: TokenData = Depends(get_current_token)) -> str:
     return payload.sub
+
+def require_ops(x_ops_token: Optional[str] = Header(None)) -> None:
+    """Dependency for operational endpoints: 404 while they are disabled, 403 on a wrong token."""
+    if OPS_TOKEN:
+        if not x_ops_token or not secrets.compare_digest(x_ops_token, OPS_TOKEN):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid ops token")
+    elif not OPS_ENDPOINTS_OPEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
@@ -1,83 +1,90 @@
 # auth_router.py
-from fastapi import APIRouter, HTTPException, Depends, status, Request, BackgroundTasks
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, HTTPException, Depends, status, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import timedelta, datetime
 import secrets
 import string
 from typing import Optional
 
-from database import get_db
+from database import SessionLocal, get_db, run_db
 from models import User
 from schemas import UserCreate, UserLogin, TokenResponse, UserResponse, VerificationStatus, TokenData
 from auth import (
-    hash_password, verify_password,
+    hash_password_async, verify_and_update_password_async,
     create_access_token, create_refresh_token,
-    decode_access_token,
+    decode_access_token, get_any_token, get_current_token, token_id,
+    REFRESH_TOKEN_EXPIRE_DAYS,
 )
-from email_utils import send_verification_email, build_verification_url
+from email_utils import queue_verification_email, log_verification_url
+from mail_queue import mail_worker
+from user_cache import CurrentUser, lookup_user, invalidate_user
+from token_revocation import is_revoked, revoke
 
 router = APIRouter()
-security = HTTPBearer()
 
 def generate_verification_token(length: int = 64) -> str:
     chars = string.ascii_letters + string.digits
     return ''.join(secrets.choice(chars) for _ in range(length))
 
-async def get_current_active_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
-    payload: Optional[TokenData] = decode_access_token(credentials.credentials)
-    if not payload or payload.type not in {"access", "refresh"} or not payload.sub:
+def is_revoked_token(jti: str) -> bool:
+    db = SessionLocal()
+    try:
+        return is_revoked(db, jti)
+    finally:
+        db.close()
+
+def get_current_active_user(payload: TokenData = Depends(get_any_token)) -> CurrentUser:
+    if payload.type == "refresh" and payload.jti and is_revoked_token(payload.jti):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    user = db.query(User).filter(User.email == payload.sub).first()
+    user = lookup_user(payload.sub)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
 
-@router.post("/register", response_model=TokenResponse)
-async def register(
-    user: UserCreate,
-    db: Session = Depends(get_db),
-    background_tasks: BackgroundTasks = ...
-):
-    existing_user = db.query(User).filter(User.email == user.email).first()
-    if existing_user:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-
-    hashed_pw = hash_password(user.password)
-    verification_token = generate_verification_token()
-    verification_expires = datetime.utcnow() + timedelta(hours=24)
+def _email_registered(db: Session, email: str) -> bool:
+    return db.query(User.id).filter(User.email == email).first() is not None
 
-    new_user = User(
+def _create_user(db: Session, user: UserCreate, hashed_pw: str, verification_token: str) -> bool:
+    """Insert the unverified user and queue its verification email in one commit; False if the
+    email was registered meanwhile."""
+    db.add(User(
         name=user.name,
         email=user.email,
         hashed_password=hashed_pw,
         is_verified=False,
         verification_token=verification_token,
-        verification_token_expires=verification_expires,
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+        verification_token_expires=datetime.utcnow() + timedelta(hours=24),
+    ))
+    queue_verification_email(db, user.email, verification_token, user.name)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
 
-    background_tasks.add_task(
-        send_verification_email,
-        to_email=new_user.email,
-        token=verification_token,
-        display_name=new_user.name,
-    )
+@router.post("/register", response_model=TokenResponse)
+async def register(user: UserCreate):
+    # Like login: no session is held across the bcrypt await, and queries run off the event loop.
+    if await run_db(_email_registered, user.email):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
-    print(f"📧 Verification URL (debug): {build_verification_url(new_user.email, verification_token)}")
+    hashed_pw = await hash_password_async(user.password)
+    verification_token = generate_verification_token()
+    if not await run_db(_create_user, user, hashed_pw, verification_token):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    mail_worker.notify()
 
-    access_token = create_access_token({"sub": new_user.email})
-    refresh_token = create_refresh_token({"sub": new_user.email})
+    log_verification_url(user.email, verification_token)
+
+    access_token = create_access_token({"sub": user.email})
+    refresh_token = create_refresh_token({"sub": user.email})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 @router.get("/verify-email", response_model=VerificationStatus)
-async def verify_email(
+def verify_email(
     token: str,
     email: str,
     db: Session = Depends(get_db),
@@ -99,19 +106,13 @@ async def verify_email(
     user.verification_token = None
     user.verification_token_expires = None
     db.commit()
+    invalidate_user(user.email)
 
     return {"verified": True, "email": email, "message": f"Email {email} verified successfully"}
 
 @router.get("/verification-status", response_model=VerificationStatus)
-async def check_verification_status(
-    db: Session = Depends(get_db),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-):
-    payload: Optional[TokenData] = decode_access_token(credentials.credentials)
-    if not payload or payload.type != "access" or not payload.sub:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    user = db.query(User).filter(User.email == payload.sub).first()
+def check_verification_status(payload: TokenData = Depends(get_current_token)):
+    user = lookup_user(payload.sub)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -122,15 +123,10 @@ async def check_verification_status(
     }
 
 @router.post("/resend-verification", response_model=VerificationStatus)
-async def resend_verification(
+def resend_verification(
     db: Session = Depends(get_db),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    background_tasks: BackgroundTasks = ...,
+    payload: TokenData = Depends(get_current_token),
 ):
-    payload: Optional[TokenData] = decode_access_token(credentials.credentials)
-    if not payload or payload.type != "access" or not payload.sub:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
     user = db.query(User).filter(User.email == payload.sub).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -140,34 +136,45 @@ async def resend_verification(
 
     user.verification_token = generate_verification_token()
     user.verification_token_expires = datetime.utcnow() + timedelta(hours=24)
+    queue_verification_email(db, user.email, user.verification_token, user.name)
     db.commit()
+    mail_worker.notify()
 
-    background_tasks.add_task(
-        send_verification_email,
-        to_email=user.email,
-        token=user.verification_token,
-        display_name=user.name,
-    )
-
-    print(f"📧 Resent verification URL (debug): {build_verification_url(user.email, user.verification_token)}")
+    log_verification_url(user.email, user.verification_token)
 
     return {"verified": False, "email": user.email, "message": "Verification email resent"}
 
+def _load_credentials(db: Session, email: str):
+    row = db.query(User.id, User.hashed_password, User.is_verified).filter(User.email == email).first()
+    return tuple(row) if row else None
+
+def _store_rehash(db: Session, user_id: int, new_hash: str) -> None:
+    db.query(User).filter(User.id == user_id).update({User.hashed_password: new_hash})
+    db.commit()
+
 @router.post("/login", response_model=TokenResponse)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: UserLogin):
+    # No session is held across the bcrypt await, so a login storm can't drain the connection pool.
+    creds = await run_db(_load_credentials, user.email)
+    if not creds:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    user_id, hashed_password, is_verified = creds
+    valid, new_hash = await verify_and_update_password_async(user.password, hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made; upgrade it transparently.
+        await run_db(_store_rehash, user_id, new_hash)
 
-    if not db_user.is_verified:
+    if not is_verified:
         raise HTTPException(status_code=403, detail="Email not verified. Please verify before login.")
 
-    access_token = create_access_token({"sub": db_user.email})
-    refresh_token = create_refresh_token({"sub": db_user.email})
+    access_token = create_access_token({"sub": user.email})
+    refresh_token = create_refresh_token({"sub": user.email})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def get_logged_in_user(current_user: User = Depends(get_current_active_user)):
+async def get_logged_in_user(current_user: CurrentUser = Depends(get_current_active_user)):
     return current_user
 
 @router.post("/refresh", response_model=TokenResponse)
@@ -180,6 +187,11 @@ async def refresh_token(request: Request):
     payload: Optional[TokenData] = decode_access_token(refresh_token_str)
     if not payload or payload.type != "refresh" or not payload.sub:
         raise HTTPException(status_code=403, detail="Invalid or expired refresh token")
+    # Rotation: each refresh token is good for exactly one exchange.
+    expires_at = (datetime.utcfromtimestamp(payload.exp) if payload.exp
+                  else datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    if not await run_db(revoke, token_id(refresh_token_str, payload), expires_at):
+        raise HTTPException(status_code=403, detail="Refresh token already used")
 
     email = payload.sub
     new_access_token = create_access_token({"sub": email})
@@ -0,0 +1,128 @@
+# benchmarks/bench_admin_cli.py
+# The admin CLI against the old view_data.py on a large seeded SQLite database: wall time and
+# peak RSS of each command in its own process (the legacy dump, `show`, every export format,
+# and stats in SQL vs a Python loop over all rows). The database is seeded once and reused.
+#   cd Backend && python -m benchmarks.bench_admin_cli --users 200 --emails-per-user 10000 --db /tmp/admin-bench.db
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.harness import configure_env
+
+VARIANTS = ("legacy_dump", "show", "export_jsonl", "export_csv", "export_parquet", "stats_python", "stats_sql")
+
+
+def legacy_dump(out) -> None:
+    """The old view_data.py: every User with .all(), then one lazy load of user.emails per user."""
+    from database import SessionLocal
+    from models import User
+
+    db = SessionLocal()
+    for user in db.query(User).all():
+        out.write(f"\nUser: {user.name} ({user.email})\nCreated at: {user.created_at}\n"
+                  f"Verified: {user.is_verified}\nGenerated Emails:\n")
+        for email in user.emails:
+            out.write(f"  - Prompt: {email.prompt}\n    → Generated: {email.generated_email}\n"
+                      f"    Created at: {email.created_at}\n")
+    db.close()
+
+
+def stats_python() -> dict:
+    """The aggregates the way a loop over ORM rows would compute them."""
+    from database import SessionLocal
+    from models import EmailRequest
+
+    db = SessionLocal()
+    per_user, mix, per_day = Counter(), Counter(), Counter()
+    for email in db.query(EmailRequest).all():
+        per_user[email.user_id] += 1
+        mix[(email.tone, email.length)] += 1
+        per_day[email.created_at.date()] += 1
+    db.close()
+    return {"emails": sum(per_user.values()), "days": len(per_day)}
+
+
+def variant_child(variant: str, workdir: str) -> dict:
+    from admin_cli import email_filters, export, show, stats
+    from database import SessionLocal
+
+    result = {}
+    if variant == "legacy_dump":
+        with open(os.devnull, "w") as out:
+            legacy_dump(out)
+    elif variant == "stats_python":
+        result = stats_python()
+    else:
+        db = SessionLocal()
+        try:
+            if variant == "show":
+                with open(os.devnull, "w") as out:
+                    result["users"] = show(db, [], (), 2000, out)
+            elif variant == "stats_sql":
+                summary = stats(db, email_filters())
+                result = {"emails": summary["emails"], "days": len(summary["per_day"])}
+            else:
+                fmt = variant.split("_", 1)[1]
+                path = os.path.join(workdir, f"emails.{fmt}")
+                result["rows"] = export(db, fmt, path, [], 2000)
+                result["file_mb"] = round(os.path.getsize(path) / 1e6, 1)
+                os.remove(path)
+        finally:
+            db.close()
+    return result
+
+
+def run_variant(variant: str, db_path: str, workdir: str) -> dict:
+    """Run one variant in a fresh interpreter; peak RSS comes from that process's own rusage."""
+    start = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_admin_cli", "--variant", variant, "--db", db_path, "--workdir", workdir],
+        stdout=subprocess.PIPE, text=True,
+    )
+    output = child.stdout.read()
+    _, status, usage = os.wait4(child.pid, 0)
+    seconds = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        return {"variant": variant, "error": f"exit {os.waitstatus_to_exitcode(status)}"}
+    return {"variant": variant, "seconds": round(seconds, 2), "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+            **json.loads(output.strip().splitlines()[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Admin CLI exports and stats vs the old view_data.py")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--emails-per-user", type=int, default=10000)
+    parser.add_argument("--db", help="SQLite file to seed, or reuse if it already exists")
+    parser.add_argument("--variants", nargs="*", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="autowriter-admin-")
+    db_path = args.db or os.path.join(workdir, "admin.db")
+    configure_env("http://127.0.0.1:9/v1", db_path=db_path, BCRYPT_ROUNDS=4)
+    if args.variant:
+        print(json.dumps(variant_child(args.variant, workdir)))
+        return
+
+    seeded = None
+    if not os.path.exists(db_path):
+        from benchmarks.seed import seed_database
+
+        start = time.perf_counter()
+        seed_database(args.users, args.emails_per_user)
+        seeded = round(time.perf_counter() - start, 1)
+    results = {
+        "db": {"path": db_path, "mb": round(os.path.getsize(db_path) / 1e6, 1), "seed_seconds": seeded},
+        "variants": [run_variant(variant, db_path, workdir) for variant in args.variants],
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/bench_cold_start.py
+# Cold start report: where `import main` spends its time (python -X importtime, grouped by
+# top-level package), then real boots of uvicorn in fresh processes: spawn -> first 200 on `/`,
+# the app's own phase timings (GET /api/startup), when the background warmup finished, and
+# the first login and first generation. Fails with --fail-over-budget when the median boot
+# exceeds --budget-ms, so a cold-start regression shows up in CI.
+#   cd Backend && python -m benchmarks.bench_cold_start --boots 5 --budget-ms 3000 --out bench-results/cold.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.harness import configure_env, free_port
+from benchmarks.seed import PASSWORD, seed_database
+from benchmarks.suite import git_revision, wait_ready
+
+LOCAL_MODULES = {name[:-3] for name in os.listdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+                 if name.endswith(".py")}
+
+
+def import_profile(runs: int, top: int) -> Dict[str, Any]:
+    """Median over `runs` fresh interpreters of the self time per top-level package."""
+    totals: List[float] = []
+    per_package: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                             capture_output=True, text=True, env=os.environ.copy())
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip().splitlines()[-1])
+        run: Dict[str, float] = defaultdict(float)
+        for line in out.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            run[name.split(".")[0]] += int(self_us) / 1000
+            if name == "main":
+                totals.append(int(cumulative_us) / 1000)
+        for package, ms in run.items():
+            per_package[package].append(ms)
+    medians = {package: statistics.median(ms + [0.0] * (runs - len(ms))) for package, ms in per_package.items()}
+    ranked = sorted(medians.items(), key=lambda item: -item[1])
+    return {
+        "runs": runs,
+        "import_main_ms": round(statistics.median(totals), 1),
+        "top_packages_ms": {package: round(ms, 1) for package, ms in ranked[:top]},
+        "local_modules_ms": {package: round(ms, 1) for package, ms in ranked if package in LOCAL_MODULES},
+        "deferred_loaded_at_import": sorted(
+            package for package in ("openai", "httpx", "jose", "passlib", "aiosmtplib") if package in medians),
+    }
+
+
+def boot_once(port: int, email: str) -> Dict[str, Any]:
+    url = f"http://127.0.0.1:{port}"
+    spawned = time.perf_counter()
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=url, timeout=30) as client:
+            while True:
+                if api.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {api.returncode}")
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    time.sleep(0.005)
+            ready_ms = (time.perf_counter() - spawned) * 1000
+
+            start = time.perf_counter()
+            token = client.post("/api/auth/login", json={"email": email, "password": PASSWORD}).json()["access_token"]
+            login_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            r = client.post("/api/generate", json={"prompt": "Thank the team for the launch", "tone": "friendly",
+                                                   "length": "short"}, headers={"Authorization": f"Bearer {token}"})
+            r.raise_for_status()
+            generate_ms = (time.perf_counter() - start) * 1000
+
+            ops = {"X-Ops-Token": os.environ["OPS_TOKEN"]}
+            report = client.get("/api/startup", headers=ops).json()
+            while report["warmup"]["state"] in ("pending", "running"):
+                time.sleep(0.05)
+                report = client.get("/api/startup", headers=ops).json()
+    finally:
+        api.terminate()
+        api.wait()
+    return {"spawn_to_ready_ms": round(ready_ms, 1), "first_login_ms": round(login_ms, 1),
+            "first_generate_ms": round(generate_ms, 1), "app": report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile and boot-to-ready timings with a budget")
+    parser.add_argument("--boots", type=int, default=5, help="fresh uvicorn processes per schema mode")
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="packages listed in the import profile")
+    parser.add_argument("--schema-modes", nargs="*", default=["auto", "always"], choices=["auto", "always", "off"])
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--budget-ms", type=float, default=3000, help="median spawn-to-ready budget")
+    parser.add_argument("--fail-over-budget", action="store_true")
+    parser.add_argument("--out", help="write the JSON results here as well as to stdout")
+    args = parser.parse_args()
+
+    llm_port = free_port()
+    configure_env(f"http://127.0.0.1:{llm_port}", BCRYPT_ROUNDS=4, MAIL_WORKER_ENABLED="false",
+                  JOB_WORKER_ENABLED="false", LLM_HEALTH_INTERVAL=0)
+    email = seed_database(1, 200)[0]  # also applies the schema, as a release step would
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(llm_port), "--latency", str(args.llm_latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    results: Dict[str, Any] = {"meta": {**git_revision(), "python": sys.version.split()[0], "cpus": os.cpu_count(),
+                                        "budget_ms": args.budget_ms}}
+    try:
+        wait_ready(f"http://127.0.0.1:{llm_port}/v1/models", fake)
+        results["imports"] = import_profile(args.import_runs, args.top)
+        results["boots"] = {}
+        for mode in args.schema_modes:
+            os.environ["DB_SCHEMA_ON_STARTUP"] = mode
+            boots = [boot_once(free_port(), email) for _ in range(args.boots)]
+            summary = {key: round(statistics.median(b[key] for b in boots), 1)
+                       for key in ("spawn_to_ready_ms", "first_login_ms", "first_generate_ms")}
+            summary["schema_phase_ms"] = round(statistics.median(b["app"]["phases_ms"]["schema"] for b in boots), 1)
+            summary["app_import_ms"] = round(statistics.median(b["app"]["import_ms"] for b in boots), 1)
+            summary["warmup_ms"] = round(statistics.median(b["app"]["warmup"].get("ms") or 0 for b in boots), 1)
+            results["boots"][mode] = {"median": summary, "last": boots[-1]["app"]}
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    over = {mode: r["median"]["spawn_to_ready_ms"] for mode, r in results["boots"].items()
+            if r["median"]["spawn_to_ready_ms"] > args.budget_ms}
+    results["over_budget"] = over
+    output = json.dumps(results, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+    if over and args.fail_over_budget:
+        sys.exit(f"cold start over budget ({args.budget_ms} ms): {over}")
+
+
+if __name__ == "__main__":
+    main()
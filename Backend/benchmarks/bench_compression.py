@@ -0,0 +1,175 @@
+# benchmarks/bench_compression.py
+# Email bodies at rest and on the wire: SQLite size per BODY_COMPRESSION codec, /api/emails
+# bytes per Accept-Encoding, and the time to serialize a history list the old way
+# (EmailResponse.from_orm + FastAPI's encoder + json) vs plain rows + responses.dumps.
+#   cd Backend && python -m benchmarks.bench_compression --emails 5000
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import configure_env, create_verified_user
+
+SENTENCES = [
+    "I hope this message finds you well and that the week has been kind to you so far.",
+    "Thank you for taking the time to meet with us on Tuesday to walk through the proposal.",
+    "As discussed, we would like to move the delivery date to the end of next month.",
+    "Please find attached the revised budget, which reflects the changes we agreed on.",
+    "Our team has reviewed the contract and has a few small questions about section four.",
+    "Could you confirm whether the invoice from March has been processed by your finance team?",
+    "We are excited to welcome you to the onboarding session scheduled for Monday morning.",
+    "If the current timeline no longer works for you, let me know and we can find another slot.",
+    "The shipment was delayed at customs, and we now expect it to arrive by Thursday.",
+    "I wanted to follow up on my previous email regarding the renewal of your subscription.",
+    "Your feedback on the pilot was extremely helpful, and we have already applied most of it.",
+    "We have reserved the large conference room on the third floor for the workshop.",
+    "Unfortunately I will be out of the office on Friday, so I suggest we meet on Wednesday instead.",
+    "Let me know if you need anything else from our side before the board meeting.",
+    "The updated security policy will take effect on the first of the month for all staff.",
+    "I am happy to set up a short call to go over the details if that is easier for you.",
+    "We appreciate your patience while we investigated the billing discrepancy.",
+    "Attached you will find the agenda, the list of attendees and the directions to the venue.",
+    "Following our conversation, I have copied Sarah, who leads the integration work.",
+    "Please review the draft and share any comments by the end of the day on Friday.",
+    "The quarterly report shows steady growth in the northern region and flat sales elsewhere.",
+    "We recommend upgrading to the new plan, which includes priority support at no extra cost.",
+    "Congratulations to the whole team on shipping the release ahead of schedule.",
+    "I would be grateful if you could send over the signed documents at your earliest convenience.",
+]
+OPENINGS = ["Dear {name},", "Hi {name},", "Hello {name},", "Good morning {name},"]
+CLOSINGS = ["Best regards,", "Kind regards,", "Many thanks,", "Sincerely,"]
+NAMES = ["Alex", "Jordan", "Sam", "Taylor", "Morgan", "Casey", "Riley", "Jamie"]
+
+
+def make_body(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(2, 4)):
+        paragraphs.append(" ".join(rng.sample(SENTENCES, rng.randint(2, 4))))
+    return "\n\n".join([rng.choice(OPENINGS).format(name=rng.choice(NAMES)), *paragraphs,
+                        f"{rng.choice(CLOSINGS)}\n{rng.choice(NAMES)}"])
+
+
+def file_bytes(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def variant_child(codec: str, db_path: str, emails: int, seed: int) -> None:
+    """Fill a fresh database with `emails` bodies under one codec and report its size."""
+    configure_env("http://127.0.0.1:9/v1", db_path=db_path, BODY_COMPRESSION=codec)
+    from sqlalchemy import insert
+
+    from database import SessionLocal, engine
+    from db_migrations import ensure_schema
+    from models import EmailRequest, User
+
+    ensure_schema(engine)
+    create_verified_user("compression@example.com")
+    rng = random.Random(seed)
+    db = SessionLocal()
+    user_id = db.query(User.id).scalar()
+    rows = [{"prompt": f"Email #{i} for the account team", "tone": "formal", "length": "medium",
+             "generated_email": make_body(rng), "user_id": user_id} for i in range(emails)]
+    text_bytes = sum(len(r["generated_email"].encode()) for r in rows)
+    start = time.perf_counter()
+    db.execute(insert(EmailRequest), rows)
+    db.commit()
+    insert_s = time.perf_counter() - start
+    db.close()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")  # VACUUM's pages go through the WAL
+        table_bytes = conn.exec_driver_sql(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = 'email_requests'").scalar()
+        # The FTS5 index lives in its shadow tables (email_requests_fts_data, _idx, _docsize, _config).
+        fts_bytes = conn.exec_driver_sql(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'email_requests_fts_%'").scalar()
+        stored = conn.exec_driver_sql("SELECT SUM(length(generated_email)) FROM email_requests").scalar()
+    print(json.dumps({
+        "codec": codec, "body_text_bytes": text_bytes, "body_stored_bytes": stored,
+        "ratio": round(text_bytes / stored, 2), "email_requests_table_bytes": table_bytes,
+        "search_index_bytes": fts_bytes, "db_file_bytes": file_bytes(db_path), "insert_s": round(insert_s, 3),
+    }))
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2)
+
+
+def wire_and_serialization(db_path: str, repeat: int) -> dict:
+    configure_env("http://127.0.0.1:9/v1", db_path=db_path, LLM_HEALTH_INTERVAL=0, MAIL_WORKER_ENABLED="false")
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.testclient import TestClient
+
+    import main
+    from auth import create_access_token
+    from database import SessionLocal
+    from models import EmailRequest
+    from responses import dumps
+    from schemas import EmailResponse
+
+    results = {"wire_bytes": {}, "serialize_ms": {}}
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'compression@example.com'})}"}
+    with TestClient(main.app) as client:
+        for path in ("/api/emails?limit=100", "/api/emails?all=true"):
+            for encoding in ("identity", "gzip", "br"):
+                r = client.get(path, headers={**headers, "Accept-Encoding": encoding})
+                r.raise_for_status()
+                results["wire_bytes"][f"{path} {encoding}"] = {
+                    "bytes": r.num_bytes_downloaded, "content_encoding": r.headers.get("content-encoding"),
+                    "ms": timed(lambda: client.get(path, headers={**headers, "Accept-Encoding": encoding}), repeat),
+                }
+
+    db = SessionLocal()
+    order = (EmailRequest.created_at.desc(), EmailRequest.id.desc())
+    records = db.query(EmailRequest).order_by(*order).all()
+    rows = db.query(*main.EMAIL_COLUMNS).order_by(*order).all()
+    # Serialization only: both sides start from rows already loaded (decompression included in the load).
+    results["serialize_ms"] = {
+        "emails": len(rows),
+        "from_orm_encoder_json": timed(
+            lambda: json.dumps(jsonable_encoder([EmailResponse.from_orm(e) for e in records])).encode(), repeat),
+        "rows_dumps": timed(lambda: dumps([row._asdict() for row in rows]), repeat),
+    }
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Email body compression: DB size, wire bytes and JSON time")
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        variant_child(args.variant, args.db, args.emails, args.seed)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="autowriter-compression-")
+    storage = []
+    for codec in ("none", "zlib", "zstd"):
+        db_path = os.path.join(workdir, f"{codec}.db")
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_compression", "--variant", codec, "--db", db_path,
+             "--emails", str(args.emails), "--seed", str(args.seed)],
+            capture_output=True, text=True, check=True,
+        )
+        storage.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    # The "none" database exercises the wire path with the same bodies either way.
+    results = {"storage": storage, **wire_and_serialization(os.path.join(workdir, "zlib.db"), args.repeat)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
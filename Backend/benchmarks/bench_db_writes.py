@@ -0,0 +1,93 @@
+# benchmarks/bench_db_writes.py
+# Concurrent EmailRequest inserts through database.run_db (the path generate_email
+# uses), comparing SQLite's old defaults, WAL + tuned pragmas, and the async session.
+#   cd Backend && python -m benchmarks.bench_db_writes --writes 2000 --concurrency 32
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "sqlite-default": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "DB_ASYNC": "false"},
+    "sqlite-wal": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "DB_ASYNC": "false"},
+    "sqlite-wal-async": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "DB_ASYNC": "true"},
+}
+
+
+def child(writes: int, concurrency: int) -> dict:
+    from benchmarks.harness import create_verified_user, percentiles
+    from database import AsyncSessionLocal, engine, run_db
+    from db_migrations import ensure_schema
+    from models import EmailRequest, User
+
+    ensure_schema(engine)
+    create_verified_user("writer@example.com")
+
+    def insert_one(db, i: int) -> int:
+        user_id = db.query(User.id).filter(User.email == "writer@example.com").scalar()
+        record = EmailRequest(prompt=f"Write number {i}", tone="formal", length="short",
+                              generated_email="Dear reader,\n\n" + "Lorem ipsum. " * 40, user_id=user_id)
+        db.add(record)
+        db.commit()
+        return record.id
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                await run_db(insert_one, i)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(writes)))
+        return time.perf_counter() - start, latencies
+
+    wall, latencies = asyncio.run(run())
+    return {
+        "async_session": AsyncSessionLocal is not None,
+        "writes": writes,
+        "wall_s": round(wall, 3),
+        "writes_per_s": round(writes / wall, 1),
+        "latency": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite write throughput per database mode")
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--modes", nargs="*", default=list(MODES))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.writes, args.concurrency)))
+        return
+
+    results = {}
+    for mode in args.modes:
+        if MODES[mode]["DB_ASYNC"] == "true" and importlib.util.find_spec("aiosqlite") is None:
+            results[mode] = {"skipped": "aiosqlite not installed"}
+            continue
+        db_path = os.path.join(tempfile.mkdtemp(prefix="autowriter-dbbench-"), "bench.db")
+        env = {**os.environ, **MODES[mode], "DATABASE_URL": f"sqlite:///{db_path}",
+               "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark-secret")}
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_db_writes", "--child", mode,
+             "--writes", str(args.writes), "--concurrency", str(args.concurrency)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
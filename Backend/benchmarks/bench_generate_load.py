@@ -0,0 +1,85 @@
+# benchmarks/bench_generate_load.py
+# Fires N concurrent /api/generate calls at a slow fake LLM and measures how
+# fast unrelated endpoints (/, /api/emails, /api/llm/stats) answer meanwhile.
+#   cd Backend && python -m benchmarks.bench_generate_load --generations 32 --latency 2
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from benchmarks import fake_llm_server
+from benchmarks.harness import ServerThread, configure_env, create_verified_user, free_port, percentiles
+
+PROBE_PATHS = ["/", "/api/emails", "/api/llm/stats"]
+
+
+async def run(api_url: str, token: str, generations: int, probe_interval: float):
+    headers = {"Authorization": f"Bearer {token}", "X-Ops-Token": os.environ["OPS_TOKEN"]}  # /api/llm/stats
+    gen_latencies, probe_latencies = [], {p: [] for p in PROBE_PATHS}
+    payload = {"prompt": "Request a meeting to discuss project timeline", "tone": "professional", "length": "medium"}
+
+    async with httpx.AsyncClient(base_url=api_url, headers=headers, timeout=120) as hx:
+        async def one_generation():
+            start = time.perf_counter()
+            r = await hx.post("/api/generate", json=payload)
+            r.raise_for_status()
+            gen_latencies.append(time.perf_counter() - start)
+
+        async def probe(stop: asyncio.Event):
+            while not stop.is_set():
+                for path in PROBE_PATHS:
+                    start = time.perf_counter()
+                    r = await hx.get(path)
+                    r.raise_for_status()
+                    probe_latencies[path].append(time.perf_counter() - start)
+                await asyncio.sleep(probe_interval)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(one_generation() for _ in range(generations)))
+        wall = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    return {
+        "generations": generations,
+        "wall_s": round(wall, 3),
+        "generate": percentiles(gen_latencies),
+        "probes": {path: percentiles(samples) for path, samples in probe_latencies.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-loop responsiveness under concurrent generations")
+    parser.add_argument("--generations", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=2.0, help="fake LLM seconds per completion")
+    parser.add_argument("--concurrency", type=int, default=16, help="VLLM_MAX_CONCURRENCY for the backend")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake_llm_server.LATENCY = args.latency
+    llm = ServerThread(fake_llm_server.app, free_port()).start()
+    configure_env(llm.url, VLLM_MAX_CONCURRENCY=args.concurrency)
+
+    import main as backend
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    api = ServerThread(backend.app, free_port()).start()
+    token = create_verified_user("bench@example.com")
+    try:
+        result = asyncio.run(run(api.url, token, args.generations, args.probe_interval))
+    finally:
+        api.stop()
+        llm.stop()
+    result["llm_latency_s"] = args.latency
+    result["max_concurrency"] = args.concurrency
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
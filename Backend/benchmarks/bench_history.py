@@ -0,0 +1,111 @@
+# benchmarks/bench_history.py
+# Seeds large per-user histories and compares the full /api/emails list with
+# keyset pages and the body-less /api/emails/summary projection.
+#   cd Backend && python -m benchmarks.bench_history --users 3 --emails-per-user 10000
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from benchmarks.harness import ServerThread, configure_env, create_verified_user, free_port, percentiles
+
+BODY = ("Dear team,\n\n" + "Thanks for the update on the project timeline. " * 20 + "\n\nBest regards,\nBench")
+
+
+def seed(emails_per_user: int, user_emails, batch_size: int = 5000):
+    from sqlalchemy import insert
+
+    from database import SessionLocal, engine
+    from models import EmailRequest, User
+
+    db = SessionLocal()
+    try:
+        start = datetime.utcnow() - timedelta(days=365)
+        for address in user_emails:
+            user_id = db.query(User.id).filter(User.email == address).scalar()
+            rows = []
+            for i in range(emails_per_user):
+                rows.append({
+                    "prompt": f"Follow up with contact #{i} about the renewal",
+                    "tone": random.choice(["formal", "friendly", "professional"]),
+                    "length": random.choice(["short", "medium", "long"]),
+                    "generated_email": BODY,
+                    "created_at": start + timedelta(seconds=i * 30),
+                    "user_id": user_id,
+                })
+                if len(rows) >= batch_size:
+                    db.execute(insert(EmailRequest), rows)
+                    rows = []
+            if rows:
+                db.execute(insert(EmailRequest), rows)
+        db.commit()
+    finally:
+        db.close()
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT id FROM email_requests WHERE user_id = 1 "
+            "ORDER BY created_at DESC, id DESC LIMIT 51"
+        ).fetchall()
+    return [row[-1] for row in plan]
+
+
+def timed(client: httpx.Client, path: str, repeat: int):
+    samples, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        r = client.get(path)
+        r.raise_for_status()
+        samples.append(time.perf_counter() - start)
+        size = len(r.content)
+    return {**percentiles(samples), "bytes": size}, r
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History endpoint latency with large per-user histories")
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--emails-per-user", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--deep-pages", type=int, default=20, help="pages to walk for the deep-pagination case")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+    import main as backend
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    api = ServerThread(backend.app, free_port()).start()
+    addresses = [f"history{i}@example.com" for i in range(args.users)]
+    tokens = [create_verified_user(a) for a in addresses]
+    seed_start = time.perf_counter()
+    plan = seed(args.emails_per_user, addresses)
+    seed_s = time.perf_counter() - seed_start
+
+    results = {"users": args.users, "emails_per_user": args.emails_per_user, "seed_s": round(seed_s, 2),
+               "query_plan": plan}
+    try:
+        with httpx.Client(base_url=api.url, headers={"Authorization": f"Bearer {tokens[0]}"}, timeout=120) as hx:
+            results["full_list"], _ = timed(hx, "/api/emails?all=true", max(1, args.repeat // 5))
+            results["first_page"], _ = timed(hx, f"/api/emails?limit={args.page_size}", args.repeat)
+            results["summary_first_page"], _ = timed(hx, f"/api/emails/summary?limit={args.page_size}", args.repeat)
+
+            walk, cursor = [], None
+            for _ in range(args.deep_pages):
+                path = f"/api/emails/summary?limit={args.page_size}" + (f"&before={cursor}" if cursor else "")
+                start = time.perf_counter()
+                page = hx.get(path).json()
+                walk.append(time.perf_counter() - start)
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            results["summary_page_walk"] = percentiles(walk)
+    finally:
+        api.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_jobs.py
+# Offline job end to end against a local fake LLM: upload JSONL through POST /api/jobs,
+# run the worker in a child process, SIGKILL it part-way, restart it, and check the job
+# resumes from its last checkpoint. Reports emails/min and the JSONL export.
+#   cd Backend && python -m benchmarks.bench_jobs --items 2000 --concurrency 32 --kill-after 5
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.harness import ServerThread, configure_env, create_verified_user, free_port
+
+TONES = ["formal", "friendly", "professional", "neutral", "informal"]
+LENGTHS = ["short", "medium", "long"]
+
+
+def worker_child() -> None:
+    """Drain due items until every job is finished, printing progress as JSON lines."""
+    from jobs import _backlog, job_worker
+    from database import run_db
+
+    async def run():
+        start = time.perf_counter()
+        while True:
+            await job_worker.drain()
+            backlog = await run_db(_backlog)
+            if backlog["pending"] + backlog["running"] == 0:
+                break
+            await asyncio.sleep(0.2)  # items leased by a dead worker, or waiting out a retry
+        print(json.dumps({"wall_s": round(time.perf_counter() - start, 2), **await job_worker.stats()}), flush=True)
+
+    asyncio.run(run())
+
+
+def job_status(client: httpx.Client, job_id: int, headers: dict) -> dict:
+    return client.get(f"/api/jobs/{job_id}", headers=headers).json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline generation jobs: throughput and crash/resume")
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per completion")
+    parser.add_argument("--kill-after", type=float, default=5.0, help="SIGKILL the first worker after N s (0 = never)")
+    parser.add_argument("--lease", type=float, default=3.0, help="JOB_LEASE_SECONDS for the run")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker_child()
+        return
+
+    llm_port = free_port()
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(llm_port), "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    configure_env(
+        f"http://127.0.0.1:{llm_port}", JOB_WORKER_ENABLED="false", JOB_CONCURRENCY=args.concurrency,
+        JOB_LEASE_SECONDS=args.lease, JOB_CHECKPOINT_SECONDS=0.5, VLLM_MAX_CONCURRENCY=args.concurrency,
+        LLM_HEALTH_INTERVAL=0,
+    )
+    import main as app_main
+
+    server = ServerThread(app_main.app, free_port()).start()
+    headers = {"Authorization": f"Bearer {create_verified_user('jobs@example.com')}"}
+    body = "\n".join(
+        json.dumps({"prompt": f"Campaign email number {i} about our spring sale",
+                    "tone": TONES[i % len(TONES)], "length": LENGTHS[i % len(LENGTHS)]})
+        for i in range(args.items)
+    )
+    results = {}
+    try:
+        with httpx.Client(base_url=server.url, timeout=120) as client:
+            start = time.perf_counter()
+            r = client.post("/api/jobs", content=body, headers={**headers, "Content-Type": "application/x-ndjson"})
+            r.raise_for_status()
+            job_id = r.json()["id"]
+            results["upload_s"] = round(time.perf_counter() - start, 3)
+
+            worker_cmd = [sys.executable, "-m", "benchmarks.bench_jobs", "--worker"]
+            if args.kill_after:
+                first = subprocess.Popen(worker_cmd, env=os.environ.copy(), stdout=subprocess.DEVNULL)
+                time.sleep(args.kill_after)
+                first.send_signal(signal.SIGKILL)
+                first.wait()
+                results["at_kill"] = job_status(client, job_id, headers)
+            resumed = subprocess.run(worker_cmd, env=os.environ.copy(), capture_output=True, text=True, check=True)
+            results["resumed_worker"] = json.loads(resumed.stdout.strip().splitlines()[-1])
+            results["job"] = job_status(client, job_id, headers)
+
+            start = time.perf_counter()
+            lines = client.get(f"/api/jobs/{job_id}/results", headers=headers).text.splitlines()
+            rows = [json.loads(line) for line in lines]
+            results["export"] = {
+                "lines": len(rows),
+                "seconds": round(time.perf_counter() - start, 3),
+                "in_order": [row["index"] for row in rows] == list(range(args.items)),
+                "statuses": {s: sum(1 for row in rows if row["status"] == s) for s in {row["status"] for row in rows}},
+            }
+    finally:
+        server.stop()
+        fake.terminate()
+        fake.wait()
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
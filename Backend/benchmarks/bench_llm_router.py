@@ -0,0 +1,110 @@
+# benchmarks/bench_llm_router.py
+# LLM router scenarios against local fake servers (one subprocess each):
+#   skewed   - three nodes, one 4x slower: least_outstanding vs latency policy
+#   node-down - one node refuses connections: failover + circuit breaker
+#   tail     - every node has a 10% slow tail: hedging off vs LLM_HEDGE_AFTER_MS
+#   cd Backend && python -m benchmarks.bench_llm_router --calls 300 --concurrency 24
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import free_port, percentiles
+
+# name -> (per-node fake server args (None = nothing listening), router env)
+SCENARIOS = {
+    "skewed/least_outstanding": ([["--latency", "0.2"], ["--latency", "0.2"], ["--latency", "0.8"]],
+                                 {"LLM_ROUTER_POLICY": "least_outstanding"}),
+    "skewed/latency": ([["--latency", "0.2"], ["--latency", "0.2"], ["--latency", "0.8"]],
+                       {"LLM_ROUTER_POLICY": "latency"}),
+    "node-down": ([["--latency", "0.2"], ["--latency", "0.2"], None], {}),
+    "tail/no-hedge": ([["--latency", "0.2", "--slow-rate", "0.1", "--slow-latency", "2"]] * 3, {}),
+    "tail/hedge-400ms": ([["--latency", "0.2", "--slow-rate", "0.1", "--slow-latency", "2"]] * 3,
+                         {"LLM_HEDGE_AFTER_MS": "400"}),
+}
+
+
+def child(calls: int, concurrency: int) -> dict:
+    from llm_client import llm
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await llm.chat_completion([{"role": "user", "content": f"Write email {i}"}], max_tokens=50)
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+
+        await llm.health()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(calls)))
+        wall = time.perf_counter() - start
+        stats = llm.stats()
+        await llm.aclose()
+        return {
+            "calls_per_s": round(calls / wall, 1),
+            "errors": errors,
+            "latency": percentiles(latencies),
+            "failovers": stats["failovers"],
+            "hedges": stats["hedges"],
+            "hedge_wins": stats["hedge_wins"],
+            "per_backend_ewma_ms": {b["backend"]: b["ewma_latency_ms"] for b in stats["backends"]},
+            "circuits": {b["backend"]: b["circuit"] for b in stats["backends"]},
+        }
+
+    return asyncio.run(run())
+
+
+def run_scenario(name: str, calls: int, concurrency: int) -> dict:
+    nodes, router_env = SCENARIOS[name]
+    servers, urls = [], []
+    try:
+        for i, node_args in enumerate(nodes):
+            port = free_port()
+            urls.append(f"node{i}=http://127.0.0.1:{port}")
+            if node_args is not None:
+                servers.append(subprocess.Popen(
+                    [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port), *node_args],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                ))
+        time.sleep(2.0)  # let the fake servers bind
+        env = {**os.environ, **router_env, "LLM_BACKENDS": ",".join(urls), "LLM_HEALTH_INTERVAL": "0",
+               "VLLM_MAX_CONCURRENCY": str(concurrency), "LLM_CB_FAILURE_THRESHOLD": "3",
+               "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark-secret")}
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_llm_router", "--child",
+             "--calls", str(calls), "--concurrency", str(concurrency)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM router: balancing, failover and hedging")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=24)
+    parser.add_argument("--scenarios", nargs="*", default=list(SCENARIOS))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.calls, args.concurrency)))
+        return
+    print(json.dumps({name: run_scenario(name, args.calls, args.concurrency) for name in args.scenarios}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_login_storm.py
+# Login storm: logins/sec and latency of an unrelated endpoint while bcrypt runs,
+# with hashing inline on the event loop (PASSWORD_HASH_WORKERS=0) vs on the pool.
+#   cd Backend && python -m benchmarks.bench_login_storm --logins 200 --rounds 10
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.harness import ServerThread, configure_env, free_port, percentiles
+
+PASSWORD = "storm-password"
+
+
+def seed_users(count: int) -> list:
+    from auth import hash_password
+    from database import SessionLocal
+    from models import User
+
+    hashed = hash_password(PASSWORD)
+    emails = [f"storm{i}@example.com" for i in range(count)]
+    db = SessionLocal()
+    try:
+        db.add_all(User(name="Storm", email=e, hashed_password=hashed, is_verified=True) for e in emails)
+        db.commit()
+    finally:
+        db.close()
+    return emails
+
+
+async def storm(api_url: str, emails: list, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    login_latencies, probe_latencies = [], []
+
+    async with httpx.AsyncClient(base_url=api_url, timeout=120) as hx:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                r = await hx.post("/api/auth/login", json={"email": emails[i % len(emails)], "password": PASSWORD})
+                r.raise_for_status()
+                login_latencies.append(time.perf_counter() - start)
+
+        async def probe(stop: asyncio.Event):
+            while not stop.is_set():
+                start = time.perf_counter()
+                (await hx.get("/")).raise_for_status()
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.02)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(logins)))
+        wall = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    return {
+        "logins": logins,
+        "logins_per_s": round(logins / wall, 1),
+        "login": percentiles(login_latencies),
+        "unrelated_endpoint": percentiles(probe_latencies),
+    }
+
+
+def child(args) -> dict:
+    configure_env("http://127.0.0.1:9")
+    import main as backend
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    api = ServerThread(backend.app, free_port()).start()
+    try:
+        emails = seed_users(args.users)
+        return asyncio.run(storm(api.url, emails, args.logins, args.concurrency))
+    finally:
+        api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput and event-loop latency during a login storm")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args)))
+        return
+
+    results = {}
+    for label, workers in (("inline", 0), (f"pool-{args.workers}", args.workers)):
+        env = {**os.environ, "BCRYPT_ROUNDS": str(args.rounds), "PASSWORD_HASH_WORKERS": str(workers)}
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_login_storm", "--child",
+             "--logins", str(args.logins), "--users", str(args.users), "--concurrency", str(args.concurrency)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[label] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(json.dumps({"bcrypt_rounds": args.rounds, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
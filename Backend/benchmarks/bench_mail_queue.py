@@ -0,0 +1,97 @@
+# benchmarks/bench_mail_queue.py
+# Registration-spike mail: one SMTP session per message (the old BackgroundTasks path)
+# vs the durable queue draining over pooled connections, against a local SMTP sink.
+#   cd Backend && python -m benchmarks.bench_mail_queue --messages 200 --session-delay 0.3 --fail-rate 0.05
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.harness import configure_env, free_port, percentiles
+
+
+async def per_message(messages: int, concurrency: int, port: int) -> dict:
+    import aiosmtplib
+    from mail_queue import QueuedMail
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            mail = QueuedMail(i, f"user{i}@example.com", "Verify your email", "Hi!", None, 0)
+            try:
+                await aiosmtplib.send(mail.to_message(), hostname="127.0.0.1", port=port, start_tls=False, timeout=20)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    wall = time.perf_counter() - start
+    return {"wall_s": round(wall, 3), "messages_per_s": round(messages / wall, 1), "lost": errors,
+            "send": percentiles(latencies)}
+
+
+async def queued(messages: int) -> dict:
+    from database import SessionLocal, run_db
+    from mail_queue import enqueue_email, mail_worker, _queue_depth
+
+    db = SessionLocal()
+    try:
+        for i in range(messages):
+            enqueue_email(db, f"user{i}@example.com", "Verify your email", "Hi!")
+        db.commit()
+    finally:
+        db.close()
+
+    start = time.perf_counter()
+    while True:
+        if not await mail_worker.run_once():
+            depth = await run_db(_queue_depth)
+            if depth["pending"] + depth["sending"] == 0:
+                break
+            await asyncio.sleep(0.02)  # retries waiting out their backoff
+    wall = time.perf_counter() - start
+    stats = await mail_worker.stats()
+    await mail_worker.stop()
+    return {"wall_s": round(wall, 3), "messages_per_s": round(messages / wall, 1), **stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outbound mail throughput: per-message SMTP vs pooled queue")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10, help="parallel sends in per-message mode")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--session-delay", type=float, default=0.3, help="simulated TLS handshake + login")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of messages answered 451")
+    args = parser.parse_args()
+
+    from benchmarks.fake_smtp_server import start_sink
+
+    port = free_port()
+    configure_env(
+        "http://127.0.0.1:9",
+        SMTP_HOST="127.0.0.1", SMTP_PORT=port, SMTP_STARTTLS="false", SMTP_POOL_SIZE=args.pool_size,
+        MAIL_RATE_PER_SEC=0, MAIL_BACKOFF_BASE=0.05, MAIL_BACKOFF_MAX=0.5, MAIL_MAX_ATTEMPTS=10,
+    )
+    from database import engine
+    from db_migrations import ensure_schema
+
+    ensure_schema(engine)
+    results = {}
+    for label, run in (("per-message", lambda: per_message(args.messages, args.concurrency, port)),
+                       ("queue-pooled", lambda: queued(args.messages))):
+        sink = start_sink(port, session_delay=args.session_delay, fail_rate=args.fail_rate)
+        try:
+            results[label] = {**asyncio.run(run()), "smtp_sessions": sink.handler.sessions,
+                              "delivered": sink.handler.delivered}
+        finally:
+            sink.stop()
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_prompt_budgets.py
+# Output tokens and latency per email length: the legacy prompt (bare user message,
+# max_tokens=500, no stop sequences) vs the versioned prompts from prompts.py.
+# Runs against a local fake server whose model rambles unless capped, or a real
+# OpenAI-compatible server with --base-url (then completion lengths are the model's own).
+#   cd Backend && python -m benchmarks.bench_prompt_budgets --calls 20
+#   cd Backend && python -m benchmarks.bench_prompt_budgets --base-url http://gpu:8000/v1 --model Qwen/Qwen2.5-0.5B-Instruct
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from benchmarks.harness import free_port, percentiles
+
+PROMPTS = [
+    "ask my manager for Friday off to attend a family wedding",
+    "follow up with a client about an unpaid invoice from last month",
+    "thank the team for shipping the release on time",
+    "request a meeting with the landlord about a broken heater",
+]
+
+
+def legacy(req):
+    messages = [{"role": "user", "content": f"Write a {req.tone.value} {req.length.value} email: {req.prompt}"}]
+    return messages, {"temperature": 0.7, "max_tokens": 500}
+
+
+def current(req):
+    from prompts import build_prompt
+
+    prompt = build_prompt(req)
+    return prompt.messages, prompt.params
+
+
+async def run_variant(client, model: str, build, length: str, calls: int, concurrency: int) -> dict:
+    from prompts import count_message_tokens
+    from schemas import PromptRequest
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, completion_tokens, finish, prompt_gap = [], [], Counter(), []
+
+    async def one(i):
+        req = PromptRequest(prompt=PROMPTS[i % len(PROMPTS)], tone="professional", length=length)
+        messages, params = build(req)
+        async with semaphore:
+            start = time.perf_counter()
+            completion = await client.chat.completions.create(model=model, messages=messages, **params)
+            latencies.append(time.perf_counter() - start)
+        choice = completion.choices[0]
+        finish[choice.finish_reason] += 1
+        if completion.usage:
+            completion_tokens.append(completion.usage.completion_tokens)
+            prompt_gap.append(count_message_tokens(messages) - completion.usage.prompt_tokens)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return {
+        "completion_tokens_mean": round(statistics.fmean(completion_tokens), 1) if completion_tokens else None,
+        "finish_reasons": dict(finish),
+        "latency": percentiles(latencies),
+        # local count minus server-reported prompt tokens (positive = we over-estimate)
+        "prompt_token_gap_mean": round(statistics.fmean(prompt_gap), 1) if prompt_gap else None,
+    }
+
+
+async def run_all(base_url: str, model: str, calls: int, concurrency: int) -> dict:
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(base_url=base_url, api_key=os.getenv("VLLM_API_KEY", "EMPTY"))
+    results = {}
+    for length in ("short", "medium", "long"):
+        results[length] = {
+            "legacy": await run_variant(client, model, legacy, length, calls, concurrency),
+            "v2": await run_variant(client, model, current, length, calls, concurrency),
+        }
+    await client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-length decode budgets: legacy vs versioned prompts")
+    parser.add_argument("--calls", type=int, default=20, help="calls per length and variant")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-url", help="real OpenAI-compatible server (default: spawn a fake one)")
+    parser.add_argument("--model", default="fake/qwen-email")
+    parser.add_argument("--reply-tokens", type=int, default=600, help="fake model's uncapped reply length")
+    parser.add_argument("--tokens-per-sec", type=float, default=400, help="fake model's decode rate")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port), "--ttft", "0.05",
+             "--reply-tokens", str(args.reply_tokens), "--tokens-per-sec", str(args.tokens_per_sec)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        time.sleep(2.0)  # let the fake server bind
+        base_url = f"http://127.0.0.1:{port}/v1"
+    try:
+        results = asyncio.run(run_all(base_url, args.model, args.calls, args.concurrency))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
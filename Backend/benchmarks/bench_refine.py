@@ -0,0 +1,150 @@
+# benchmarks/bench_refine.py
+# Refinement chains ("make it shorter", "more formal", ...) two ways: the conversation prompt of
+# POST /api/emails/{id}/refine (every step replays the earlier turns, so its prompt extends the
+# previous step's) vs writing a brand-new prompt each time (the previous draft pasted into a new
+# user message after the instruction, so only the system prompt is shared). Per step it reports
+# latency, prompt tokens and the prompt tokens the server served from its prefix cache.
+# Runs against a spawned fake server that emulates prefix caching and charges prefill per uncached
+# token, a real vLLM (--base-url; start it with --enable-prefix-caching --enable-prompt-tokens-details),
+# or the bundled model on CPU (--local).
+#   cd Backend && python -m benchmarks.bench_refine --chains 5 --steps 4
+#   cd Backend && python -m benchmarks.bench_refine --local ./Qwen2.5-0.5B --chains 2
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from benchmarks.harness import free_port, percentiles
+
+PROMPTS = [
+    "ask my manager for Friday off to attend a family wedding",
+    "follow up with a client about an unpaid invoice from last month",
+    "thank the team for shipping the release on time",
+    "request a meeting with the landlord about a broken heater",
+]
+INSTRUCTIONS = ["make it shorter", "mention that the deadline is Friday", "sound more confident",
+                "add a one-line summary at the top", "sign it as Sam"]
+MODES = ("conversation", "rewrite")
+
+
+def rewrite_prompt(draft: str, instruction: str, tone, length):
+    """What a user does without the endpoint: a new prompt holding the draft and the change."""
+    from prompts import build_prompt
+    from schemas import PromptRequest
+
+    built = build_prompt(PromptRequest(prompt="x" * 5, tone=tone, length=length))
+    messages = [built.messages[0], {"role": "user", "content": f"{instruction}:\n\n{draft}"}]
+    return messages, built.params
+
+
+async def run_mode(client, model: str, mode: str, chains: int, steps: int) -> dict:
+    from prompts import build_prompt, build_refine_prompt
+    from refinement import cached_prompt_tokens
+    from schemas import EmailLength, EmailTone, PromptRequest
+
+    per_step = defaultdict(lambda: {"latency": [], "prompt_tokens": 0, "cached_tokens": 0, "calls": 0})
+
+    async def chain(i: int) -> None:
+        tone, length = EmailTone.PROFESSIONAL, EmailLength.MEDIUM
+        root = build_prompt(PromptRequest(prompt=PROMPTS[i % len(PROMPTS)], tone=tone, length=length))
+        rows = []
+        for step in range(steps + 1):
+            instruction = INSTRUCTIONS[(step - 1) % len(INSTRUCTIONS)] if step else None
+            if step == 0:
+                messages, params = root.messages, root.params
+            elif mode == "conversation":
+                prompt = build_refine_prompt(rows, instruction, tone, length)
+                messages, params = prompt.messages, prompt.params
+            else:
+                messages, params = rewrite_prompt(rows[-1].generated_email, instruction, tone, length)
+            start = time.perf_counter()
+            completion = await client.chat.completions.create(model=model, messages=messages, **params)
+            stats = per_step[step]
+            stats["latency"].append(time.perf_counter() - start)
+            stats["calls"] += 1
+            if completion.usage:
+                stats["prompt_tokens"] += completion.usage.prompt_tokens
+                stats["cached_tokens"] += cached_prompt_tokens(completion.usage) or 0
+            rows.append(SimpleNamespace(
+                prompt=PROMPTS[i % len(PROMPTS)], tone=tone.value, length=length.value,
+                refine_instruction=instruction,
+                generated_email=completion.choices[0].message.content.strip(),
+            ))
+
+    await asyncio.gather(*(chain(i) for i in range(chains)))
+    return {
+        f"step {step}": {
+            "latency": percentiles(stats["latency"]),
+            "prompt_tokens_mean": round(stats["prompt_tokens"] / stats["calls"], 1),
+            "cached_tokens_mean": round(stats["cached_tokens"] / stats["calls"], 1),
+            "uncached_tokens_mean": round((stats["prompt_tokens"] - stats["cached_tokens"]) / stats["calls"], 1),
+        }
+        for step, stats in sorted(per_step.items())
+    }
+
+
+async def run_all(client, model: str, chains: int, steps: int) -> dict:
+    return {mode: await run_mode(client, model, mode, chains, steps) for mode in MODES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refinement chains: conversation prompt vs a new prompt per step")
+    parser.add_argument("--chains", type=int, default=5, help="concurrent refinement chains per mode")
+    parser.add_argument("--steps", type=int, default=4, help="refinements per chain after the first draft")
+    parser.add_argument("--base-url", help="real OpenAI-compatible server (default: spawn a fake one)")
+    parser.add_argument("--model", default="fake/qwen-email")
+    parser.add_argument("--local", metavar="MODEL_PATH", help="serve this model on CPU in-process instead")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=2000, help="fake model's prefill rate")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None and not args.local:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port), "--ttft", "0.05",
+             "--reply-tokens", "150", "--tokens-per-sec", "400",
+             "--prefill-tokens-per-sec", str(args.prefill_tokens_per_sec)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        time.sleep(2.0)  # let the fake server bind
+        base_url = f"http://127.0.0.1:{port}/v1"
+
+    async def run() -> dict:
+        if args.local:
+            from local_llm import LocalClient
+
+            client = LocalClient(os.path.basename(os.path.normpath(args.local)), args.local)
+            client.start()
+            while not client.ready and client.error is None:
+                await asyncio.sleep(0.1)
+            if client.error:
+                raise SystemExit(f"Local model failed to load: {client.error}")
+            try:
+                return await run_all(client, client.model, args.chains, args.steps)
+            finally:
+                await client.aclose()
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(base_url=base_url, api_key=os.getenv("VLLM_API_KEY", "EMPTY"))
+        try:
+            return await run_all(client, args.model, args.chains, args.steps)
+        finally:
+            await client.close()
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_variants.py
+# N drafts of one prompt: a single call with `n`=N (what /api/generate does for `variants`) vs
+# N separate calls, fired together or one after another (a user pressing "generate" again).
+# Reports wall latency per round and the prompt/completion tokens the server says it processed:
+# with `n` the prompt is prefilled once, so prompt tokens stay flat as N grows.
+# Runs against a spawned fake server, a real OpenAI-compatible server (--base-url), or the
+# bundled model on CPU (--local), where the saved prefills show up in the timings too.
+#   cd Backend && python -m benchmarks.bench_variants --variants 2 4 --rounds 10
+#   cd Backend && python -m benchmarks.bench_variants --base-url http://gpu:8000/v1 --model Qwen/Qwen2.5-0.5B-Instruct
+#   cd Backend && python -m benchmarks.bench_variants --local ./Qwen2.5-0.5B --rounds 3
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import free_port, percentiles
+
+PROMPTS = [
+    "ask my manager for Friday off to attend a family wedding",
+    "follow up with a client about an unpaid invoice from last month",
+    "thank the team for shipping the release on time",
+]
+MODES = ("shared", "separate_concurrent", "separate_sequential")
+
+
+async def run_mode(client, model: str, mode: str, n: int, rounds: int) -> dict:
+    from prompts import build_prompt
+    from schemas import PromptRequest
+
+    latencies, prompt_tokens, completion_tokens, drafts = [], 0, 0, 0
+    for i in range(rounds):
+        prompt = build_prompt(PromptRequest(prompt=PROMPTS[i % len(PROMPTS)], tone="professional", length="medium"))
+        call = lambda **extra: client.chat.completions.create(
+            model=model, messages=prompt.messages, **prompt.params, **extra)
+        start = time.perf_counter()
+        if mode == "shared":
+            completions = [await call(n=n)]
+        elif mode == "separate_concurrent":
+            completions = await asyncio.gather(*(call() for _ in range(n)))
+        else:
+            completions = [await call() for _ in range(n)]
+        latencies.append(time.perf_counter() - start)
+        for completion in completions:
+            drafts += len(completion.choices)
+            if completion.usage:
+                prompt_tokens += completion.usage.prompt_tokens
+                completion_tokens += completion.usage.completion_tokens
+    return {
+        "latency": percentiles(latencies),
+        "drafts_per_round": drafts / rounds,
+        "prompt_tokens_per_round": round(prompt_tokens / rounds, 1),
+        "completion_tokens_per_round": round(completion_tokens / rounds, 1),
+    }
+
+
+async def run_all(client, model: str, variants, rounds: int) -> dict:
+    results = {}
+    for n in variants:
+        results[f"n={n}"] = {mode: await run_mode(client, model, mode, n, rounds) for mode in MODES}
+        shared, separate = results[f"n={n}"]["shared"], results[f"n={n}"]["separate_concurrent"]
+        if separate["prompt_tokens_per_round"]:
+            results[f"n={n}"]["prompt_tokens_saved"] = round(
+                1 - shared["prompt_tokens_per_round"] / separate["prompt_tokens_per_round"], 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One `n` call vs N separate calls for N drafts")
+    parser.add_argument("--variants", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--rounds", type=int, default=10, help="prompts per N and mode")
+    parser.add_argument("--base-url", help="real OpenAI-compatible server (default: spawn a fake one)")
+    parser.add_argument("--model", default="fake/qwen-email")
+    parser.add_argument("--local", metavar="MODEL_PATH", help="serve this model on CPU in-process instead")
+    parser.add_argument("--reply-tokens", type=int, default=200, help="fake model's reply length")
+    parser.add_argument("--tokens-per-sec", type=float, default=400, help="fake model's decode rate")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None and not args.local:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port), "--ttft", "0.05",
+             "--reply-tokens", str(args.reply_tokens), "--tokens-per-sec", str(args.tokens_per_sec)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        time.sleep(2.0)  # let the fake server bind
+        base_url = f"http://127.0.0.1:{port}/v1"
+
+    async def run() -> dict:
+        if args.local:
+            from local_llm import LocalClient
+
+            client = LocalClient(os.path.basename(os.path.normpath(args.local)), args.local)
+            client.start()
+            while not client.ready and client.error is None:
+                await asyncio.sleep(0.1)
+            if client.error:
+                raise SystemExit(f"Local model failed to load: {client.error}")
+            try:
+                return await run_all(client, client.model, args.variants, args.rounds)
+            finally:
+                await client.aclose()
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(base_url=base_url, api_key=os.getenv("VLLM_API_KEY", "EMPTY"))
+        try:
+            return await run_all(client, args.model, args.variants, args.rounds)
+        finally:
+            await client.close()
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
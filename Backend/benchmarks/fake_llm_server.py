@@ -0,0 +1,180 @@
+# benchmarks/fake_llm_server.py
+# Minimal OpenAI-compatible server for benchmarks; point VLLM_BASE_URL at it.
+#   python -m benchmarks.fake_llm_server --port 8001 --latency 2.0
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY = float(os.getenv("FAKE_LLM_LATENCY", 1.0))
+TTFT = float(os.getenv("FAKE_LLM_TTFT", 0.2))
+TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", 50))
+MODEL = os.getenv("FAKE_LLM_MODEL", "fake/qwen-email")
+# Misbehaviour for router tests: a fraction of calls answer 500, a fraction take SLOW_LATENCY extra.
+FAIL_RATE = float(os.getenv("FAKE_LLM_FAIL_RATE", 0.0))
+SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", 0.0))
+SLOW_LATENCY = float(os.getenv("FAKE_LLM_SLOW_LATENCY", 2.0))
+# When > 0 the model "rambles" to this many words (plus a trailing "Note:" section) unless
+# max_tokens or a stop sequence cuts it short, and non-streamed latency becomes
+# TTFT + words / TOKENS_PER_SEC, so decode budgets show up in the timings.
+REPLY_TOKENS = int(os.getenv("FAKE_LLM_REPLY_TOKENS", 0))
+# Automatic prefix caching, vLLM style: usage reports `prompt_tokens_details.cached_tokens` for the
+# longest run of leading messages seen before, and when PREFILL_TOKENS_PER_SEC > 0 the uncached
+# prompt tokens add prefill time to every call.
+PREFILL_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_PREFILL_TOKENS_PER_SEC", 0))
+PREFIX_CACHE_ENTRIES = 10000
+_prefixes: "OrderedDict[str, int]" = OrderedDict()
+
+app = FastAPI(title="Fake OpenAI-compatible LLM")
+
+
+def _reply(prompt: str, index: int = 0) -> str:
+    return (
+        "Subject: Re: your request\n\n"
+        "Dear colleague,\n\n"
+        f"This is a generated reply to: {prompt}\n\n"
+        + (f"(Draft {index + 1}.)\n\n" if index else "")
+        + "Best regards,\nAutoWriter"
+    )
+
+
+def _completion(body: dict, prompt: str, index: int = 0):
+    """(words, finish_reason) after applying REPLY_TOKENS, `stop` and `max_tokens`."""
+    text = _reply(prompt, index)
+    if not REPLY_TOKENS:
+        return text.split(" "), "stop"
+    filler = " ".join(f"word{i}" for i in range(max(0, REPLY_TOKENS - len(text.split(" ")))))
+    text = text + (f"\n\n{filler}" if filler else "") + "\nNote: this draft can be adjusted to your needs."
+    stops = body.get("stop") or []
+    for stop in [stops] if isinstance(stops, str) else stops:
+        if stop in text:
+            text = text[:text.index(stop)]
+    words, finish = text.split(" "), "stop"
+    max_tokens = body.get("max_tokens")
+    if max_tokens and len(words) > max_tokens:
+        words, finish = words[:max_tokens], "length"
+    return words, finish
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": MODEL, "object": "model", "owned_by": "fake"}]}
+
+
+def _prompt_tokens(body: dict) -> int:
+    return sum(len(m["content"].split()) for m in body["messages"])
+
+
+def _prefill(body: dict) -> int:
+    """Prompt tokens served from the prefix cache; records this prompt's prefixes."""
+    cached, tokens, digest = 0, 0, hashlib.sha256()
+    for message in body["messages"]:
+        digest.update(json.dumps(message, sort_keys=True).encode())
+        tokens += len(message["content"].split())
+        key = digest.hexdigest()
+        if key in _prefixes:
+            cached = tokens
+            _prefixes.move_to_end(key)
+        else:
+            _prefixes[key] = tokens
+    while len(_prefixes) > PREFIX_CACHE_ENTRIES:
+        _prefixes.popitem(last=False)
+    return cached
+
+
+def _usage(prompt_tokens: int, completion_tokens: int, cached: int) -> dict:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens, "prompt_tokens_details": {"cached_tokens": cached}}
+
+
+async def _stream(body: dict, prompt: str):
+    """`n` choices decode in lockstep, one chunk per choice per step, like vLLM's interleaving."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model", MODEL)
+    choices = [_completion(body, prompt, index) for index in range(body.get("n") or 1)]
+    prompt_tokens = _prompt_tokens(body)
+    cached = _prefill(body)
+    await asyncio.sleep(TTFT + ((prompt_tokens - cached) / PREFILL_TOKENS_PER_SEC if PREFILL_TOKENS_PER_SEC else 0))
+    for i in range(max(len(words) for words, _ in choices)):
+        if i:
+            await asyncio.sleep(1 / TOKENS_PER_SEC)
+        for index, (words, finish) in enumerate(choices):
+            if i >= len(words):
+                continue
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": index, "delta": {"content": words[i] if i == 0 else " " + words[i]},
+                             "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+    done = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": index, "delta": {}, "finish_reason": finish} for index, (_, finish) in enumerate(choices)]}
+    yield f"data: {json.dumps(done)}\n\n"
+    if (body.get("stream_options") or {}).get("include_usage"):
+        completion_tokens = sum(len(words) for words, _ in choices)
+        usage = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [], "usage": _usage(prompt_tokens, completion_tokens, cached)}
+        yield f"data: {json.dumps(usage)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        return JSONResponse({"error": {"message": "injected failure"}}, status_code=500)
+    if SLOW_RATE and random.random() < SLOW_RATE:
+        await asyncio.sleep(SLOW_LATENCY)
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, prompt), media_type="text/event-stream")
+    # `n` choices share the prompt (counted once in usage) and decode side by side.
+    choices = [_completion(body, prompt, index) for index in range(body.get("n") or 1)]
+    longest = max(len(words) for words, _ in choices)
+    prompt_tokens, completion_tokens = _prompt_tokens(body), sum(len(words) for words, _ in choices)
+    cached = _prefill(body)
+    prefill = (prompt_tokens - cached) / PREFILL_TOKENS_PER_SEC if PREFILL_TOKENS_PER_SEC else 0
+    await asyncio.sleep(prefill + (TTFT + longest / TOKENS_PER_SEC if REPLY_TOKENS else LATENCY))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", MODEL),
+        "choices": [{"index": index, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": finish}
+                    for index, (words, finish) in enumerate(choices)],
+        "usage": _usage(prompt_tokens, completion_tokens, cached),
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds per non-streamed completion")
+    parser.add_argument("--ttft", type=float, default=TTFT, help="seconds before the first streamed token")
+    parser.add_argument("--tokens-per-sec", type=float, default=TOKENS_PER_SEC, help="streamed decode rate")
+    parser.add_argument("--fail-rate", type=float, default=FAIL_RATE, help="fraction of calls answered 500")
+    parser.add_argument("--slow-rate", type=float, default=SLOW_RATE, help="fraction of calls delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=SLOW_LATENCY)
+    parser.add_argument("--reply-tokens", type=int, default=REPLY_TOKENS, help="words the model writes if uncapped")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=PREFILL_TOKENS_PER_SEC,
+                        help="charge prefill time for prompt tokens not in the prefix cache (0: free)")
+    args = parser.parse_args()
+    LATENCY, TTFT, TOKENS_PER_SEC = args.latency, args.ttft, args.tokens_per_sec
+    FAIL_RATE, SLOW_RATE, SLOW_LATENCY = args.fail_rate, args.slow_rate, args.slow_latency
+    REPLY_TOKENS = args.reply_tokens
+    PREFILL_TOKENS_PER_SEC = args.prefill_tokens_per_sec
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,65 @@
+# benchmarks/fake_smtp_server.py
+# Local SMTP sink (needs `pip install aiosmtpd`); point SMTP_HOST/SMTP_PORT at it with SMTP_STARTTLS=false.
+# A per-session delay stands in for the TLS handshake + login a real provider costs.
+#   python -m benchmarks.fake_smtp_server --port 8025 --session-delay 0.3 --fail-rate 0.1
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from aiosmtpd.controller import Controller
+
+SESSION_DELAY = float(os.getenv("FAKE_SMTP_SESSION_DELAY", 0.3))
+FAIL_RATE = float(os.getenv("FAKE_SMTP_FAIL_RATE", 0.0))
+
+
+class SinkHandler:
+    """Accepts everything; counts sessions and messages; optionally answers 451 (transient)."""
+
+    def __init__(self, session_delay: float = SESSION_DELAY, fail_rate: float = FAIL_RATE):
+        self.session_delay = session_delay
+        self.fail_rate = fail_rate
+        self.sessions = 0
+        self.delivered = 0
+        self.rejected = 0
+        self.recipients = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        await asyncio.sleep(self.session_delay)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_rate and random.random() < self.fail_rate:
+            self.rejected += 1
+            return "451 4.3.0 Try again later"
+        self.delivered += 1
+        self.recipients.extend(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+    def stats(self) -> dict:
+        return {"sessions": self.sessions, "delivered": self.delivered, "rejected": self.rejected}
+
+
+def start_sink(port: int, **handler_options) -> Controller:
+    controller = Controller(SinkHandler(**handler_options), hostname="127.0.0.1", port=port)
+    controller.start()
+    return controller
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--session-delay", type=float, default=SESSION_DELAY, help="seconds added per EHLO")
+    parser.add_argument("--fail-rate", type=float, default=FAIL_RATE, help="fraction of messages answered 451")
+    args = parser.parse_args()
+    sink = start_sink(args.port, session_delay=args.session_delay, fail_rate=args.fail_rate)
+    print(f"📮 SMTP sink on 127.0.0.1:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(sink.handler.stats())
+    except KeyboardInterrupt:
+        sink.stop()
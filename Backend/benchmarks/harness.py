@@ -0,0 +1,88 @@
+# benchmarks/harness.py
+# Shared helpers: run the backend and the fake LLM in-process on free ports
+# against a throwaway SQLite database.
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread(threading.Thread):
+    def __init__(self, app, port: int):
+        super().__init__(daemon=True)
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.url = f"http://127.0.0.1:{port}"
+
+    def run(self):
+        self.server.run()
+
+    def start(self):
+        super().start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=5)
+
+
+def configure_env(llm_url: str, db_path: str = None, **extra: str) -> str:
+    """Point the backend at the fake LLM and a temp DB. Must run before importing `main`."""
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix="autowriter-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["VLLM_BASE_URL"] = llm_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("OPS_TOKEN", "benchmark-ops")
+    os.environ.setdefault("EMAIL_USER", "")
+    os.environ.setdefault("EMAIL_PASS", "")
+    # Load generators are one user; pass ADMISSION_ENABLED=true to measure with limits on.
+    os.environ.setdefault("ADMISSION_ENABLED", "false")
+    for key, value in extra.items():
+        os.environ[key] = str(value)
+    return db_path
+
+
+def create_verified_user(email: str, name: str = "Bench User", password: str = "benchmark-password") -> str:
+    """Insert a verified user directly and return an access token for it."""
+    from auth import create_access_token, hash_password
+    from database import SessionLocal
+    from models import User
+
+    db = SessionLocal()
+    try:
+        if not db.query(User).filter(User.email == email).first():
+            db.add(User(name=name, email=email, hashed_password=hash_password(password), is_verified=True))
+            db.commit()
+    finally:
+        db.close()
+    return create_access_token({"sub": email})
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(pct(50) * 1000, 2),
+        "p95_ms": round(pct(95) * 1000, 2),
+        "p99_ms": round(pct(99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
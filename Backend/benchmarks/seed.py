@@ -0,0 +1,81 @@
+# benchmarks/seed.py
+# Deterministic database fixture: verified users sharing one password and a history of
+# emails each, bulk-inserted. The same --seed gives the same rows, so runs are comparable.
+#   cd Backend && DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed --users 20 --emails-per-user 2000
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+PASSWORD = "benchmark-password"
+TONES = ["formal", "informal", "neutral", "friendly", "professional"]
+LENGTHS = ["short", "medium", "long"]
+TOPICS = ["the renewal", "the invoice", "next week's workshop", "the hiring plan", "the Q3 roadmap",
+          "a delayed shipment", "the onboarding checklist", "the office move"]
+BODY = "Dear team,\n\n" + "Thanks for the update on the project timeline. " * 20 + "\n\nBest regards,\nBench"
+
+
+def user_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+def seed_database(users: int, emails_per_user: int, seed: int = 42, batch_size: int = 5000) -> List[str]:
+    """Create the schema if needed and insert the fixture; returns the users' addresses."""
+    from sqlalchemy import insert
+
+    from auth import hash_password
+    from database import SessionLocal, engine
+    from db_migrations import ensure_schema
+    from models import EmailRequest, User
+
+    ensure_schema(engine)
+    rng = random.Random(seed)
+    hashed = hash_password(PASSWORD)  # one hash for everyone: bcrypt per user would dominate seeding
+    addresses = [user_email(i) for i in range(users)]
+    start = datetime(2025, 1, 1)
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"name": f"Bench User {i}", "email": address, "hashed_password": hashed, "is_verified": True}
+            for i, address in enumerate(addresses)
+        ])
+        ids = dict(db.query(User.email, User.id).filter(User.email.in_(addresses)).all())
+        rows = []
+        for address in addresses:
+            for i in range(emails_per_user):
+                rows.append({
+                    "prompt": f"Follow up with contact #{i} about {rng.choice(TOPICS)}",
+                    "tone": rng.choice(TONES),
+                    "length": rng.choice(LENGTHS),
+                    "generated_email": BODY,
+                    "created_at": start + timedelta(seconds=i * 60),
+                    "user_id": ids[address],
+                })
+                if len(rows) >= batch_size:
+                    db.execute(insert(EmailRequest), rows)
+                    rows = []
+        if rows:
+            db.execute(insert(EmailRequest), rows)
+        db.commit()
+    finally:
+        db.close()
+    return addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database named by DATABASE_URL with a benchmark fixture")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--emails-per-user", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    addresses = seed_database(args.users, args.emails_per_user, args.seed)
+    print(json.dumps({"users": len(addresses), "emails": len(addresses) * args.emails_per_user,
+                      "password": PASSWORD, "seconds": round(time.perf_counter() - start, 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+# benchmarks/suite.py
+# Scripted load scenarios against the real app served by uvicorn in a subprocess, backed by
+# the fake LLM server and a seeded SQLite fixture (benchmarks/seed.py). Every scenario reports
+# RPS and p50/p95/p99 per endpoint; results are written as JSON so two runs can be diffed.
+#   cd Backend && python -m benchmarks.suite --out bench-results/base.json
+#   cd Backend && python -m benchmarks.suite --out bench-results/new.json --compare bench-results/base.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.harness import configure_env, free_port, percentiles
+from benchmarks.seed import LENGTHS, PASSWORD, TONES, seed_database
+
+PROMPTS = ["Ask the landlord to fix the heating", "Invite the team to a Friday retrospective",
+           "Remind a client about the overdue invoice", "Request two days of leave next month"]
+
+
+class Recorder:
+    """Latency and status per endpoint label (method + route template)."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            r = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            return None
+        self.samples[label].append(time.perf_counter() - start)
+        if r.status_code >= 400:
+            self.errors[label] += 1
+        return r
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        labels = sorted(set(self.samples) | set(self.errors))
+        total = sum(len(self.samples[label]) for label in labels)
+        return {
+            "wall_s": round(wall, 3),
+            "requests": total,
+            "rps": round(total / wall, 1) if wall else None,
+            "endpoints": {
+                label: {**percentiles(self.samples[label]), "errors": self.errors[label],
+                        "rps": round(len(self.samples[label]) / wall, 1) if wall else None}
+                for label in labels
+            },
+        }
+
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, args, users: List[str], tokens: Dict[str, str]):
+        self.client = client
+        self.args = args
+        self.users = users
+        self.tokens = tokens
+        self.rng = random.Random(args.seed)
+
+    def auth(self, user: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[user]}"}
+
+
+async def bounded(concurrency: int, jobs: List[Callable[[], Awaitable[Any]]]) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            await job()
+
+    await asyncio.gather(*(run(job) for job in jobs))
+
+
+# --- scenarios: each returns a Recorder report --------------------------------------------
+
+async def auth_storm(ctx: Context) -> Dict[str, Any]:
+    """New registrations interleaved with logins of seeded users."""
+    rec, n = Recorder(), ctx.args.auth_requests
+    run_id = int(time.time())
+
+    def register(i):
+        body = {"name": "Storm User", "email": f"storm{run_id}-{i}@example.com", "password": PASSWORD}
+        return lambda: rec.call(ctx.client, "POST /api/auth/register", "POST", "/api/auth/register", json=body)
+
+    def login(i):
+        body = {"email": ctx.users[i % len(ctx.users)], "password": PASSWORD}
+        return lambda: rec.call(ctx.client, "POST /api/auth/login", "POST", "/api/auth/login", json=body)
+
+    jobs = [register(i) if i % 4 == 0 else login(i) for i in range(n)]
+    start = time.perf_counter()
+    await bounded(ctx.args.concurrency, jobs)
+    return rec.report(time.perf_counter() - start)
+
+
+async def generate_burst(ctx: Context) -> Dict[str, Any]:
+    """A burst of distinct generations (no cache hits, no coalescing) spread over users."""
+    rec, n = Recorder(), ctx.args.generations
+
+    def generate(i):
+        user = ctx.users[i % len(ctx.users)]
+        body = {"prompt": f"{PROMPTS[i % len(PROMPTS)]} (request {i})", "tone": TONES[i % len(TONES)],
+                "length": LENGTHS[i % len(LENGTHS)]}
+        return lambda: rec.call(ctx.client, "POST /api/generate", "POST", "/api/generate",
+                                json=body, headers=ctx.auth(user))
+
+    start = time.perf_counter()
+    await bounded(ctx.args.generations, [generate(i) for i in range(n)])
+    return rec.report(time.perf_counter() - start)
+
+
+async def history_reads(ctx: Context) -> Dict[str, Any]:
+    """Large-history reads: first pages, deep keyset walks, summaries and search."""
+    rec, n = Recorder(), ctx.args.history_requests
+
+    def first_page(user):
+        return lambda: rec.call(ctx.client, "GET /api/emails", "GET", "/api/emails",
+                                params={"limit": 50}, headers=ctx.auth(user))
+
+    def summary(user):
+        return lambda: rec.call(ctx.client, "GET /api/emails/summary", "GET", "/api/emails/summary",
+                                params={"limit": 50}, headers=ctx.auth(user))
+
+    def search(user):
+        return lambda: rec.call(ctx.client, "GET /api/emails/search", "GET", "/api/emails/search",
+                                params={"q": ctx.rng.choice(["invoice", "renewal", "workshop"])}, headers=ctx.auth(user))
+
+    def deep_walk(user, pages=5):
+        async def walk():
+            cursor = None
+            for _ in range(pages):
+                params = {"limit": 50, **({"before": cursor} if cursor else {})}
+                r = await rec.call(ctx.client, "GET /api/emails (next page)", "GET", "/api/emails",
+                                   params=params, headers=ctx.auth(user))
+                cursor = r.headers.get("X-Next-Cursor") if r is not None else None
+                if not cursor:
+                    return
+        return walk
+
+    kinds = [first_page, summary, search, deep_walk]
+    jobs = [kinds[i % len(kinds)](ctx.users[i % len(ctx.users)]) for i in range(n)]
+    start = time.perf_counter()
+    await bounded(ctx.args.concurrency, jobs)
+    return rec.report(time.perf_counter() - start)
+
+
+async def mixed(ctx: Context) -> Dict[str, Any]:
+    """Weighted mix of the above as independent simulated users."""
+    rec, n = Recorder(), ctx.args.mixed_requests
+    weights = {"history": 50, "summary": 15, "generate": 15, "login": 10, "profile": 10}
+    ops = ctx.rng.choices(list(weights), weights=list(weights.values()), k=n)
+
+    def op(i, kind):
+        user = ctx.users[i % len(ctx.users)]
+        if kind == "history":
+            return lambda: rec.call(ctx.client, "GET /api/emails", "GET", "/api/emails",
+                                    params={"limit": 50}, headers=ctx.auth(user))
+        if kind == "summary":
+            return lambda: rec.call(ctx.client, "GET /api/emails/summary", "GET", "/api/emails/summary",
+                                    headers=ctx.auth(user))
+        if kind == "generate":
+            body = {"prompt": f"{PROMPTS[i % len(PROMPTS)]} (mixed {i})", "tone": "formal", "length": "short"}
+            return lambda: rec.call(ctx.client, "POST /api/generate", "POST", "/api/generate",
+                                    json=body, headers=ctx.auth(user))
+        if kind == "login":
+            return lambda: rec.call(ctx.client, "POST /api/auth/login", "POST", "/api/auth/login",
+                                    json={"email": user, "password": PASSWORD})
+        return lambda: rec.call(ctx.client, "GET /api/user/profile", "GET", "/api/user/profile", headers=ctx.auth(user))
+
+    start = time.perf_counter()
+    await bounded(ctx.args.concurrency, [op(i, kind) for i, kind in enumerate(ops)])
+    return rec.report(time.perf_counter() - start)
+
+
+SCENARIOS = {
+    "auth_storm": auth_storm,
+    "generate_burst": generate_burst,
+    "history_reads": history_reads,
+    "mixed": mixed,
+}
+
+
+# --- running and comparing ----------------------------------------------------------------
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True)
+        return {"commit": rev.stdout.strip(), "dirty": bool(dirty.stdout.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_scenarios(api_url: str, args, users: List[str]) -> Dict[str, Any]:
+    from auth import create_access_token
+
+    tokens = {user: create_access_token({"sub": user}) for user in users}
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.generations) + 10)
+    results = {}
+    async with httpx.AsyncClient(base_url=api_url, timeout=120, limits=limits) as client:
+        for name in args.scenarios:
+            ctx = Context(client, args, users, tokens)
+            if name == "history_reads":
+                await history_reads_warmup(ctx)
+            results[name] = await SCENARIOS[name](ctx)
+            print(f"{name}: {results[name]['rps']} req/s over {results[name]['requests']} requests", file=sys.stderr)
+    return results
+
+
+async def history_reads_warmup(ctx: Context) -> None:
+    # One read per user so the first timed requests don't pay for a cold SQLite page cache.
+    for user in ctx.users:
+        await ctx.client.get("/api/emails/summary", headers=ctx.auth(user))
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Per scenario/endpoint deltas; a row regresses when p95 grows or RPS drops by more than `threshold` %."""
+    rows = []
+    for scenario, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if not base:
+            continue
+        for label, stats in result["endpoints"].items():
+            old = base["endpoints"].get(label)
+            if not old or not old.get("count") or not stats.get("count"):
+                continue
+            p95 = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+            rps = (stats["rps"] - old["rps"]) / old["rps"] * 100 if old["rps"] else 0.0
+            rows.append({
+                "scenario": scenario, "endpoint": label,
+                "p50_ms": [old["p50_ms"], stats["p50_ms"]], "p95_ms": [old["p95_ms"], stats["p95_ms"]],
+                "rps": [old["rps"], stats["rps"]],
+                "p95_change_pct": round(p95, 1), "rps_change_pct": round(rps, 1),
+                "regression": p95 > threshold or rps < -threshold,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend load scenarios with per-endpoint RPS and latency percentiles")
+    parser.add_argument("--scenarios", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--emails-per-user", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--auth-requests", type=int, default=200)
+    parser.add_argument("--generations", type=int, default=64, help="generate_burst size (all in flight at once)")
+    parser.add_argument("--history-requests", type=int, default=400)
+    parser.add_argument("--mixed-requests", type=int, default=600)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-ttft", type=float, default=0.1)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=50)
+    parser.add_argument("--out", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    llm_port, api_port = free_port(), free_port()
+    db_path = configure_env(
+        f"http://127.0.0.1:{llm_port}", BCRYPT_ROUNDS=args.bcrypt_rounds,
+        MAIL_WORKER_ENABLED="false", JOB_WORKER_ENABLED="false", LLM_HEALTH_INTERVAL=0,
+    )
+    seed_start = time.perf_counter()
+    users = seed_database(args.users, args.emails_per_user, args.seed)
+    seed_seconds = time.perf_counter() - seed_start
+
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(llm_port), "--latency", str(args.llm_latency),
+         "--ttft", str(args.llm_ttft), "--tokens-per-sec", str(args.llm_tokens_per_sec)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(f"http://127.0.0.1:{llm_port}/v1/models", fake)
+        wait_ready(f"http://127.0.0.1:{api_port}/", api)
+        scenarios = asyncio.run(run_scenarios(f"http://127.0.0.1:{api_port}", args, users))
+    finally:
+        for process in (api, fake):
+            process.terminate()
+            process.wait()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": os.path.basename(db_path),
+            "seed_seconds": round(seed_seconds, 2),
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "fail_on_regression")},
+        },
+        "scenarios": scenarios,
+    }
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(results, json.load(f), args.threshold)
+        results["comparison"] = {"baseline": args.compare, "threshold_pct": args.threshold, "rows": rows}
+        regressions = [row for row in rows if row["regression"]]
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['scenario']:<15} {row['endpoint']:<30} p95 {row['p95_ms'][0]:>9} -> {row['p95_ms'][1]:>9} ms "
+                  f"({row['p95_change_pct']:+.1f}%)  rps {row['rps'][0]} -> {row['rps'][1]} "
+                  f"({row['rps_change_pct']:+.1f}%) {flag}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# compressed_text.py
+# Transparent compression of large text columns. Values are stored as bytes:
+#   b"\x00" + codec id + compressed UTF-8   when at least BODY_COMPRESSION_MIN_BYTES long
+#   plain UTF-8                             otherwise (and for rows written before compression)
+# Text never starts with NUL, so both forms - and legacy TEXT values - decode unambiguously,
+# whatever BODY_COMPRESSION is set to now.
+#   python db_migrations.py compress-bodies   # rewrite existing rows
+import logging
+import os
+import zlib
+from typing import Optional, Union
+
+from settings import load_env
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+load_env()
+logger = logging.getLogger(__name__)
+
+BODY_COMPRESSION           = os.getenv("BODY_COMPRESSION", "zlib").lower()  # zlib | zstd | none
+BODY_COMPRESSION_MIN_BYTES = int(os.getenv("BODY_COMPRESSION_MIN_BYTES", 256))
+BODY_COMPRESSION_LEVEL     = int(os.getenv("BODY_COMPRESSION_LEVEL", 0))  # 0 = the codec's default
+
+MARKER = b"\x00"
+ZLIB, ZSTD = b"z", b"s"
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        import zstandard  # optional dependency
+
+        self.compressor = zstandard.ZstdCompressor(level=level or 3)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.decompressor.decompress(data)
+
+
+_zstd: Optional[_Zstd] = None
+
+
+def _get_zstd() -> _Zstd:
+    global _zstd
+    if _zstd is None:
+        _zstd = _Zstd(BODY_COMPRESSION_LEVEL)
+    return _zstd
+
+
+def _write_codec() -> Optional[bytes]:
+    if BODY_COMPRESSION == "zstd":
+        try:
+            _get_zstd()
+            return ZSTD
+        except ImportError:
+            logger.warning("⚠️ BODY_COMPRESSION=zstd but zstandard is not installed (pip install zstandard); using zlib.")
+            return ZLIB
+    return ZLIB if BODY_COMPRESSION == "zlib" else None
+
+
+WRITE_CODEC = _write_codec()
+
+
+def compress_text(value: str, codec: Optional[bytes] = WRITE_CODEC, min_bytes: int = BODY_COMPRESSION_MIN_BYTES) -> bytes:
+    data = value.encode("utf-8")
+    if codec is None or len(data) < min_bytes:
+        return data
+    if codec == ZSTD:
+        packed = _get_zstd().compress(data)
+    else:
+        packed = zlib.compress(data, BODY_COMPRESSION_LEVEL or 6)
+    # Keep the plain form when compression doesn't pay for its header.
+    return MARKER + codec + packed if len(packed) + 2 < len(data) else data
+
+
+def is_compressed(raw: Union[bytes, str, None]) -> bool:
+    return isinstance(raw, (bytes, memoryview)) and bytes(raw[:1]) == MARKER
+
+
+def decompress_text(raw: Union[bytes, memoryview, str]) -> str:
+    if isinstance(raw, str):
+        return raw  # a TEXT value from before the column held bytes (SQLite keeps both)
+    raw = bytes(raw)
+    if raw[:1] != MARKER:
+        return raw.decode("utf-8")
+    codec, packed = raw[1:2], raw[2:]
+    if codec == ZSTD:
+        return _get_zstd().decompress(packed).decode("utf-8")
+    if codec == ZLIB:
+        return zlib.decompress(packed).decode("utf-8")
+    raise ValueError(f"Unknown compressed text codec {codec!r}")
+
+
+def register_sqlite_functions(dbapi_connection) -> None:
+    """`decompress_text(value)` in SQL on SQLite connections, for the search index triggers."""
+    dbapi_connection.create_function(
+        "decompress_text", 1, lambda raw: None if raw is None else decompress_text(raw), deterministic=True
+    )
+
+
+class CompressedText(TypeDecorator):
+    """A str column stored as (optionally compressed) bytes. SQL-side string functions such as
+    LIKE don't see the text, so don't filter on these columns in queries."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        return None if value is None else compress_text(value)
+
+    def process_result_value(self, value, dialect) -> Optional[str]:
+        return None if value is None else decompress_text(value)
@@ -1,23 +1,149 @@
 # database.py
-from sqlalchemy import create_engine
+import logging
+import os
+from typing import Any, Callable, Optional, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.concurrency import run_in_threadpool
 
-from dotenv import load_dotenv
-import os
+from compressed_text import register_sqlite_functions
+from settings import load_env
 
-load_dotenv()
+load_env()
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./emails.db")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# PostgreSQL / MySQL pool sizing
+DB_POOL_SIZE     = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW  = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT  = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE  = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in {"1", "true", "yes"}
+
+# SQLite pragmas
+SQLITE_JOURNAL_MODE    = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS     = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB   = int(os.getenv("SQLITE_CACHE_SIZE_KB", 65536))
+SQLITE_MMAP_SIZE       = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+SQLITE_FOREIGN_KEYS    = os.getenv("SQLITE_FOREIGN_KEYS", "true").lower() in {"1", "true", "yes"}  # enforce ON DELETE
+
+# Optional async session path (needs aiosqlite / asyncpg)
+DB_ASYNC           = os.getenv("DB_ASYNC", "false").lower() in {"1", "true", "yes"}
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "mysql": "mysql+aiomysql"}
+
+T = TypeVar("T")
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(url_str: str) -> dict:
+    url = make_url(url_str)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if _is_memory_sqlite(url):
+            options["poolclass"] = StaticPool
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, memory: bool = False) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        if not memory:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if SQLITE_FOREIGN_KEYS:
+            cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+def _install_sqlite_pragmas(sync_engine, url) -> None:
+    if url.get_backend_name() != "sqlite":
+        return
+    memory = _is_memory_sqlite(url)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, _record):
+        apply_sqlite_pragmas(dbapi_connection, memory=memory)
+        register_sqlite_functions(dbapi_connection)
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+_install_sqlite_pragmas(engine, make_url(DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_url() -> str:
+    if ASYNC_DATABASE_URL:
+        return ASYNC_DATABASE_URL
+    url = make_url(DATABASE_URL)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for '{url.get_backend_name()}'; set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal: Optional[Callable[[], Any]] = None
+
+if DB_ASYNC:
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        _url = _async_url()
+        async_engine = create_async_engine(_url, **engine_options(_url))
+        _install_sqlite_pragmas(async_engine.sync_engine, make_url(_url))
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    except (ImportError, ValueError) as e:
+        logger.warning(f"⚠️ DB_ASYNC requested but unavailable ({e}); using the threadpool instead.")
+        async_engine = None
+        AsyncSessionLocal = None
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def _run_with_session(fn: Callable[..., T], *args: Any) -> T:
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """Run `fn(session, *args)` without blocking the event loop: on an async session (via
+    run_sync) when DB_ASYNC is on, otherwise on a sync session in the threadpool.
+
+    `fn` owns the transaction and should return plain data, not ORM instances.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(fn, *args)
+    return await run_in_threadpool(_run_with_session, fn, *args)
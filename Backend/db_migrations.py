@@ -0,0 +1,173 @@
+# db_migrations.py
+#   python db_migrations.py migrate                      # apply the schema (e.g. as a release step)
+#   python db_migrations.py compress-bodies [--vacuum]   # compress texts written before compression
+import hashlib
+import logging
+import sys
+from typing import Optional, Tuple
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import LargeBinary
+
+from compressed_text import WRITE_CODEC, CompressedText, compress_text, is_compressed
+from models import Base, SchemaState
+from search import detect_search_index, ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_BATCH = 1000
+# Bump when ensure_schema gains DDL the models don't describe (search index, column conversions).
+SCHEMA_REVISION = 2
+
+def schema_fingerprint() -> str:
+    parts = [f"revision:{SCHEMA_REVISION}"]
+    for table in Base.metadata.sorted_tables:
+        parts.append(f"table:{table.name}")
+        parts += [f"{c.name}:{type(c.type).__name__}:{c.nullable}" for c in table.columns]
+        parts += sorted(f"index:{index.name}" for index in table.indexes)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+def applied_fingerprint(engine: Engine) -> Optional[str]:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(SchemaState.fingerprint).where(SchemaState.id == 1)).scalar()
+    except Exception:
+        return None  # no schema_state table yet
+
+def ensure_schema(engine: Engine) -> None:
+    """Create missing tables, then missing indexes on tables that already existed
+    (create_all skips indexes of existing tables), and record the fingerprint."""
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    _ensure_binary_bodies(engine)
+    ensure_search_index(engine)
+    with engine.begin() as conn:
+        table = SchemaState.__table__
+        fingerprint = schema_fingerprint()
+        if conn.execute(update(table).where(table.c.id == 1).values(fingerprint=fingerprint)).rowcount == 0:
+            conn.execute(table.insert().values(id=1, fingerprint=fingerprint))
+
+def prepare_schema(engine: Engine, mode: str) -> str:
+    """Startup: `always` runs ensure_schema; `auto` only when the recorded fingerprint differs
+    from the models (one query otherwise); `off` leaves it to `python db_migrations.py migrate`.
+    Returns what was done."""
+    if mode == "always":
+        ensure_schema(engine)
+        return "applied"
+    current = applied_fingerprint(engine) == schema_fingerprint()
+    if not current and mode == "auto":
+        ensure_schema(engine)
+        return "applied"
+    if not current:
+        logger.warning("⚠️ Database schema is out of date; run `python db_migrations.py migrate`.")
+    detect_search_index(engine)
+    return "current" if current else "stale"
+
+def _add_missing_columns(engine: Engine) -> None:
+    """create_all leaves existing tables alone: add the nullable columns the models gained since."""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            logger.info(f"🧱 Adding {table.name}.{column.name}")
+            with engine.begin() as conn:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                )
+
+def compressed_columns():
+    """(table, column) for every CompressedText column in the models."""
+    return [(table, column) for table in Base.metadata.sorted_tables for column in table.columns
+            if isinstance(column.type, CompressedText)]
+
+def _ensure_binary_bodies(engine: Engine) -> None:
+    """CompressedText columns (compressed_text) store bytes. SQLite keeps bytes in an old TEXT
+    column as-is; PostgreSQL and MySQL need the column type changed."""
+    dialect = engine.dialect.name
+    if dialect not in {"postgresql", "mysql"}:
+        return
+    inspector = inspect(engine)
+    for table, column in compressed_columns():
+        existing = next(c for c in inspector.get_columns(table.name) if c["name"] == column.name)
+        if isinstance(existing["type"], LargeBinary):
+            continue
+        logger.info(f"🗜️ Converting {table.name}.{column.name} to a binary column (rewrites the table)...")
+        with engine.begin() as conn:
+            if dialect == "postgresql":
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE BYTEA "
+                    f"USING convert_to({column.name}, 'UTF8')"
+                )
+            else:
+                null = "NULL" if column.nullable else "NOT NULL"
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} MODIFY {column.name} LONGBLOB {null}")
+
+def compress_bodies(engine: Engine, batch_size: int = COMPRESS_BATCH) -> Tuple[int, int]:
+    """Rewrite uncompressed values of every CompressedText column with the current codec, in id
+    order, one transaction per batch, so it can run against a live database and be resumed.
+    Returns (rewritten, scanned) over all columns."""
+    if WRITE_CODEC is None:
+        raise RuntimeError("BODY_COMPRESSION=none; nothing to compress to")
+    ensure_schema(engine)
+    rewritten = scanned = 0
+    for table, column in compressed_columns():
+        done = _compress_column(engine, table, column.name, batch_size)
+        rewritten += done[0]
+        scanned += done[1]
+    return rewritten, scanned
+
+def _compress_column(engine: Engine, table, name: str, batch_size: int) -> Tuple[int, int]:
+    rewrite = update(table).where(table.c.id == bindparam("b_id")).values({name: bindparam("b_value")})
+    rewritten = scanned = last_id = 0
+    while True:
+        with engine.begin() as conn:
+            # Raw driver values: a str (legacy SQLite TEXT) or bytes, compressed or not.
+            rows = conn.execute(
+                text(f"SELECT id, {name} FROM {table.name} WHERE id > :last ORDER BY id LIMIT :n"),
+                {"last": last_id, "n": batch_size},
+            ).all()
+            if not rows:
+                break
+            params = []
+            for row_id, raw in rows:
+                if raw is None or is_compressed(raw):
+                    continue
+                value = raw if isinstance(raw, str) else bytes(raw).decode("utf-8")
+                packed = compress_text(value)
+                if is_compressed(packed) or isinstance(raw, str):
+                    params.append({"b_id": row_id, "b_value": value})
+            if params:
+                conn.execute(rewrite, params)
+        scanned += len(rows)
+        rewritten += len(params)
+        last_id = rows[-1][0]
+        logger.info(f"🗜️ {table.name}.{name}: scanned {scanned}, compressed {rewritten} (last id {last_id})")
+    return rewritten, scanned
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if args == ["migrate"]:
+        from database import engine
+
+        ensure_schema(engine)
+        logger.info(f"✅ Schema applied ({schema_fingerprint()[:12]}).")
+        sys.exit(0)
+    if not args or args[0] != "compress-bodies" or set(args[1:]) - {"--vacuum"}:
+        sys.exit("usage: python db_migrations.py migrate | compress-bodies [--vacuum]")
+    from database import engine
+
+    rewritten, scanned = compress_bodies(engine)
+    logger.info(f"✅ Compressed {rewritten} of {scanned} values.")
+    if "--vacuum" in args and engine.dialect.name in {"sqlite", "postgresql"}:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+        logger.info("✅ VACUUM done; freed pages returned to the filesystem.")
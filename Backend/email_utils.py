@@ -1,34 +1,34 @@
 # email_utils.py
+import logging
 import os
-import aiosmtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from typing import Tuple
 from urllib.parse import urlencode
-from dotenv import load_dotenv
+from settings import load_env
+from sqlalchemy.orm import Session
 
-load_dotenv()
+from mail_queue import enqueue_email
+
+load_env()
+logger = logging.getLogger(__name__)
+
+# Development only: log verification links so accounts can be verified without SMTP.
+LOG_VERIFICATION_URLS = os.getenv("LOG_VERIFICATION_URLS", "false").lower() in {"1", "true", "yes"}
 
 def build_verification_url(email: str, token: str) -> str:
     base = os.getenv("BACKEND_BASE_URL", "http://localhost:8080")
     query = urlencode({"token": token, "email": email})
     return f"{base}/api/auth/verify-email?{query}"
 
-async def send_verification_email(to_email: str, token: str, display_name: str = "User"):
-    email_user = os.getenv("EMAIL_USER")
-    email_pass = os.getenv("EMAIL_PASS")
-    email_from = os.getenv("EMAIL_FROM", email_user)
+def log_verification_url(email: str, token: str) -> None:
+    if LOG_VERIFICATION_URLS:
+        logger.info(f"📧 Verification URL: {build_verification_url(email, token)}")
 
-    if not email_user or not email_pass:
-        print("⚠️ Gmail SMTP not configured (EMAIL_USER/EMAIL_PASS missing). Skipping email send.")
-        return
+VERIFICATION_SUBJECT = "Verify your email - LLM Email AutoWriter"
 
+def build_verification_email(to_email: str, token: str, display_name: str = "User") -> Tuple[str, str, str]:
+    """(subject, text, html) of the verification message."""
     verify_url = build_verification_url(to_email, token)
 
-    msg = MIMEMultipart("alternative")
-    msg["From"] = email_from
-    msg["To"] = to_email
-    msg["Subject"] = "Verify your email - LLM Email AutoWriter"
-
     text_part = f"""Hi {display_name},\n\nPlease verify your email by clicking the link below:\n{verify_url}\n\nIf you didn't sign up, ignore this message."""
 
     html_part = f"""\
@@ -50,19 +50,9 @@ async def send_verification_email(to_email: str, token: str, display_name: str =
 </html>
 """
 
-    msg.attach(MIMEText(text_part, "plain"))
-    msg.attach(MIMEText(html_part, "html"))
+    return VERIFICATION_SUBJECT, text_part, html_part
 
-    try:
-        await aiosmtplib.send(
-            msg,
-            hostname="smtp.gmail.com",
-            port=587,
-            start_tls=True,
-            username=email_user,
-            password=email_pass,
-            timeout=20,
-        )
-        print(f"📧 Sent verification email to {to_email}")
-    except Exception as e:
-        print(f"❌ Failed to send verification email to {to_email}: {e}")
+def queue_verification_email(db: Session, to_email: str, token: str, display_name: str = "User") -> None:
+    """Enqueue the verification message in the caller's transaction (see mail_queue)."""
+    subject, text_part, html_part = build_verification_email(to_email, token, display_name)
+    enqueue_email(db, to_email, subject, text_part, html_part)
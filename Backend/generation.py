@@ -0,0 +1,145 @@
+# generation.py
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Tuple
+
+from schemas import PromptRequest
+from prompts import BuiltPrompt, PromptTooLong, build_prompt
+from llm_client import llm
+from admission import AdmissionRejected, admission
+from generation_cache import generation_cache, cache_key
+from singleflight import SingleFlight
+from metrics import Counter, Histogram
+
+GENERATION_SINGLE_FLIGHT = os.getenv("GENERATION_SINGLE_FLIGHT", "true").lower() in {"1", "true", "yes"}
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+
+logger = logging.getLogger(__name__)
+single_flight = SingleFlight()
+
+GENERATION_VARIANTS = Histogram("generation_variants", "Drafts requested per generation.", buckets=(1, 2, 3, 4, 6, 8))
+VARIANT_CALLS = Counter("generation_variant_calls_total",
+                        "Upstream calls made for multi-variant generations (mode=shared: one `n` call; "
+                        "topup: extra calls when the server returned fewer choices).", ("mode",))
+VARIANT_PROMPT_TOKENS_SAVED = Counter("generation_variant_prompt_tokens_saved_total",
+                                      "Prompt tokens not prefilled again because variants shared one call "
+                                      "(prompt tokens x (choices - 1)).")
+
+@dataclass
+class ItemResult:
+    index: int
+    request: PromptRequest
+    tone: str
+    length: str
+    text: Optional[str] = None
+    source: Optional[str] = None
+    error: Optional[str] = None
+
+def generation_key(prompt: BuiltPrompt) -> str:
+    return cache_key(prompt.cache_text, llm.model, {**prompt.params, "prompt_version": prompt.version})
+
+async def generate_text(prompt: BuiltPrompt, user_id: int, fresh: bool = False, charge: bool = False) -> Tuple[str, str]:
+    """Return (email text, source) where source is HIT, MISS or COALESCED.
+
+    Only upstream calls go through admission, under the user who makes them; cache hits and
+    coalesced followers never queue. A follower whose leader was rejected by admission is not
+    rejected with it: it tries again under its own name. With `charge` a successful upstream
+    call is also debited from the caller's rate bucket (batch items, which are not charged up
+    front); followers are never charged for the leader's call.
+    """
+    key = generation_key(prompt)
+    cached = await generation_cache.lookup(key, prompt.params, fresh=fresh)
+    if cached is not None:
+        return cached, "HIT"
+
+    led = False
+
+    async def upstream() -> str:
+        nonlocal led
+        led = True
+        async with admission.slot(user_id):
+            start = time.perf_counter()
+            completion = await llm.chat_completion(messages=prompt.messages, **prompt.params)
+        text = completion.choices[0].message.content.strip()
+        await generation_cache.store(key, prompt.params, text, time.perf_counter() - start)
+        return text
+
+    # `fresh` asks for a new completion, so it never rides on someone else's in-flight call.
+    if fresh or not GENERATION_SINGLE_FLIGHT:
+        text, shared = await upstream(), False
+    else:
+        while True:
+            try:
+                text, shared = await single_flight.do(key, upstream)
+                break
+            except AdmissionRejected:
+                if led:
+                    raise
+                # The leader's admission said no, not ours: lead (or join) a new call.
+    if charge and not shared:
+        await admission.charge(user_id)
+    return text, "COALESCED" if shared else "MISS"
+
+def record_variants(n: int, choices: int, usage) -> None:
+    """Metrics for one shared `n` call: `choices` drafts from a single prefill of the prompt."""
+    GENERATION_VARIANTS.observe(n)
+    VARIANT_CALLS.labels("shared").inc()
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if prompt_tokens and choices > 1:
+        VARIANT_PROMPT_TOKENS_SAVED.inc(prompt_tokens * (choices - 1))
+
+async def generate_variants(prompt: BuiltPrompt, user_id: int, n: int) -> List[str]:
+    """`n` drafts of one prompt from a single upstream call: vLLM prefills the prompt once and
+    samples `n` completions from it. Drafts are meant to differ, so the cache and single-flight
+    are bypassed. A server that ignores `n` (fewer choices back) is topped up with separate calls."""
+    async with admission.slot(user_id):
+        completion = await llm.chat_completion(messages=prompt.messages, n=n, **prompt.params)
+        choices = sorted(completion.choices, key=lambda choice: choice.index)
+        texts = [choice.message.content.strip() for choice in choices[:n]]
+        record_variants(n, len(texts), getattr(completion, "usage", None))
+        if len(texts) < n:
+            VARIANT_CALLS.labels("topup").inc(n - len(texts))
+            extra = await asyncio.gather(*(
+                llm.chat_completion(messages=prompt.messages, **prompt.params) for _ in range(n - len(texts))
+            ))
+            texts += [completion.choices[0].message.content.strip() for completion in extra]
+    return texts
+
+async def generate_many(
+    requests: List[PromptRequest], user_id: int, fresh: bool = False, concurrency: int = BATCH_MAX_CONCURRENCY
+) -> AsyncIterator[ItemResult]:
+    """Fan requests out with at most `concurrency` in flight and yield results as they complete.
+
+    Keeping several requests in flight at once is what lets vLLM's continuous batching batch them.
+    Each item that reaches the LLM is charged to the user's rate bucket; cache hits, coalesced
+    followers and failed calls are free.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int, req: PromptRequest) -> ItemResult:
+        result = ItemResult(index=index, request=req, tone=req.tone.value, length=req.length.value)
+        try:
+            prompt = build_prompt(req)
+        except PromptTooLong as e:
+            result.error = str(e)
+            return result
+        async with semaphore:
+            try:
+                result.text, result.source = await generate_text(prompt, user_id, fresh=fresh, charge=True)
+            except AdmissionRejected as e:
+                result.error = f"{e.reason}; retry after {e.retry_after}s"
+            except Exception as e:
+                logger.error(f"[LLM ERROR] batch item {index} backend={llm.name} model={llm.model} :: {e}")
+                result.error = "Email generation service unavailable"
+        return result
+
+    tasks = [asyncio.ensure_future(one(i, req)) for i, req in enumerate(requests)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,205 @@
+# generation_cache.py
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from settings import load_env
+
+load_env()
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_BACKEND         = os.getenv("GENERATION_CACHE_BACKEND", "memory").lower()  # memory | redis | off
+GENERATION_CACHE_TTL             = int(os.getenv("GENERATION_CACHE_TTL", 3600))
+GENERATION_CACHE_MAX_ENTRIES     = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", 5000))
+GENERATION_CACHE_MAX_TEMPERATURE = float(os.getenv("GENERATION_CACHE_MAX_TEMPERATURE", 1.0))
+GENERATION_CACHE_REDIS_URL       = os.getenv("GENERATION_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    return _WS.sub(" ", text).strip().lower()
+
+
+def cache_key(user_msg: str, model: str, params: Dict[str, Any]) -> str:
+    raw = json.dumps(
+        {"msg": normalize_prompt(user_msg), "model": model, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    text: str
+    expires_at: float
+    upstream_seconds: float = 0.0
+
+
+class CacheCounters:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypassed = 0
+        self.errors = 0
+        self.saved_upstream_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypassed": self.bypassed,
+            "errors": self.errors,
+            "saved_upstream_seconds": round(self.saved_upstream_seconds, 3),
+        }
+
+
+class InMemoryCache:
+    """Per-process LRU with a TTL. Only touched from the event loop, so no locking."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl: int, counters: CacheCounters):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counters = counters
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.counters.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, text: str, upstream_seconds: float) -> None:
+        self._entries[key] = CacheEntry(text, time.monotonic() + self.ttl, upstream_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters.evictions += 1
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisCache:
+    """Shared cache for multiple workers; any Redis-protocol server (or a local stand-in) works."""
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl: int, counters: CacheCounters, prefix: str = "genc:"):
+        import redis.asyncio as redis  # optional dependency
+
+        self.ttl = ttl
+        self.counters = counters
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self._redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CacheEntry(data["text"], 0.0, data.get("upstream_seconds", 0.0))
+
+    async def set(self, key: str, text: str, upstream_seconds: float) -> None:
+        payload = json.dumps({"text": text, "upstream_seconds": upstream_seconds})
+        await self._redis.set(self.prefix + key, payload, ex=self.ttl)
+
+    async def clear(self) -> None:
+        async for key in self._redis.scan_iter(match=self.prefix + "*"):
+            await self._redis.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class GenerationCache:
+    """Exact-match cache of completions keyed on the normalized prompt, model and sampling params.
+
+    Policy: nothing is cached when the backend is `off` or the temperature is above
+    GENERATION_CACHE_MAX_TEMPERATURE; `fresh=True` skips the lookup but still refreshes the entry.
+    """
+
+    def __init__(self):
+        self.counters = CacheCounters()
+        self.backend = None
+        if GENERATION_CACHE_BACKEND == "memory":
+            self.backend = InMemoryCache(GENERATION_CACHE_MAX_ENTRIES, GENERATION_CACHE_TTL, self.counters)
+        elif GENERATION_CACHE_BACKEND == "redis":
+            try:
+                self.backend = RedisCache(GENERATION_CACHE_REDIS_URL, GENERATION_CACHE_TTL, self.counters)
+            except ImportError:
+                logger.warning("⚠️ GENERATION_CACHE_BACKEND=redis but the redis package is missing; using memory cache.")
+                self.backend = InMemoryCache(GENERATION_CACHE_MAX_ENTRIES, GENERATION_CACHE_TTL, self.counters)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def cacheable(self, params: Dict[str, Any]) -> bool:
+        return self.enabled and params.get("temperature", 0.0) <= GENERATION_CACHE_MAX_TEMPERATURE
+
+    async def lookup(self, key: str, params: Dict[str, Any], fresh: bool = False) -> Optional[str]:
+        if not self.cacheable(params):
+            return None
+        if fresh:
+            self.counters.bypassed += 1
+            return None
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            self.counters.errors += 1
+            logger.warning(f"[CACHE ERROR] get: {e}")
+            return None
+        if entry is None:
+            self.counters.misses += 1
+            return None
+        self.counters.hits += 1
+        self.counters.saved_upstream_seconds += entry.upstream_seconds
+        return entry.text
+
+    async def store(self, key: str, params: Dict[str, Any], text: str, upstream_seconds: float) -> None:
+        if not self.cacheable(params) or not text:
+            return
+        try:
+            await self.backend.set(key, text, upstream_seconds)
+            self.counters.sets += 1
+        except Exception as e:
+            self.counters.errors += 1
+            logger.warning(f"[CACHE ERROR] set: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name if self.backend else "off",
+            "ttl_seconds": GENERATION_CACHE_TTL,
+            "max_entries": GENERATION_CACHE_MAX_ENTRIES,
+            "size": self.backend.size() if self.backend else 0,
+            **self.counters.as_dict(),
+        }
+
+
+generation_cache = GenerationCache()
@@ -0,0 +1,116 @@
+# http_compression.py
+# Negotiated response compression (br, then gzip) for complete JSON bodies. Streaming responses
+# (SSE, NDJSON exports) pass through untouched, so tokens and pages are never held back.
+import gzip
+import logging
+import os
+from typing import List, Optional, Tuple
+
+from settings import load_env
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import Counter
+
+load_env()
+logger = logging.getLogger(__name__)
+
+RESPONSE_COMPRESSION_ENABLED   = os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() in {"1", "true", "yes"}
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
+RESPONSE_GZIP_LEVEL            = int(os.getenv("RESPONSE_GZIP_LEVEL", 5))
+RESPONSE_BROTLI_QUALITY        = int(os.getenv("RESPONSE_BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = ("application/json",)
+
+response_bytes_total = Counter(
+    "http_response_body_bytes_total", "JSON response bytes before and after compression.", ["encoding", "stage"]
+)
+
+try:
+    import brotli  # optional dependency
+except ImportError:
+    brotli = None
+    logger.info("ℹ️ brotli not installed (pip install brotli); responses are gzip-compressed only.")
+
+
+def parse_accept_encoding(header: str) -> List[Tuple[str, float]]:
+    codings = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            codings.append((name.strip().lower(), q))
+    return codings
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    offered = dict(parse_accept_encoding(header))
+    wildcard = offered.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = offered.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES) and "content-encoding" not in headers:
+                    start = message  # decided on the first body chunk
+                    return
+                await send(message)
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            held, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                MutableHeaders(raw=held["headers"]).add_vary_header("Accept-Encoding")
+                await send(held)
+                await send(message)
+                return
+            packed = compress_body(body, encoding)
+            response_bytes_total.labels(encoding, "identity").inc(len(body))
+            response_bytes_total.labels(encoding, "encoded").inc(len(packed))
+            headers = MutableHeaders(raw=held["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(packed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(held)
+            await send({"type": "http.response.body", "body": packed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,445 @@
+# jobs.py
+# Offline batch generation. POST /api/jobs stores a job and one row per prompt; JobWorker
+# keeps up to JOB_CONCURRENCY items in flight against the LLM (through admission control,
+# as one identity shared by all jobs) and checkpoints finished items in small transactions.
+# Claimed items are leased, so after a crash the unfinished ones are claimed again and the
+# job resumes where its last checkpoint left off.
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from settings import load_env
+from pydantic import ValidationError
+from sqlalchemy import bindparam, func, insert
+from sqlalchemy.orm import Session
+
+from admission import AdmissionRejected, admission
+from database import run_db
+from llm_client import llm
+from metrics import Counter, Gauge
+from models import GenerationJob, GenerationJobItem
+from prompts import build_prompt
+from schemas import PromptRequest
+
+load_env()
+logger = logging.getLogger(__name__)
+
+JOB_WORKER_ENABLED     = os.getenv("JOB_WORKER_ENABLED", "true").lower() in {"1", "true", "yes"}
+JOB_CONCURRENCY        = int(os.getenv("JOB_CONCURRENCY", 8))
+JOB_MAX_ITEMS          = int(os.getenv("JOB_MAX_ITEMS", 100000))
+JOB_MAX_BYTES          = int(os.getenv("JOB_MAX_BYTES", 64 * 1024 * 1024))
+JOB_MAX_ATTEMPTS       = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_DELAY        = float(os.getenv("JOB_RETRY_DELAY", 30))
+JOB_LEASE_SECONDS      = float(os.getenv("JOB_LEASE_SECONDS", 300))
+JOB_CHECKPOINT_ITEMS   = int(os.getenv("JOB_CHECKPOINT_ITEMS", 50))
+JOB_CHECKPOINT_SECONDS = float(os.getenv("JOB_CHECKPOINT_SECONDS", 2))
+JOB_POLL_INTERVAL      = float(os.getenv("JOB_POLL_INTERVAL", 5))
+JOB_INSERT_CHUNK       = 1000
+JOB_ADMISSION_KEY      = "jobs"
+
+JOB_ITEMS = Counter("job_items_total", "Offline job items by outcome.", ("outcome",))
+
+CSV_TYPES = {"text/csv", "application/csv"}
+JSONL_TYPES = {"application/jsonl", "application/x-ndjson", "application/x-jsonlines", "application/json-lines"}
+
+
+class JobInputError(ValueError):
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+def input_format(content_type: str, explicit: Optional[str] = None) -> Optional[str]:
+    if explicit:
+        return explicit.lower()
+    media = (content_type or "").split(";")[0].strip().lower()
+    if media in CSV_TYPES:
+        return "csv"
+    if media in JSONL_TYPES:
+        return "jsonl"
+    return None
+
+
+def _rows(body: bytes, fmt: str) -> Iterator[Tuple[int, Any]]:
+    text = body.decode("utf-8-sig")
+    if fmt == "csv":
+        # Line numbers count the header as line 1.
+        for i, row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+            yield i, row
+        return
+    for i, line in enumerate(text.splitlines(), start=1):
+        if line.strip():
+            try:
+                yield i, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield i, e
+
+
+def parse_items(body: bytes, fmt: str, max_errors: int = 20) -> List[PromptRequest]:
+    """Validate every row as a PromptRequest; raises JobInputError listing the first bad rows."""
+    items: List[PromptRequest] = []
+    errors: List[Dict[str, Any]] = []
+    for line, row in _rows(body, fmt):
+        try:
+            if isinstance(row, Exception):
+                raise ValueError(f"invalid JSON: {row}")
+            if not isinstance(row, dict):
+                raise ValueError("expected an object with prompt, tone and length")
+            items.append(PromptRequest(**row))
+        except ValidationError as e:
+            message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append({"line": line, "error": message})
+        except (ValueError, TypeError) as e:
+            errors.append({"line": line, "error": str(e)})
+        if len(errors) >= max_errors:
+            break
+        if len(items) > JOB_MAX_ITEMS:
+            raise JobInputError([{"line": line, "error": f"more than {JOB_MAX_ITEMS} items"}])
+    if errors:
+        raise JobInputError(errors)
+    if not items:
+        raise JobInputError([{"line": 0, "error": "no items"}])
+    return items
+
+
+def create_job(db: Session, user_id: int, items: List[PromptRequest]) -> Dict[str, Any]:
+    """Insert the job and its items in one transaction (chunked executemany inserts)."""
+    job = GenerationJob(user_id=user_id, total_items=len(items))
+    db.add(job)
+    db.flush()
+    for start in range(0, len(items), JOB_INSERT_CHUNK):
+        db.execute(insert(GenerationJobItem), [
+            {"job_id": job.id, "position": start + i, "prompt": req.prompt,
+             "tone": req.tone.value, "length": req.length.value}
+            for i, req in enumerate(items[start:start + JOB_INSERT_CHUNK])
+        ])
+    db.commit()
+    return job_summary(job)
+
+
+def job_summary(job: GenerationJob) -> Dict[str, Any]:
+    end = job.finished_at or datetime.utcnow()
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else 0.0
+    done = job.completed_items + job.failed_items
+    per_min = job.completed_items / elapsed * 60 if elapsed > 0 else None
+    remaining = job.total_items - done
+    return {
+        "id": job.id,
+        "status": job.status,
+        "total_items": job.total_items,
+        "completed_items": job.completed_items,
+        "failed_items": job.failed_items,
+        "remaining_items": remaining,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "emails_per_min": round(per_min, 1) if per_min else None,
+        "eta_seconds": round(remaining / per_min * 60) if per_min and job.status == "running" else None,
+    }
+
+
+def get_job(db: Session, user_id: int, job_id: int) -> Optional[Dict[str, Any]]:
+    job = db.query(GenerationJob).filter(GenerationJob.id == job_id, GenerationJob.user_id == user_id).first()
+    return job_summary(job) if job else None
+
+
+def list_jobs(db: Session, user_id: int, limit: int) -> List[Dict[str, Any]]:
+    jobs = (
+        db.query(GenerationJob).filter(GenerationJob.user_id == user_id)
+        .order_by(GenerationJob.created_at.desc(), GenerationJob.id.desc()).limit(limit).all()
+    )
+    return [job_summary(job) for job in jobs]
+
+
+def cancel_job(db: Session, user_id: int, job_id: int) -> Optional[Dict[str, Any]]:
+    job = db.query(GenerationJob).filter(GenerationJob.id == job_id, GenerationJob.user_id == user_id).first()
+    if job is None:
+        return None
+    if job.status in ("pending", "running"):
+        db.query(GenerationJobItem).filter(
+            GenerationJobItem.job_id == job_id, GenerationJobItem.status.in_(("pending", "running"))
+        ).update({GenerationJobItem.status: "cancelled"}, synchronize_session=False)
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    return job_summary(job)
+
+
+def result_page(db: Session, job_id: int, after: int, limit: int) -> List[Dict[str, Any]]:
+    """One keyset page of items in input order, for the JSONL export."""
+    rows = (
+        db.query(
+            GenerationJobItem.position, GenerationJobItem.prompt, GenerationJobItem.tone,
+            GenerationJobItem.length, GenerationJobItem.status, GenerationJobItem.generated_email,
+            GenerationJobItem.error,
+        )
+        .filter(GenerationJobItem.job_id == job_id, GenerationJobItem.position > after)
+        .order_by(GenerationJobItem.position).limit(limit).all()
+    )
+    return [
+        {"index": r.position, "prompt": r.prompt, "tone": r.tone, "length": r.length, "status": r.status,
+         "generated_email": r.generated_email, "error": r.error}
+        for r in rows
+    ]
+
+
+@dataclass
+class ClaimedItem:
+    id: int
+    job_id: int
+    request: PromptRequest
+    attempts: int
+    lease_until: datetime  # claim token: only the current leaseholder may write the result
+
+
+@dataclass
+class ItemOutcome:
+    item: ClaimedItem
+    text: Optional[str] = None
+    error: Optional[str] = None
+    retry_free: bool = False  # not the item's fault (e.g. admission timeout): don't count the attempt
+
+
+def _claim(db: Session, limit: int, lease_seconds: float) -> List[ClaimedItem]:
+    """Lease up to `limit` due items (pending, or running with a lapsed lease) and mark their jobs running."""
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=lease_seconds, microseconds=random.randint(0, 999))
+    due = (
+        GenerationJobItem.status.in_(("pending", "running")),
+        GenerationJobItem.lease_until <= now,
+    )
+    ids = [
+        row.id for row in db.query(GenerationJobItem.id).filter(*due)
+        .order_by(GenerationJobItem.position, GenerationJobItem.id).limit(limit).with_for_update(skip_locked=True)
+    ]
+    if not ids:
+        db.rollback()
+        return []
+    db.query(GenerationJobItem).filter(GenerationJobItem.id.in_(ids), *due).update(
+        {GenerationJobItem.status: "running", GenerationJobItem.lease_until: lease_until},
+        synchronize_session=False,
+    )
+    rows = (
+        db.query(GenerationJobItem)
+        .filter(GenerationJobItem.id.in_(ids), GenerationJobItem.lease_until == lease_until)
+        .order_by(GenerationJobItem.position, GenerationJobItem.id)
+        .all()
+    )
+    claimed = [
+        ClaimedItem(r.id, r.job_id, PromptRequest(prompt=r.prompt, tone=r.tone, length=r.length), r.attempts,
+                    lease_until)
+        for r in rows
+    ]
+    job_ids = {c.job_id for c in claimed}
+    if job_ids:
+        db.query(GenerationJob).filter(GenerationJob.id.in_(job_ids), GenerationJob.status == "pending").update(
+            {GenerationJob.status: "running", GenerationJob.started_at: now}, synchronize_session=False,
+        )
+    db.commit()
+    return claimed
+
+
+_item_table = GenerationJobItem.__table__
+_finish_item = (
+    _item_table.update()
+    .where(_item_table.c.id == bindparam("b_id"), _item_table.c.status == "running",
+           _item_table.c.lease_until == bindparam("b_claim"))
+    .values(status=bindparam("b_status"), generated_email=bindparam("b_text"), error=bindparam("b_error"),
+            attempts=bindparam("b_attempts"), lease_until=bindparam("b_lease"), completed_at=bindparam("b_done_at"))
+)
+
+
+def _checkpoint(db: Session, outcomes: List[ItemOutcome]) -> Dict[str, int]:
+    """Write back finished items and bump their jobs' counters in one transaction."""
+    now = datetime.utcnow()
+    counts = {"done": 0, "retried": 0, "failed": 0}
+    per_job: Dict[int, List[int]] = {}
+    params = []
+    for o in outcomes:
+        attempts = o.item.attempts + (0 if o.retry_free else 1)
+        if o.error is None:
+            status = "done"
+        elif o.retry_free or attempts < JOB_MAX_ATTEMPTS:
+            status = "retried"
+        else:
+            status = "failed"
+        counts[status] += 1
+        params.append({
+            "b_id": o.item.id,
+            "b_claim": o.item.lease_until,
+            "b_status": "pending" if status == "retried" else status,
+            "b_text": o.text,
+            "b_error": o.error[:1000] if o.error else None,
+            "b_attempts": attempts,
+            "b_lease": now + timedelta(seconds=JOB_RETRY_DELAY) if status == "retried" else now,
+            "b_done_at": now if status != "retried" else None,
+        })
+        if status != "retried":
+            done_failed = per_job.setdefault(o.item.job_id, [0, 0])
+            done_failed[0 if status == "done" else 1] += 1
+    if params:
+        db.execute(_finish_item, params)
+    for job_id, (done, failed) in per_job.items():
+        db.query(GenerationJob).filter(GenerationJob.id == job_id, GenerationJob.status == "running").update(
+            {GenerationJob.completed_items: GenerationJob.completed_items + done,
+             GenerationJob.failed_items: GenerationJob.failed_items + failed},
+            synchronize_session=False,
+        )
+    if per_job:
+        db.query(GenerationJob).filter(
+            GenerationJob.id.in_(per_job), GenerationJob.status == "running",
+            GenerationJob.completed_items + GenerationJob.failed_items >= GenerationJob.total_items,
+        ).update({GenerationJob.status: "completed", GenerationJob.finished_at: now}, synchronize_session=False)
+    db.commit()
+    return counts
+
+
+def _backlog(db: Session) -> Dict[str, int]:
+    rows = (
+        db.query(GenerationJobItem.status, func.count(GenerationJobItem.id))
+        .filter(GenerationJobItem.status.in_(("pending", "running")))
+        .group_by(GenerationJobItem.status).all()
+    )
+    return {"pending": 0, "running": 0, **{status: n for status, n in rows}}
+
+
+class JobWorker:
+    """Keeps JOB_CONCURRENCY items in flight, refilling as each one finishes rather than per
+    batch, and checkpoints every JOB_CHECKPOINT_ITEMS items or JOB_CHECKPOINT_SECONDS."""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+        self.checkpoints = 0
+        self._completions: Deque[Tuple[float, int]] = deque(maxlen=1000)  # (checkpoint time, items done)
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🗂️ Job worker started (concurrency {self.concurrency}).")
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                worked = await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job worker iteration failed: {e}")
+                worked = 0
+            if not worked:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain(self) -> int:
+        """Process due items until none are left; returns how many were processed.
+        Unfinished items of a cancelled drain keep their lease and are claimed again later."""
+        queued: Deque[ClaimedItem] = deque()
+        in_flight: Set[asyncio.Task] = set()
+        finished: List[ItemOutcome] = []
+        last_checkpoint = time.monotonic()
+        processed = 0
+        exhausted = False
+        try:
+            while True:
+                if not exhausted and len(queued) < self.concurrency:
+                    claimed = await run_db(_claim, self.concurrency * 2 - len(queued), JOB_LEASE_SECONDS)
+                    queued.extend(claimed)
+                    exhausted = not claimed
+                while queued and len(in_flight) < self.concurrency:
+                    in_flight.add(asyncio.ensure_future(self._generate(queued.popleft())))
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(
+                    in_flight, timeout=JOB_CHECKPOINT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                finished.extend(task.result() for task in done)
+                processed += len(done)
+                if done:
+                    exhausted = False  # a retry may have come due, and new jobs may have arrived
+                if finished and (len(finished) >= JOB_CHECKPOINT_ITEMS
+                                 or time.monotonic() - last_checkpoint >= JOB_CHECKPOINT_SECONDS):
+                    await self._checkpoint(finished)
+                    finished, last_checkpoint = [], time.monotonic()
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if finished:
+                await asyncio.shield(self._checkpoint(finished))
+        return processed
+
+    async def _checkpoint(self, outcomes: List[ItemOutcome]) -> None:
+        counts = await run_db(_checkpoint, outcomes)
+        self.done += counts["done"]
+        self.retried += counts["retried"]
+        self.failed += counts["failed"]
+        self.checkpoints += 1
+        self._completions.append((time.monotonic(), counts["done"]))
+        for outcome, n in counts.items():
+            if n:
+                JOB_ITEMS.labels(outcome).inc(n)
+
+    async def _generate(self, item: ClaimedItem) -> ItemOutcome:
+        try:
+            prompt = build_prompt(item.request)
+            async with admission.slot(JOB_ADMISSION_KEY):
+                completion = await llm.chat_completion(messages=prompt.messages, **prompt.params)
+            return ItemOutcome(item, text=completion.choices[0].message.content.strip())
+        except AdmissionRejected as e:
+            return ItemOutcome(item, error=e.reason, retry_free=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Job {item.job_id} item #{item.id} failed: {e}")
+            return ItemOutcome(item, error=f"{type(e).__name__}: {e}")
+
+    def emails_per_min(self, window: float = 60.0) -> float:
+        cutoff = time.monotonic() - window
+        return round(sum(n for t, n in self._completions if t >= cutoff) * 60 / window, 1)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "concurrency": self.concurrency,
+            "backlog": await run_db(_backlog),
+            "done": self.done,
+            "retried": self.retried,
+            "failed": self.failed,
+            "checkpoints": self.checkpoints,
+            "emails_per_min_last_minute": self.emails_per_min(),
+        }
+
+
+job_worker = JobWorker(JOB_CONCURRENCY)
+admission.set_user_limit(JOB_ADMISSION_KEY, JOB_CONCURRENCY)
+Gauge("job_emails_per_minute", "Offline job items completed over the last minute.",
+      fn=lambda: {(): job_worker.emails_per_min()})
@@ -0,0 +1,99 @@
+# jobs_router.py
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from admission import admission
+from database import run_db
+from jobs import (
+    JOB_MAX_BYTES, JobInputError, cancel_job, create_job, get_job, input_format, job_worker,
+    list_jobs, parse_items, result_page,
+)
+from auth import require_ops
+from user_cache import CurrentUser, get_current_user_identity
+
+router = APIRouter()  # mounted at /api/jobs
+
+RESULT_PAGE_SIZE = 500
+
+async def read_body(request: Request, limit: int) -> bytes:
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=f"Upload larger than {limit} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+@router.post("", status_code=202)
+async def submit_job(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", regex="^(csv|jsonl)$"),
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    """Upload prompts as CSV (header `prompt,tone,length`) or JSONL (one PromptRequest per line),
+    chosen by `Content-Type` (text/csv, application/x-ndjson) or `?format=`. Returns the queued job."""
+    fmt = input_format(request.headers.get("content-type", ""), fmt)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=")
+    await admission.check_rate(user.id)
+    body = await read_body(request, JOB_MAX_BYTES)
+    try:
+        items = await run_in_threadpool(parse_items, body, fmt)
+    except JobInputError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="Upload must be UTF-8")
+    job = await run_db(create_job, user.id, items)
+    job_worker.notify()
+    return job
+
+@router.get("")
+async def get_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    return await run_db(list_jobs, user.id, limit)
+
+@router.get("/worker", dependencies=[Depends(require_ops)])
+async def worker_stats():
+    return await job_worker.stats()
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: int, user: CurrentUser = Depends(get_current_user_identity)):
+    job = await run_db(get_job, user.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/{job_id}/cancel")
+async def cancel(job_id: int, user: CurrentUser = Depends(get_current_user_identity)):
+    job = await run_db(cancel_job, user.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}/results")
+async def job_results(
+    job_id: int,
+    after: int = Query(-1, ge=-1, description="resume the export after this item index"),
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    """JSONL, one line per item in input order, read a page at a time; items still queued
+    are included with their current status."""
+    if await run_db(get_job, user.id, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def lines():
+        cursor = after
+        while True:
+            page = await run_db(result_page, job_id, cursor, RESULT_PAGE_SIZE)
+            if not page:
+                return
+            yield "".join(json.dumps(row) + "\n" for row in page)
+            cursor = page[-1]["index"]
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,352 @@
+# llm_client.py
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, List, Optional
+
+from settings import load_env
+
+if TYPE_CHECKING:  # imported on first use: openai + httpx are a third of a cold import
+    import httpx
+    from openai import AsyncOpenAI
+
+from llm_router import LLMRouter, register_gauges
+from metrics import Gauge, LLM_ERRORS, LLM_QUEUE, LLM_TOTAL, LLM_TTFT, percentile, record_usage
+
+load_env()
+
+LLM_BACKEND   = os.getenv("LLM_BACKEND", "auto").lower()  # auto (LLM_BACKENDS, VLLM_BASE_URL, else HF Router) | local
+VLLM_BASE_URL = os.getenv("VLLM_BASE_URL", "").rstrip("/")
+VLLM_MODEL    = os.getenv("VLLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+HF_TOKEN      = os.getenv("HF_TOKEN")
+
+LLM_TIMEOUT          = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_MAX_CONNECTIONS  = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE    = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+LLM_MAX_CONCURRENCY  = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_STATS_WINDOW     = int(os.getenv("LLM_STATS_WINDOW", 1000))
+LLM_LATENCY_EWMA     = float(os.getenv("LLM_LATENCY_EWMA", 0.2))  # weight of the newest sample
+# Several OpenAI-compatible servers for the same model: "[name=]url,[name=]url" (overrides VLLM_BASE_URL)
+LLM_BACKENDS         = os.getenv("LLM_BACKENDS", "")
+# Ask for a final `usage` chunk on streams (vLLM/OpenAI support it; not every router does)
+LLM_STREAM_INCLUDE_USAGE = os.getenv(
+    "LLM_STREAM_INCLUDE_USAGE", "true" if VLLM_BASE_URL else "false"
+).lower() in {"1", "true", "yes"}
+
+
+@dataclass
+class StreamStats:
+    """Per-request timings for a streamed completion; `started` is when the request arrived."""
+    started: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    completion_tokens: int = 0
+    usage: Any = None  # the final chunk's usage, when the server sends one (include_usage)
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return round((self.first_token_at - self.started) * 1000, 2)
+
+    @property
+    def total_ms(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return round((self.finished_at - self.started) * 1000, 2)
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if self.first_token_at is None or self.finished_at is None:
+            return None
+        decode_s = self.finished_at - self.first_token_at
+        if decode_s <= 0:
+            return None
+        return round(self.completion_tokens / decode_s, 2)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ttft_ms": self.ttft_ms,
+            "total_ms": self.total_ms,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_sec": self.tokens_per_sec,
+        }
+
+
+def _ewma(current: Optional[float], sample: float) -> float:
+    return sample if current is None else (1 - LLM_LATENCY_EWMA) * current + LLM_LATENCY_EWMA * sample
+
+
+class LLMBackend:
+    """One OpenAI-compatible endpoint with a pooled keep-alive connection and a concurrency cap."""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: Optional[str], max_concurrency: int):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.api_key = api_key or "dummy"
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._ttft_ms: Deque[float] = deque(maxlen=LLM_STATS_WINDOW)
+        self._tokens_per_sec: Deque[float] = deque(maxlen=LLM_STATS_WINDOW)
+        self._http: Optional["httpx.AsyncClient"] = None
+        self._client: Optional["AsyncOpenAI"] = None
+        self._queue_metric = LLM_QUEUE.labels(name, model)
+        self._ttft_metric = LLM_TTFT.labels(name, model)
+        self._total_metric = LLM_TOTAL.labels(name, model, "false")
+        self._stream_total_metric = LLM_TOTAL.labels(name, model, "true")
+        self._error_metric = LLM_ERRORS.labels(name, model)
+        self.ewma_latency_s: Optional[float] = None
+        self.ewma_ttft_s: Optional[float] = None
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        if self._http is None or self._http.is_closed:
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                timeout=LLM_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                ),
+            )
+            self._client = None
+        return self._http
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        http = self.http
+        if self._client is None:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                timeout=LLM_TIMEOUT,
+                max_retries=0,
+                http_client=http,
+            )
+        return self._client
+
+    async def _acquire(self) -> None:
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self._queue_metric.observe(time.perf_counter() - start)
+        self.in_flight += 1
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def chat_completion(self, messages: List[Dict[str, str]], **params: Any):
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            completion = await self.client.chat.completions.create(
+                model=self.model, messages=messages, **params
+            )
+        except Exception:
+            self._error_metric.inc()
+            raise
+        finally:
+            self._release()
+        elapsed = time.perf_counter() - start
+        self._total_metric.observe(elapsed)
+        self.ewma_latency_s = _ewma(self.ewma_latency_s, elapsed)
+        record_usage(self.name, self.model, getattr(completion, "usage", None))
+        return completion
+
+    async def stream_chat_completion(
+        self, messages: List[Dict[str, str]], stats: StreamStats, **params: Any
+    ) -> AsyncIterator[str]:
+        """Yield content deltas as they arrive; with `n` > 1, (choice index, delta) pairs, the
+        choices interleaved as the server sends them. Closing the generator (e.g. on client
+        disconnect) closes the upstream response, which cancels the request in vLLM."""
+        indexed = (params.get("n") or 1) > 1
+        await self._acquire()
+        stream = None
+        start = time.perf_counter()
+        if LLM_STREAM_INCLUDE_USAGE:
+            params.setdefault("extra_body", {}).setdefault("stream_options", {"include_usage": True})
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model, messages=messages, stream=True, **params
+            )
+            final_usage = None
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                if isinstance(usage, dict):  # older openai clients keep the chunk's usage as a plain dict
+                    usage = SimpleNamespace(**usage)
+                if usage and getattr(usage, "completion_tokens", None):
+                    final_usage = usage
+                for choice in chunk.choices:
+                    delta = choice.delta.content
+                    if not delta:
+                        continue
+                    if stats.first_token_at is None:
+                        stats.first_token_at = time.perf_counter()
+                        self._ttft_metric.observe(stats.first_token_at - start)
+                        self.ewma_ttft_s = _ewma(self.ewma_ttft_s, stats.first_token_at - start)
+                    stats.completion_tokens += 1
+                    yield (choice.index, delta) if indexed else delta
+            stats.finished_at = time.perf_counter()
+            self._stream_total_metric.observe(stats.finished_at - start)
+            if final_usage is not None:
+                stats.completion_tokens = final_usage.completion_tokens
+                stats.usage = final_usage
+                record_usage(self.name, self.model, final_usage)
+            self._record(stats)
+        except Exception:
+            self._error_metric.inc()
+            raise
+        finally:
+            if stream is not None:
+                await stream.close()
+            self._release()
+
+    def _record(self, stats: StreamStats) -> None:
+        if stats.ttft_ms is not None:
+            self._ttft_ms.append(stats.ttft_ms)
+        if stats.tokens_per_sec is not None:
+            self._tokens_per_sec.append(stats.tokens_per_sec)
+
+    async def probe(self, timeout: float = 10.0) -> Dict[str, Any]:
+        """GET {base_url}/models: the health check for vLLM and the HF Router alike."""
+        url = f"{self.base_url}/models"
+        try:
+            r = await self.http.get(url, timeout=timeout, headers={"Authorization": f"Bearer {self.api_key}"})
+            return {"backend": self.name, "ok": r.status_code == 200, "status": r.status_code, "url": url, "json": r.json()}
+        except Exception as e:
+            return {"backend": self.name, "ok": False, "url": url, "error": str(e)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "base_url": self.base_url,
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "stream": {
+                "samples": len(self._ttft_ms),
+                "ttft_p50_ms": percentile(self._ttft_ms, 50),
+                "ttft_p95_ms": percentile(self._ttft_ms, 95),
+                "tokens_per_sec_p50": percentile(self._tokens_per_sec, 50),
+            },
+            "ewma_latency_ms": None if self.ewma_latency_s is None else round(self.ewma_latency_s * 1000, 1),
+            "ewma_ttft_ms": None if self.ewma_ttft_s is None else round(self.ewma_ttft_s * 1000, 1),
+        }
+
+    async def aclose(self) -> None:
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+        self._client = None
+
+
+class LocalBackend(LLMBackend):
+    """The bundled model in a CPU worker process (local_llm). Its client implements the part of
+    AsyncOpenAI used above, so streaming, metrics and the router treat it like any other node."""
+
+    def __init__(self, model_path: str, max_concurrency: int):
+        super().__init__(
+            name="local",
+            base_url=f"local://{model_path}",
+            model=os.path.basename(model_path.rstrip("/")),
+            api_key=None,
+            max_concurrency=max_concurrency,
+        )
+        self.model_path = model_path
+
+    @property
+    def client(self):
+        if self._client is None:
+            from local_llm import LocalClient
+
+            self._client = LocalClient(self.model, self.model_path)
+            self._client.start()  # once; requests (not probes) respawn a crashed worker, with backoff
+        return self._client
+
+    async def probe(self, timeout: float = 10.0) -> Dict[str, Any]:
+        if self._client is None:
+            return {"backend": self.name, "url": self.base_url, "ok": False, "error": "worker not started"}
+        return {"backend": self.name, "url": self.base_url, **self._client.health()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "local": None if self._client is None else self._client.stats()}
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+
+def _concurrency(env_name: str) -> int:
+    return int(os.getenv(env_name, LLM_MAX_CONCURRENCY))
+
+
+def _parse_backends(spec: str) -> List[LLMBackend]:
+    backends = []
+    for i, entry in enumerate(e.strip() for e in spec.split(",") if e.strip()):
+        name, url = "", entry
+        if "=" in entry.split("://", 1)[0]:
+            name, url = entry.split("=", 1)
+        backends.append(LLMBackend(
+            name=name or f"vllm-{i}",
+            base_url=f"{url.rstrip('/')}/v1",
+            model=VLLM_MODEL,
+            api_key="dummy",
+            max_concurrency=_concurrency("VLLM_MAX_CONCURRENCY"),
+        ))
+    return backends
+
+
+# BACKEND: the kind of backend in use (local, vllm, huggingface_router), for logs and `/`.
+if LLM_BACKEND == "local":
+    from local_llm import LOCAL_MODEL_PATH
+
+    backends = [LocalBackend(LOCAL_MODEL_PATH, _concurrency("LOCAL_LLM_MAX_CONCURRENCY"))]
+    BACKEND = "local"
+elif LLM_BACKENDS:
+    backends = _parse_backends(LLM_BACKENDS)
+    BACKEND = "vllm"
+elif VLLM_BASE_URL:
+    backends = [LLMBackend(
+        name="vllm",
+        base_url=f"{VLLM_BASE_URL}/v1",
+        model=VLLM_MODEL,
+        api_key="dummy",
+        max_concurrency=_concurrency("VLLM_MAX_CONCURRENCY"),
+    )]
+    BACKEND = "vllm"
+else:
+    backends = [LLMBackend(
+        name="huggingface_router",
+        base_url="https://router.huggingface.co/v1",
+        model=os.getenv("HF_MODEL", "Qwen/Qwen2.5-7B-Instruct"),
+        api_key=HF_TOKEN,
+        max_concurrency=_concurrency("HF_MAX_CONCURRENCY"),
+    )]
+    BACKEND = "huggingface_router"
+
+llm = LLMRouter(backends)
+register_gauges(llm)
+Gauge("llm_in_flight", "LLM requests holding a concurrency slot.", ("backend", "model"),
+      fn=lambda: {(b.name, b.model): b.in_flight for b in llm.backends})
+Gauge("llm_waiting", "LLM requests queued for a concurrency slot.", ("backend", "model"),
+      fn=lambda: {(b.name, b.model): b.waiting for b in llm.backends})
+
+MODEL_NAME = llm.model
+base_url   = llm.base_url
@@ -0,0 +1,418 @@
+# llm_router.py
+# Spreads completions over several OpenAI-compatible backends (LLM_BACKENDS) that serve
+# the same model. Each call goes to the best eligible backend (least outstanding requests,
+# or lowest observed latency); a node is ineligible while its last health probe failed or
+# its circuit breaker is open. Failures before the first token fail over to another node,
+# and with LLM_HEDGE_AFTER_MS a slow call is raced against a second node.
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from settings import load_env
+
+from metrics import Counter, Gauge
+
+load_env()
+logger = logging.getLogger(__name__)
+
+LLM_ROUTER_POLICY        = os.getenv("LLM_ROUTER_POLICY", "least_outstanding").lower()  # least_outstanding | latency
+LLM_ROUTER_MAX_ATTEMPTS  = int(os.getenv("LLM_ROUTER_MAX_ATTEMPTS", 2))
+LLM_HEDGE_AFTER_MS       = float(os.getenv("LLM_HEDGE_AFTER_MS", 0))  # 0 disables hedging
+LLM_HEALTH_INTERVAL      = float(os.getenv("LLM_HEALTH_INTERVAL", 10))
+LLM_HEALTH_INTERVAL_SET  = bool(os.getenv("LLM_HEALTH_INTERVAL"))  # explicit: probe even a single backend
+LLM_HEALTH_TIMEOUT       = float(os.getenv("LLM_HEALTH_TIMEOUT", 5))
+LLM_CB_FAILURE_THRESHOLD = int(os.getenv("LLM_CB_FAILURE_THRESHOLD", 5))
+LLM_CB_OPEN_SECONDS      = float(os.getenv("LLM_CB_OPEN_SECONDS", 30))
+
+ROUTER_FAILOVERS = Counter("llm_router_failovers_total", "Calls retried on another backend.", ("backend",))
+ROUTER_HEDGES = Counter("llm_router_hedges_total", "Hedged calls by which attempt won.", ("winner",))
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Transport errors, timeouts, 5xx and 429 say the node is unwell; other 4xx are the caller's fault."""
+    from openai import APIStatusError  # loaded by then: only the client raises these
+
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    return isinstance(error, Exception)
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures; after `open_seconds` one trial
+    call is let through (half-open) and its outcome closes or re-opens the circuit."""
+
+    def __init__(self, name: str, threshold: int, open_seconds: float):
+        self.name = name
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def available(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.open_seconds
+        return not self.trial_in_flight
+
+    def on_attempt(self) -> None:
+        if self.state == "open" and self.available():
+            self.state = "half_open"
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def on_success(self) -> None:
+        self.state, self.failures, self.trial_in_flight = "closed", 0, False
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"⚠️ Circuit for LLM backend {self.name} opened after {self.failures} failures")
+            self.state, self.opened_at = "open", time.monotonic()
+
+    def on_abandon(self) -> None:
+        """The attempt was cancelled (lost a hedge, client left): no verdict either way."""
+        self.trial_in_flight = False
+
+
+class LLMRouter:
+    """Drop-in for a single LLMBackend: same call surface, spread over `backends`."""
+
+    def __init__(self, backends: List[Any], policy: str = LLM_ROUTER_POLICY,
+                 hedge_after_ms: float = LLM_HEDGE_AFTER_MS, max_attempts: int = LLM_ROUTER_MAX_ATTEMPTS):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.policy = policy
+        self.hedge_after = hedge_after_ms / 1000
+        self.max_attempts = max(1, min(max_attempts, len(backends)))
+        self.name = backends[0].name if len(backends) == 1 else "router"
+        self.model = backends[0].model
+        self.base_url = ",".join(b.base_url for b in backends)
+        self.breakers = {b.name: CircuitBreaker(b.name, LLM_CB_FAILURE_THRESHOLD, LLM_CB_OPEN_SECONDS) for b in backends}
+        self.healthy = {b.name: True for b in backends}
+        self.last_probe: Dict[str, Dict[str, Any]] = {}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._health_task: Optional[asyncio.Task] = None
+
+    # Aggregates (what callers used to read off the single backend)
+    @property
+    def max_concurrency(self) -> int:
+        return sum(b.max_concurrency for b in self.backends)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(b.in_flight for b in self.backends)
+
+    @property
+    def waiting(self) -> int:
+        return sum(b.waiting for b in self.backends)
+
+    # Selection
+    def _score(self, backend: Any, stream: bool, prior: float) -> float:
+        outstanding = (backend.in_flight + backend.waiting) / backend.max_concurrency
+        if self.policy == "latency":
+            latency = backend.ewma_ttft_s if stream else backend.ewma_latency_s
+            # Unmeasured nodes get the fleet average, so a fresh node is tried without being flooded.
+            return (prior if latency is None else latency) * (1 + outstanding) + outstanding * 1e-3
+        return outstanding
+
+    def _pick(self, exclude: Set[str], stream: bool) -> Optional[Any]:
+        """Choose a backend and record the attempt on its breaker right away, so concurrent callers
+        cannot all pick the same half-open node before its trial call has started."""
+        backend = self._choose(exclude, stream)
+        if backend is not None:
+            self.breakers[backend.name].on_attempt()
+        return backend
+
+    def _choose(self, exclude: Set[str], stream: bool) -> Optional[Any]:
+        open_ok = [b for b in self.backends if b.name not in exclude and self.breakers[b.name].available()]
+        # Health probes can be wrong (e.g. /models blocked); if every node looks down, trust the breakers alone.
+        candidates = [b for b in open_ok if self.healthy[b.name]] or open_ok
+        if not candidates:
+            return None
+        measured = [b.ewma_ttft_s if stream else b.ewma_latency_s for b in self.backends]
+        measured = [m for m in measured if m is not None]
+        prior = sum(measured) / len(measured) if measured else 0.0
+        scores = [self._score(b, stream, prior) for b in candidates]
+        best = min(scores)
+        return random.choice([b for b, score in zip(candidates, scores) if score <= best])
+
+    def _pick_hedge(self, exclude: Set[str], stream: bool) -> Optional[Any]:
+        """A hedge only goes to a node with a free slot: queueing it would add load without cutting latency."""
+        backend = self._choose(exclude, stream)
+        if backend is None or backend.waiting or backend.in_flight >= backend.max_concurrency:
+            return None
+        self.breakers[backend.name].on_attempt()
+        return backend
+
+    # Non-streamed
+    async def _call(self, backend: Any, messages: List[Dict[str, str]], params: Dict[str, Any]):
+        breaker = self.breakers[backend.name]  # the attempt was recorded by _pick
+        try:
+            result = await backend.chat_completion(messages, **params)
+        except asyncio.CancelledError:
+            breaker.on_abandon()
+            raise
+        except Exception as e:
+            if is_backend_failure(e):
+                breaker.on_failure()
+            else:
+                breaker.on_abandon()
+            raise
+        breaker.on_success()
+        return result
+
+    async def _hedged_call(self, messages, params, tried: Set[str]):
+        primary = self._pick(tried, stream=False)
+        if primary is None:
+            raise NoBackendAvailable("No LLM backend available")
+        tried.add(primary.name)
+        first = asyncio.ensure_future(self._call(primary, messages, params))
+        tasks, hedged = {first}, False
+        try:
+            if self.hedge_after > 0:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+                secondary = None if done else self._pick_hedge(tried, stream=False)
+                if secondary is not None:
+                    tried.add(secondary.name)
+                    self.hedges += 1
+                    hedged = True
+                    tasks.add(asyncio.ensure_future(self._call(secondary, messages, params)))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            winner = "primary" if task is first else "hedge"
+                            self.hedge_wins += winner == "hedge"
+                            ROUTER_HEDGES.labels(winner).inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def chat_completion(self, messages: List[Dict[str, str]], **params: Any):
+        tried: Set[str] = set()
+        error: Optional[BaseException] = None
+        for _ in range(self.max_attempts):
+            try:
+                return await self._hedged_call(messages, params, tried)
+            except NoBackendAvailable:
+                break
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                error = e
+                self._count_failover(tried)
+        raise error or NoBackendAvailable("No LLM backend available")
+
+    # Streamed
+    async def _stream_from(self, backend: Any, messages, stats, params) -> AsyncIterator[str]:
+        breaker = self.breakers[backend.name]  # the attempt was recorded by _pick
+        inner = backend.stream_chat_completion(messages, stats, **params)
+        verdict = None
+        try:
+            async for delta in inner:
+                yield delta
+            verdict = "success"
+        except Exception as e:
+            verdict = "failure" if is_backend_failure(e) else None
+            raise
+        finally:
+            await inner.aclose()
+            if verdict == "success":
+                breaker.on_success()
+            elif verdict == "failure":
+                breaker.on_failure()
+            else:
+                breaker.on_abandon()
+
+    async def _open_stream(self, messages, stats, params, tried: Set[str]):
+        """Start streams (hedged after a TTFT threshold) until one yields its first delta.
+        Returns (generator, attempt stats, first delta or None for an empty stream)."""
+        attempts: List[Tuple[Any, Any, asyncio.Future]] = []
+
+        def start(backend):
+            tried.add(backend.name)
+            attempt_stats = type(stats)(started=stats.started)
+            gen = self._stream_from(backend, messages, attempt_stats, params)
+            attempts.append((gen, attempt_stats, asyncio.ensure_future(gen.__anext__())))
+
+        async def discard(gen, task):
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+            await gen.aclose()
+
+        primary = self._pick(tried, stream=True)
+        if primary is None:
+            raise NoBackendAvailable("No LLM backend available")
+        start(primary)
+        winner = None
+        try:
+            if self.hedge_after > 0:
+                done, _ = await asyncio.wait({attempts[0][2]}, timeout=self.hedge_after)
+                secondary = None if done else self._pick_hedge(tried, stream=True)
+                if secondary is not None:
+                    self.hedges += 1
+                    start(secondary)
+            error: Optional[BaseException] = None
+            pending = {a[2] for a in attempts}
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in attempts:
+                    task = attempt[2]
+                    if task in done and winner is None:
+                        exc = task.exception()
+                        if exc is None or isinstance(exc, StopAsyncIteration):
+                            winner = attempt
+                        else:
+                            error = exc
+            if winner is None:
+                raise error
+            if len(attempts) > 1:
+                won = "primary" if winner is attempts[0] else "hedge"
+                self.hedge_wins += won == "hedge"
+                ROUTER_HEDGES.labels(won).inc()
+            gen, attempt_stats, task = winner
+            first = None if task.exception() is not None else task.result()
+            return gen, attempt_stats, first
+        finally:
+            for attempt in attempts:
+                if attempt is not winner:
+                    await discard(attempt[0], attempt[2])
+
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], stats: Any, **params: Any) -> AsyncIterator[str]:
+        """Fails over only before the first delta; once text has been sent it is committed to one node."""
+        tried: Set[str] = set()
+        error: Optional[BaseException] = None
+        opened = None
+        for _ in range(self.max_attempts):
+            try:
+                opened = await self._open_stream(messages, stats, params, tried)
+                break
+            except NoBackendAvailable:
+                break
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                error = e
+                self._count_failover(tried)
+        if opened is None:
+            raise error or NoBackendAvailable("No LLM backend available")
+
+        gen, attempt_stats, first = opened
+        try:
+            if first is not None:
+                yield first
+                async for delta in gen:
+                    yield delta
+        finally:
+            await gen.aclose()
+            stats.first_token_at = attempt_stats.first_token_at
+            stats.finished_at = attempt_stats.finished_at
+            stats.completion_tokens = attempt_stats.completion_tokens
+            stats.usage = attempt_stats.usage
+
+    def _count_failover(self, tried: Set[str]) -> None:
+        self.failovers += 1
+        for name in tried:
+            ROUTER_FAILOVERS.labels(name).inc()
+
+    # Health
+    async def health(self) -> Dict[str, Any]:
+        """Probe every backend now (the same GET /models the background loop uses)."""
+        results = await asyncio.gather(*(b.probe(LLM_HEALTH_TIMEOUT) for b in self.backends))
+        for backend, result in zip(self.backends, results):
+            was = self.healthy[backend.name]
+            self.healthy[backend.name] = result["ok"]
+            self.last_probe[backend.name] = result
+            if was != result["ok"]:
+                log = logger.info if result["ok"] else logger.warning
+                log(f"{'✅' if result['ok'] else '⚠️'} LLM backend {backend.name} is {'up' if result['ok'] else 'down'}")
+        return {"ok": any(r["ok"] for r in results), "backends": results}
+
+    async def warmup(self, completion: bool = False) -> Dict[str, Any]:
+        """Build every backend's client and open a pooled connection to it (the health probe);
+        with `completion`, also run a one-token completion so the first user request doesn't
+        meet a cold server."""
+        for backend in self.backends:
+            backend.client
+        health = await self.health()
+        result: Dict[str, Any] = {"ok": health["ok"]}
+        if completion and health["ok"]:
+            start = time.perf_counter()
+            await self.chat_completion([{"role": "user", "content": "Hi"}], max_tokens=1)
+            result["completion_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                await self.health()
+            except Exception as e:
+                logger.error(f"❌ LLM health check failed: {e}")
+            await asyncio.sleep(LLM_HEALTH_INTERVAL)
+
+    def start(self) -> None:
+        """Probe in the background only when there is a node to fail over to, or when
+        LLM_HEALTH_INTERVAL was set explicitly; a lone backend is probed on demand."""
+        if len(self.backends) == 1 and not LLM_HEALTH_INTERVAL_SET:
+            return
+        if self._health_task is None and LLM_HEALTH_INTERVAL > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def aclose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for backend in self.backends:
+            await backend.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "model": self.model,
+            "policy": self.policy,
+            "hedge_after_ms": self.hedge_after * 1000,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "backends": [
+                {**b.stats(), "healthy": self.healthy[b.name], "circuit": self.breakers[b.name].state}
+                for b in self.backends
+            ],
+        }
+
+
+def register_gauges(router: LLMRouter) -> None:
+    Gauge("llm_backend_healthy", "1 if the last health probe succeeded.", ("backend",),
+          fn=lambda: {(name,): int(ok) for name, ok in router.healthy.items()})
+    Gauge("llm_circuit_open", "1 while the backend's circuit breaker is open or half-open.", ("backend",),
+          fn=lambda: {(name,): int(cb.state != "closed") for name, cb in router.breakers.items()})
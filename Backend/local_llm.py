@@ -0,0 +1,577 @@
+# local_llm.py
+# LLM_BACKEND=local: the bundled Qwen2.5-0.5B served on CPU by a worker process, so generation
+# works with no network at all. The API process only queues requests and relays events; the
+# worker owns torch, the weights and the threads. Requests that arrive within
+# LOCAL_BATCH_WINDOW_MS of each other are decoded together (one forward pass per token for the
+# whole micro-batch), and the KV cache of a prompt's leading turns (the system instructions,
+# shared by every request of a tone/length) is kept in an LRU, so only the user's text is
+# prefilled per request. `n` choices share one prefill: the request's KV cache is copied into n
+# decode rows. LocalClient mimics the slice of AsyncOpenAI that LLMBackend calls.
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from settings import load_env
+
+from metrics import Counter, Histogram
+
+load_env()
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_PATH           = os.getenv("LOCAL_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Qwen2.5-0.5B"))
+LOCAL_LLM_THREADS          = int(os.getenv("LOCAL_LLM_THREADS", os.cpu_count() or 1))
+LOCAL_LLM_DTYPE            = os.getenv("LOCAL_LLM_DTYPE", "float32").lower()  # float32 | bfloat16
+LOCAL_BATCH_WINDOW_MS      = float(os.getenv("LOCAL_BATCH_WINDOW_MS", 5))
+LOCAL_MAX_BATCH_SIZE       = int(os.getenv("LOCAL_MAX_BATCH_SIZE", 8))
+LOCAL_PREFIX_CACHE_ENTRIES = int(os.getenv("LOCAL_PREFIX_CACHE_ENTRIES", 32))  # 0 disables
+LOCAL_DEFAULT_MAX_TOKENS   = int(os.getenv("LOCAL_DEFAULT_MAX_TOKENS", 256))
+LOCAL_RESPAWN_BACKOFF      = float(os.getenv("LOCAL_RESPAWN_BACKOFF", 2))  # seconds before restarting a crashed worker; doubles
+LOCAL_RESPAWN_MAX_BACKOFF  = float(os.getenv("LOCAL_RESPAWN_MAX_BACKOFF", 300))
+
+LOCAL_BATCH_SIZE = Histogram("local_llm_batch_size", "Requests decoded together per micro-batch.",
+                             buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+LOCAL_DECODE_RATE = Histogram("local_llm_decode_tokens_per_second", "Completion tokens per second of decode, per micro-batch.",
+                              buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+LOCAL_PREFIX_CACHE = Counter("local_llm_prefix_cache_total", "Prompt prefixes found in (hit), extending an entry of "
+                             "(partial) or added to (miss) the KV prefix cache.", ("result",))
+
+# Generation parameters the worker understands; anything else (extra_body, ...) is ignored.
+SUPPORTED_PARAMS = ("max_tokens", "temperature", "top_p", "stop", "n")
+EOS_TOKENS = ("<|im_end|>", "<|endoftext|>")
+
+
+class LocalLLMError(RuntimeError):
+    pass
+
+
+def render_chatml(messages: List[Dict[str, str]]) -> Tuple[str, str]:
+    """Qwen's chat template as (prefix, suffix): every turn but the last is the cacheable prefix,
+    the last turn plus the assistant priming is prefilled per request."""
+    turns = [f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages]
+    return "".join(turns[:-1]), "".join(turns[-1:]) + "<|im_start|>assistant\n"
+
+
+def _held_back(text: str, stops: List[str]) -> int:
+    """Characters at the end of `text` that could still grow into a stop sequence."""
+    longest = 0
+    for stop in stops:
+        for n in range(min(len(stop) - 1, len(text)), longest, -1):
+            if text.endswith(stop[:n]):
+                longest = n
+                break
+    return longest
+
+
+# Worker process
+
+class _Row:
+    """One choice of a request being decoded."""
+
+    def __init__(self, rid: int, stream: bool, params: Dict[str, Any], prompt_tokens: int, cached_tokens: int,
+                 index: int = 0):
+        self.rid = rid
+        self.index = index
+        self.stream = stream
+        self.max_tokens = int(params.get("max_tokens") or LOCAL_DEFAULT_MAX_TOKENS)
+        self.temperature = float(params.get("temperature", 1.0))
+        self.top_p = float(params.get("top_p") or 1.0)
+        stop = params.get("stop") or []
+        self.stops = [stop] if isinstance(stop, str) else [s for s in stop if s]
+        self.prompt_tokens = prompt_tokens
+        self.cached_tokens = cached_tokens
+        self.ids: List[int] = []
+        self.text = ""
+        self.emitted = 0
+        self.finish_reason: Optional[str] = None
+
+
+class _Engine:
+    def __init__(self, model, tokenizer, events, prefix_entries: int):
+        import torch
+
+        self.torch = torch
+        self.model = model
+        self.tokenizer = tokenizer
+        self.events = events
+        self.prefix_entries = prefix_entries
+        self.prefixes: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+        self.eos_ids = {tokenizer.token_to_id(t) for t in EOS_TOKENS} - {None}
+        eos = getattr(model.generation_config, "eos_token_id", None)
+        self.eos_ids.update(eos if isinstance(eos, list) else [eos] if eos is not None else [])
+        self.cancelled: set = set()
+
+    # KV caches travel between requests as legacy (key, value) tuples: easy to pad and slice.
+    def _cache(self, legacy):
+        try:
+            from transformers import DynamicCache
+        except ImportError:
+            return legacy
+        return DynamicCache() if legacy is None else DynamicCache.from_legacy_cache(legacy)
+
+    @staticmethod
+    def _legacy(cache):
+        return cache.to_legacy_cache() if hasattr(cache, "to_legacy_cache") else cache
+
+    def _forward(self, ids: List[int], past, past_len: int):
+        torch = self.torch
+        input_ids = torch.tensor([ids], dtype=torch.long)
+        out = self.model(
+            input_ids=input_ids,
+            past_key_values=self._cache(past),
+            attention_mask=torch.ones((1, past_len + len(ids)), dtype=torch.long),
+            position_ids=torch.arange(past_len, past_len + len(ids)).unsqueeze(0),
+            use_cache=True,
+        )
+        return out.logits[:, -1, :], self._legacy(out.past_key_values)
+
+    def _prefix(self, text: str) -> Tuple[int, Any, int]:
+        """(tokens, KV cache, tokens reused) for a prompt prefix, computed once per distinct prefix.
+        A prefix that extends a cached one (a refinement replays the earlier conversation) only
+        prefills the turns after it; prefixes end on a turn boundary, so tokens split cleanly."""
+        entry = self.prefixes.get(text)
+        if entry is not None:
+            self.prefixes.move_to_end(text)
+            return entry[0], entry[1], entry[0]
+        base = max((key for key in self.prefixes if text.startswith(key)), key=len, default="")
+        base_len, past = self.prefixes[base] if base else (0, None)
+        ids = self.tokenizer.encode(text[len(base):], add_special_tokens=False).ids
+        _, past = self._forward(ids, past, base_len)
+        if self.prefix_entries > 0:
+            self.prefixes[text] = (base_len + len(ids), past)
+            while len(self.prefixes) > self.prefix_entries:
+                self.prefixes.popitem(last=False)
+        return base_len + len(ids), past, base_len
+
+    def prefill(self, rid: int, messages, params, stream: bool) -> Tuple[_Row, Any, Any, Optional[str]]:
+        """Returns the row, its logits and cache, and how the prefix cache served it
+        (hit, partial, miss; None without a prefix)."""
+        prefix, suffix = render_chatml(messages)
+        past, past_len, reused, result = None, 0, 0, None
+        if prefix:
+            past_len, past, reused = self._prefix(prefix)
+            result = "hit" if reused == past_len else "partial" if reused else "miss"
+        suffix_ids = self.tokenizer.encode(suffix, add_special_tokens=False).ids
+        logits, past = self._forward(suffix_ids, past, past_len)
+        row = _Row(rid, stream, params, past_len + len(suffix_ids), reused)
+        return row, logits, past, result
+
+    def _sample(self, logits, rows: List[_Row]):
+        torch = self.torch
+        logits = logits.float()
+        temps = torch.tensor([r.temperature for r in rows]).unsqueeze(1)
+        greedy = logits.argmax(dim=-1)
+        probs = torch.softmax(logits / temps.clamp(min=1e-5), dim=-1)
+        top_p = torch.tensor([r.top_p for r in rows]).unsqueeze(1)
+        if bool((top_p < 1).any()):
+            sorted_probs, order = probs.sort(dim=-1, descending=True)
+            outside = sorted_probs.cumsum(dim=-1) - sorted_probs > top_p
+            sorted_probs = sorted_probs.masked_fill(outside, 0)
+            probs = torch.zeros_like(probs).scatter(-1, order, sorted_probs)
+        sampled = torch.multinomial(probs, 1).squeeze(1)
+        return torch.where(temps.squeeze(1) > 0, sampled, greedy)
+
+    def _advance(self, row: _Row, token: int) -> None:
+        if token in self.eos_ids:
+            row.finish_reason = "stop"
+        else:
+            row.ids.append(token)
+            row.text = self.tokenizer.decode(row.ids, skip_special_tokens=True)
+            cut = min((i for i in (row.text.find(s) for s in row.stops) if i >= 0), default=-1)
+            if cut >= 0:
+                row.text, row.finish_reason = row.text[:cut], "stop"
+            elif len(row.ids) >= row.max_tokens:
+                row.finish_reason = "length"
+        if row.rid in self.cancelled:
+            row.finish_reason = "cancelled"
+        if not row.stream:
+            return
+        # Hold back a possible stop-sequence prefix and half-decoded UTF-8 until they resolve.
+        safe = len(row.text) if row.finish_reason else len(row.text) - _held_back(row.text, row.stops)
+        while safe > row.emitted and row.text[safe - 1] == "\ufffd" and not row.finish_reason:
+            safe -= 1
+        if safe > row.emitted and row.finish_reason != "cancelled":
+            self.events.put(("delta", row.rid, row.index, row.text[row.emitted:safe]))
+            row.emitted = safe
+
+    def _finish(self, row: _Row) -> None:
+        self.cancelled.discard(row.rid)
+        if row.finish_reason == "cancelled":
+            return
+        self.events.put(("done", row.rid, row.index, row.text, row.prompt_tokens, len(row.ids), row.cached_tokens,
+                         row.finish_reason))
+
+    def run(self, batch: List[Tuple[int, Any, Dict[str, Any], bool]], poll) -> None:
+        """Prefill each request on top of its cached prefix, then decode the micro-batch in lockstep,
+        dropping rows as they finish. `poll` picks up cancellations between steps."""
+        torch = self.torch
+        start = time.perf_counter()
+        rows, logits, pasts, prefix_results = [], [], [], {"hit": 0, "partial": 0, "miss": 0}
+        for rid, messages, params, stream in batch:
+            if rid in self.cancelled:
+                self.cancelled.discard(rid)
+                continue
+            try:
+                row, row_logits, past, result = self.prefill(rid, messages, params, stream)
+            except Exception as e:
+                self.events.put(("error", rid, f"prefill failed: {e}"))
+                continue
+            if result is not None:
+                prefix_results[result] += 1
+            for index in range(max(1, int(params.get("n") or 1))):
+                if index:
+                    row = _Row(rid, stream, params, row.prompt_tokens, row.cached_tokens, index)
+                rows.append(row)
+                logits.append(row_logits)
+                pasts.append(past)
+        if not rows:
+            return
+        prefill_s = time.perf_counter() - start
+
+        # Left-pad every cache to the longest prompt; padded slots are masked out and each row
+        # keeps its own positions, so results match decoding the rows one at a time.
+        lengths = [r.prompt_tokens for r in rows]
+        longest = max(lengths)
+        pad = lambda t, n: torch.nn.functional.pad(t, (0, 0, longest - n, 0))
+        past = tuple(
+            (torch.cat([pad(p[layer][0], n) for p, n in zip(pasts, lengths)]),
+             torch.cat([pad(p[layer][1], n) for p, n in zip(pasts, lengths)]))
+            for layer in range(len(pasts[0]))
+        )
+        mask = torch.zeros((len(rows), longest), dtype=torch.long)
+        for i, n in enumerate(lengths):
+            mask[i, longest - n:] = 1
+        positions = torch.tensor(lengths)
+        logits = torch.cat(logits)
+        batch_rows, decode_start = list(rows), time.perf_counter()
+
+        while rows:
+            tokens = self._sample(logits, rows)
+            for row, token in zip(rows, tokens.tolist()):
+                self._advance(row, token)
+            poll()
+            keep = [i for i, r in enumerate(rows) if not r.finish_reason and r.rid not in self.cancelled]
+            for i, row in enumerate(rows):
+                if i not in keep:
+                    row.finish_reason = row.finish_reason or "cancelled"
+                    self._finish(row)
+            if not keep:
+                break
+            if len(keep) < len(rows):
+                index = torch.tensor(keep)
+                past = tuple((k.index_select(0, index), v.index_select(0, index)) for k, v in past)
+                rows, tokens, mask, positions = [rows[i] for i in keep], tokens[index], mask[index], positions[index]
+            mask = torch.cat([mask, torch.ones((len(rows), 1), dtype=torch.long)], dim=1)
+            out = self.model(input_ids=tokens.unsqueeze(1), past_key_values=self._cache(past), attention_mask=mask,
+                             position_ids=positions.unsqueeze(1), use_cache=True)
+            logits, past = out.logits[:, -1, :], self._legacy(out.past_key_values)
+            positions = positions + 1
+
+        decode_s = time.perf_counter() - decode_start
+        completion_tokens = sum(len(r.ids) for r in batch_rows)
+        self.events.put(("batch", len(batch_rows), sum(lengths), completion_tokens, prefill_s, decode_s, prefix_results))
+
+
+def serve(model_path: str, threads: int, dtype: str, window_ms: float, max_batch: int, prefix_entries: int,
+          requests, events) -> None:
+    """Worker process entry point: load the model, then micro-batch requests until told to stop (None)."""
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    try:
+        start = time.perf_counter()
+        import torch
+        from tokenizers import Tokenizer
+        from transformers import AutoModelForCausalLM
+
+        torch.set_num_threads(threads)
+        torch.set_grad_enabled(False)
+        tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        model = AutoModelForCausalLM.from_pretrained(
+            model_path, torch_dtype=torch.bfloat16 if dtype == "bfloat16" else torch.float32)
+        model.eval()
+        engine = _Engine(model, tokenizer, events, prefix_entries)
+        events.put(("ready", {"load_seconds": round(time.perf_counter() - start, 2), "threads": threads,
+                              "dtype": dtype, "parameters": sum(p.numel() for p in model.parameters())}))
+    except Exception as e:
+        events.put(("failed", f"{type(e).__name__}: {e}"))
+        return
+
+    backlog: Deque[Tuple] = deque()
+    stopping = False
+
+    def take(message) -> None:
+        nonlocal stopping
+        if message is None:
+            stopping = True
+        elif message[0] == "cancel":
+            engine.cancelled.add(message[1])
+        else:
+            backlog.append(message[1:])
+
+    def poll() -> None:
+        while True:
+            try:
+                take(requests.get_nowait())
+            except queue.Empty:
+                return
+
+    while not stopping:
+        if not backlog:
+            take(requests.get())
+            continue
+        deadline = time.perf_counter() + window_ms / 1000
+        while len(backlog) < max_batch and not stopping:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                take(requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        batch = [backlog.popleft() for _ in range(min(max_batch, len(backlog)))]
+        try:
+            engine.run(batch, poll)
+        except Exception as e:
+            logger.exception("Local LLM batch failed")
+            for rid, *_ in batch:
+                events.put(("error", rid, f"{type(e).__name__}: {e}"))
+
+
+# API process
+
+class _Stream:
+    """Async iterator of OpenAI-style chunks for one streamed request; close() cancels it."""
+
+    def __init__(self, client: "LocalClient", rid: int, events: asyncio.Queue, n: int):
+        self._client = client
+        self._rid = rid
+        self._events = events
+        self._n = n
+        self._done: List[Tuple] = []
+        self._finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._finished:
+            raise StopAsyncIteration
+        while len(self._done) < self._n:
+            event = await self._events.get()
+            if event[0] == "delta":
+                return SimpleNamespace(choices=[SimpleNamespace(index=event[2], delta=SimpleNamespace(content=event[3]))],
+                                       usage=None)
+            if event[0] == "error":
+                self._finished = True
+                self._client._pending.pop(self._rid, None)
+                raise LocalLLMError(event[2])
+            self._done.append(event)  # one choice finished; the others may still be streaming
+        self._finished = True
+        self._client._pending.pop(self._rid, None)
+        # The final chunk carries usage only, like vLLM with include_usage.
+        return SimpleNamespace(choices=[], usage=_usage(self._done))
+
+    async def close(self) -> None:
+        if not self._finished:
+            self._finished = True
+            self._client.cancel(self._rid)
+
+
+def _usage(done: List[Tuple]) -> SimpleNamespace:
+    """Usage of a request from the `done` events of its choices: the prompt was prefilled once."""
+    prompt_tokens, cached_tokens = done[0][4], done[0][6]
+    completion_tokens = sum(event[5] for event in done)
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens, cached_tokens=cached_tokens)
+
+
+class LocalClient:
+    """Owns the worker process. `client.chat.completions.create(...)` behaves like AsyncOpenAI's
+    for what LLMBackend uses: a completion object, or an async stream of delta chunks."""
+
+    def __init__(self, model: str, model_path: str = LOCAL_MODEL_PATH):
+        self.model = model
+        self.model_path = model_path
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.ready = False
+        self.info: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.failed = False  # the model could not be loaded: final until restart of the API
+        self.restarts = 0
+        self.batches = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.prefix_cache = {"hit": 0, "partial": 0, "miss": 0}
+        self._decode_rates: Deque[float] = deque(maxlen=1000)
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Queue] = {}
+        self._process = None
+        self._exited = False
+        self._backoff = LOCAL_RESPAWN_BACKOFF
+        self._respawn_at = 0.0
+        self._requests = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        """Spawn the worker once. Loading the weights happens in the worker; after a crash,
+        the next request respawns it (`_ensure_worker`), never a health probe."""
+        if self._process is None:
+            self._spawn()
+
+    def _spawn(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        ctx = multiprocessing.get_context("spawn")  # never fork a process with an event loop and threads
+        self._requests, events = ctx.Queue(), ctx.Queue()
+        self.ready, self.error, self._exited = False, None, False
+        process = self._process = ctx.Process(
+            target=serve, name="local-llm", daemon=True,
+            args=(self.model_path, LOCAL_LLM_THREADS, LOCAL_LLM_DTYPE, LOCAL_BATCH_WINDOW_MS,
+                  LOCAL_MAX_BATCH_SIZE, LOCAL_PREFIX_CACHE_ENTRIES, self._requests, events),
+        )
+        process.start()
+        threading.Thread(target=self._pump, args=(process, events), name="local-llm-events", daemon=True).start()
+        logger.info(f"🧠 Loading {self.model_path} in a CPU worker ({LOCAL_LLM_THREADS} threads, "
+                    f"batch window {LOCAL_BATCH_WINDOW_MS:g} ms, max batch {LOCAL_MAX_BATCH_SIZE})")
+
+    def _pump(self, process, events) -> None:
+        """Relay worker events to the event loop; reports the worker's exit."""
+        while True:
+            try:
+                event = events.get(timeout=1.0)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                event = ("exited", process.exitcode)
+            try:
+                self._loop.call_soon_threadsafe(self._dispatch, event, process)
+            except RuntimeError:  # loop closed
+                return
+            if event[0] == "exited":
+                return
+
+    def _dispatch(self, event, process=None) -> None:
+        kind = event[0]
+        if kind in ("ready", "failed", "exited") and process is not self._process:
+            return  # a worker that was already replaced or closed
+        if kind in ("delta", "done", "error"):
+            pending = self._pending.get(event[1])
+            if pending is not None:
+                pending.put_nowait(event)
+        elif kind == "batch":
+            _, size, _, completion_tokens, _, decode_s, prefix_results = event
+            self.batches += 1
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            LOCAL_BATCH_SIZE.observe(size)
+            for result, count in prefix_results.items():
+                self.prefix_cache[result] += count
+                LOCAL_PREFIX_CACHE.labels(result).inc(count)
+            if decode_s > 0 and completion_tokens:
+                rate = completion_tokens / decode_s
+                self._decode_rates.append(rate)
+                LOCAL_DECODE_RATE.observe(rate)
+        elif kind == "ready":
+            self.ready, self.info = True, event[1]
+            self._backoff = LOCAL_RESPAWN_BACKOFF
+            logger.info(f"✅ Local model ready in {self.info['load_seconds']}s "
+                        f"({self.info['parameters'] / 1e6:.0f}M parameters, {self.info['dtype']})")
+        elif kind == "failed":
+            self.ready, self.failed, self.error = False, True, event[1]
+            logger.error(f"❌ Local model unavailable: {self.error}")
+            self._fail_pending()
+        elif kind == "exited":
+            self.ready, self._exited = False, True
+            if not self.failed:
+                self.error = f"worker exited with code {event[1]}"
+                self._respawn_at = time.monotonic() + self._backoff
+                logger.error(f"❌ Local model worker died ({self.error}); restarting on the next request "
+                             f"after {self._backoff:g}s")
+                self._backoff = min(self._backoff * 2, LOCAL_RESPAWN_MAX_BACKOFF)
+            self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        for rid, pending in list(self._pending.items()):
+            pending.put_nowait(("error", rid, self.error))
+
+    def _ensure_worker(self) -> None:
+        """Respawn a worker that crashed, at most once per backoff period. A model that failed to
+        load stays failed (respawning would only import torch and fail again)."""
+        if self._process is None:
+            self._spawn()
+        elif self._process.is_alive():
+            return
+        elif self.failed:
+            raise LocalLLMError(self.error)
+        elif not self._exited:
+            raise LocalLLMError("local model worker stopped")  # its exit is still being relayed
+        elif time.monotonic() < self._respawn_at:
+            raise LocalLLMError(f"{self.error}; restarting in {self._respawn_at - time.monotonic():.0f}s")
+        else:
+            self.restarts += 1
+            self._spawn()
+
+    def _submit(self, messages: List[Dict[str, str]], params: Dict[str, Any], stream: bool) -> Tuple[int, asyncio.Queue]:
+        self._ensure_worker()
+        rid = next(self._ids)
+        self._pending[rid] = asyncio.Queue()
+        options = {k: params[k] for k in SUPPORTED_PARAMS if params.get(k) is not None}
+        self._requests.put(("generate", rid, messages, options, stream))
+        return rid, self._pending[rid]
+
+    def cancel(self, rid: int) -> None:
+        if self._pending.pop(rid, None) is not None and self._requests is not None:
+            self._requests.put(("cancel", rid))
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **params: Any):
+        rid, events = self._submit(messages, params, stream)
+        n = max(1, int(params.get("n") or 1))
+        if stream:
+            return _Stream(self, rid, events, n)
+        done: List[Tuple] = []
+        try:
+            while len(done) < n:
+                event = await events.get()
+                if event[0] == "error":
+                    self._pending.pop(rid, None)
+                    raise LocalLLMError(event[2])
+                done.append(event)
+        except asyncio.CancelledError:
+            self.cancel(rid)
+            raise
+        self._pending.pop(rid, None)
+        return SimpleNamespace(
+            id=f"local-{rid}", model=self.model, usage=_usage(done),
+            choices=[SimpleNamespace(index=event[2], finish_reason=event[7],
+                                     message=SimpleNamespace(role="assistant", content=event[3]))
+                     for event in sorted(done, key=lambda event: event[2])],
+        )
+
+    def health(self) -> Dict[str, Any]:
+        alive = self._process is not None and self._process.is_alive()
+        return {"ok": alive and self.ready, "alive": alive, "ready": self.ready, "error": self.error,
+                "restarts": self.restarts, **self.info}
+
+    def stats(self) -> Dict[str, Any]:
+        rates = sorted(self._decode_rates)
+        return {
+            **self.health(),
+            "queued": len(self._pending),
+            "batches": self.batches,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "decode_tokens_per_sec_p50": round(rates[len(rates) // 2], 1) if rates else None,
+            "prefix_cache": dict(self.prefix_cache),
+        }
+
+    async def aclose(self) -> None:
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        if process.is_alive():
+            self._requests.put(None)
+            await asyncio.to_thread(process.join, 10)
+            if process.is_alive():
+                process.terminate()
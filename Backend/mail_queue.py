@@ -0,0 +1,437 @@
+# mail_queue.py
+# Durable outbound mail: handlers enqueue rows in `outbound_emails` inside their own
+# transaction; MailWorker claims them in batches and sends over a small pool of
+# authenticated SMTP connections, rate limited, retrying with exponential backoff.
+# Rows survive restarts: a claimed row is leased, and a lapsed lease makes it claimable again.
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from settings import load_env
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, run_db
+from metrics import Counter, Gauge, percentile, span
+from models import OutboundEmail
+
+if TYPE_CHECKING:  # imported when the first message is sent
+    import aiosmtplib
+
+load_env()
+logger = logging.getLogger(__name__)
+
+MAIL_RESULTS = Counter("mail_messages_total", "Outbound mail outcomes.", ("outcome",))
+SMTP_CONNECTIONS = Counter("smtp_connections_opened_total", "SMTP sessions opened (TLS handshake + login).")
+
+DEFAULT_SMTP_HOST = "smtp.gmail.com"
+
+SMTP_HOST          = os.getenv("SMTP_HOST", DEFAULT_SMTP_HOST)
+SMTP_PORT          = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS      = os.getenv("SMTP_STARTTLS", "true").lower() in {"1", "true", "yes"}
+SMTP_USE_TLS       = os.getenv("SMTP_USE_TLS", "false").lower() in {"1", "true", "yes"}  # implicit TLS (port 465)
+SMTP_TIMEOUT       = float(os.getenv("SMTP_TIMEOUT", 20))
+SMTP_POOL_SIZE     = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_IDLE_TIMEOUT  = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", 100))
+
+MAIL_WORKER_ENABLED = os.getenv("MAIL_WORKER_ENABLED", "true").lower() in {"1", "true", "yes"}
+MAIL_BATCH_SIZE     = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAIL_RATE_PER_SEC   = float(os.getenv("MAIL_RATE_PER_SEC", 5))  # 0 disables the limiter
+MAIL_MAX_ATTEMPTS   = int(os.getenv("MAIL_MAX_ATTEMPTS", 6))
+MAIL_BACKOFF_BASE   = float(os.getenv("MAIL_BACKOFF_BASE", 30))
+MAIL_BACKOFF_MAX    = float(os.getenv("MAIL_BACKOFF_MAX", 3600))
+MAIL_LEASE_SECONDS  = float(os.getenv("MAIL_LEASE_SECONDS", 300))
+MAIL_POLL_INTERVAL  = float(os.getenv("MAIL_POLL_INTERVAL", 5))
+MAIL_STATS_WINDOW   = int(os.getenv("MAIL_STATS_WINDOW", 1000))
+
+EMAIL_USER = os.getenv("EMAIL_USER")
+EMAIL_PASS = os.getenv("EMAIL_PASS")
+EMAIL_FROM = os.getenv("EMAIL_FROM") or EMAIL_USER or "no-reply@localhost"
+
+
+def mail_configured() -> bool:
+    """Gmail needs credentials; a custom SMTP_HOST (e.g. a local aiosmtpd) may accept mail without them."""
+    return bool(EMAIL_USER and EMAIL_PASS) or SMTP_HOST != DEFAULT_SMTP_HOST
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body_text: str, body_html: Optional[str] = None) -> OutboundEmail:
+    """Add a message to the queue in the caller's transaction; it is sent once the caller commits."""
+    record = OutboundEmail(
+        to_email=to_email,
+        subject=subject,
+        body_text=body_text,
+        body_html=body_html,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(record)
+    return record
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number `attempts` (1-based): base * 2^(n-1), capped, with jitter."""
+    delay = min(MAIL_BACKOFF_MAX, MAIL_BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+@dataclass
+class QueuedMail:
+    id: int
+    to_email: str
+    subject: str
+    body_text: str
+    body_html: Optional[str]
+    attempts: int
+
+    def to_message(self) -> MIMEMultipart:
+        msg = MIMEMultipart("alternative")
+        msg["From"] = EMAIL_FROM
+        msg["To"] = self.to_email
+        msg["Subject"] = self.subject
+        msg.attach(MIMEText(self.body_text, "plain"))
+        if self.body_html:
+            msg.attach(MIMEText(self.body_html, "html"))
+        return msg
+
+
+@dataclass
+class SendResult:
+    mail: QueuedMail
+    error: Optional[str] = None
+    permanent: bool = False
+
+
+def _claim(db: Session, limit: int, lease_seconds: float) -> List[QueuedMail]:
+    """Lease up to `limit` due rows. Pending rows and rows whose lease lapsed (a worker died
+    mid-send) are both due. The conditional UPDATE makes concurrent workers claim disjoint rows."""
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=lease_seconds, microseconds=random.randint(0, 999))
+    due = (
+        OutboundEmail.status.in_(("pending", "sending")),
+        OutboundEmail.next_attempt_at <= now,
+    )
+    ids = [
+        row.id for row in db.query(OutboundEmail.id).filter(*due)
+        .order_by(OutboundEmail.id).limit(limit).with_for_update(skip_locked=True)
+    ]
+    if not ids:
+        db.rollback()
+        return []
+    db.query(OutboundEmail).filter(OutboundEmail.id.in_(ids), *due).update(
+        {OutboundEmail.status: "sending", OutboundEmail.next_attempt_at: lease_until},
+        synchronize_session=False,
+    )
+    rows = (
+        db.query(OutboundEmail)
+        .filter(OutboundEmail.id.in_(ids), OutboundEmail.next_attempt_at == lease_until)
+        .order_by(OutboundEmail.id)
+        .all()
+    )
+    claimed = [QueuedMail(r.id, r.to_email, r.subject, r.body_text, r.body_html, r.attempts) for r in rows]
+    db.commit()
+    return claimed
+
+
+def _record_results(db: Session, results: List[SendResult]) -> Dict[str, int]:
+    """Write back one batch in a single transaction."""
+    now = datetime.utcnow()
+    counts = {"sent": 0, "retried": 0, "failed": 0}
+    sent_ids = [r.mail.id for r in results if r.error is None]
+    if sent_ids:
+        db.query(OutboundEmail).filter(OutboundEmail.id.in_(sent_ids)).update(
+            {
+                OutboundEmail.status: "sent",
+                OutboundEmail.sent_at: now,
+                OutboundEmail.attempts: OutboundEmail.attempts + 1,
+                OutboundEmail.last_error: None,
+            },
+            synchronize_session=False,
+        )
+        counts["sent"] = len(sent_ids)
+    for r in results:
+        if r.error is None:
+            continue
+        attempts = r.mail.attempts + 1
+        give_up = r.permanent or attempts >= MAIL_MAX_ATTEMPTS
+        db.query(OutboundEmail).filter(OutboundEmail.id == r.mail.id).update(
+            {
+                OutboundEmail.status: "failed" if give_up else "pending",
+                OutboundEmail.attempts: attempts,
+                OutboundEmail.last_error: r.error[:1000],
+                OutboundEmail.next_attempt_at: now + timedelta(seconds=0 if give_up else backoff_seconds(attempts)),
+            },
+            synchronize_session=False,
+        )
+        counts["failed" if give_up else "retried"] += 1
+    db.commit()
+    return counts
+
+
+def _queue_depth(db: Session) -> Dict[str, Any]:
+    by_status = dict(
+        db.query(OutboundEmail.status, func.count(OutboundEmail.id)).group_by(OutboundEmail.status).all()
+    )
+    oldest = (
+        db.query(func.min(OutboundEmail.created_at))
+        .filter(OutboundEmail.status.in_(("pending", "sending")))
+        .scalar()
+    )
+    return {
+        "pending": by_status.get("pending", 0),
+        "sending": by_status.get("sending", 0),
+        "sent": by_status.get("sent", 0),
+        "failed": by_status.get("failed", 0),
+        "oldest_unsent_at": oldest,
+    }
+
+
+class RateLimiter:
+    """Token bucket shared by every send of the worker."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SMTPPool:
+    """At most `size` authenticated SMTP connections, reused across messages (one TLS
+    handshake + login per connection instead of per email). Idle connections older than
+    SMTP_IDLE_TIMEOUT, or that have sent SMTP_MAX_MESSAGES_PER_CONNECTION, are recycled."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle: Deque[Tuple["aiosmtplib.SMTP", float, int]] = deque()
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    async def _connect(self) -> "aiosmtplib.SMTP":
+        import aiosmtplib
+
+        client = aiosmtplib.SMTP(
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            use_tls=SMTP_USE_TLS,
+            start_tls=SMTP_STARTTLS and not SMTP_USE_TLS,
+            timeout=SMTP_TIMEOUT,
+        )
+        await client.connect()
+        if EMAIL_USER and EMAIL_PASS:
+            await client.login(EMAIL_USER, EMAIL_PASS)
+        self.opened += 1
+        SMTP_CONNECTIONS.inc()
+        return client
+
+    async def _discard(self, client: "aiosmtplib.SMTP") -> None:
+        self.discarded += 1
+        try:
+            if client.is_connected:
+                await client.quit()
+        except Exception:
+            client.close()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Tuple["aiosmtplib.SMTP", bool]]:
+        """Yield `(client, reused)`. Connections that hit a transport error are dropped;
+        ones that returned an SMTP reply (e.g. a refused recipient) go back to the pool."""
+        import aiosmtplib
+
+        async with self._slots:
+            client, sent, reused = None, 0, False
+            while self._idle and client is None:
+                candidate, last_used, candidate_sent = self._idle.pop()
+                if candidate.is_connected and time.monotonic() - last_used < SMTP_IDLE_TIMEOUT:
+                    client, sent, reused = candidate, candidate_sent, True
+                    self.reused += 1
+                else:
+                    await self._discard(candidate)
+            if client is None:
+                client = await self._connect()
+            try:
+                yield client, reused
+            except aiosmtplib.SMTPResponseException:
+                self._release(client, sent + 1)
+                raise
+            except BaseException:
+                await self._discard(client)
+                raise
+            else:
+                self._release(client, sent + 1)
+
+    def _release(self, client: "aiosmtplib.SMTP", sent: int) -> None:
+        if sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            asyncio.ensure_future(self._discard(client))
+        else:
+            self._idle.append((client, time.monotonic(), sent))
+
+    async def aclose(self) -> None:
+        while self._idle:
+            await self._discard(self._idle.pop()[0])
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": self.size, "idle": len(self._idle), "opened": self.opened,
+                "reused": self.reused, "discarded": self.discarded}
+
+
+def _is_permanent(error: Exception) -> bool:
+    # 5xx replies (bad recipient, rejected content) won't succeed on retry; 4xx and transport errors might.
+    import aiosmtplib
+
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(getattr(r, "code", 0) >= 500 for r in error.recipients)
+    code = getattr(error, "code", None)
+    return isinstance(error, aiosmtplib.SMTPResponseException) and code is not None and 500 <= code < 600
+
+
+class MailWorker:
+    def __init__(self, pool: SMTPPool, limiter: RateLimiter):
+        self.pool = pool
+        self.limiter = limiter
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self._latency_ms: Deque[float] = deque(maxlen=MAIL_STATS_WINDOW)
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        if not mail_configured():
+            logger.warning("⚠️ SMTP not configured (EMAIL_USER/EMAIL_PASS missing). Outbound mail stays queued.")
+            return
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"📮 Mail worker started ({SMTP_HOST}:{SMTP_PORT}, pool {self.pool.size}).")
+
+    def notify(self) -> None:
+        """Wake the worker after a commit that enqueued mail, instead of waiting for the next poll.
+        Safe to call from sync handlers running in the threadpool."""
+        if self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.pool.aclose()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                drained = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Mail worker iteration failed: {e}")
+                drained = 0
+            if drained < MAIL_BATCH_SIZE:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=MAIL_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> int:
+        """Claim, send and record one batch; returns how many messages were claimed."""
+        batch = await run_db(_claim, MAIL_BATCH_SIZE, MAIL_LEASE_SECONDS)
+        if not batch:
+            return 0
+        results = await asyncio.gather(*(self._send(mail) for mail in batch))
+        counts = await run_db(_record_results, list(results))
+        self.sent += counts["sent"]
+        self.retried += counts["retried"]
+        self.failed += counts["failed"]
+        for outcome, n in counts.items():
+            if n:
+                MAIL_RESULTS.labels(outcome).inc(n)
+        self.batches += 1
+        return len(batch)
+
+    async def _send(self, mail: QueuedMail) -> SendResult:
+        import aiosmtplib
+
+        await self.limiter.acquire()
+        message = mail.to_message()
+        for attempt in range(2):
+            start, reused = time.perf_counter(), False
+            try:
+                with span("smtp_send"):
+                    async with self.pool.connection() as (client, reused):
+                        await client.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected as e:
+                if reused and attempt == 0:
+                    continue  # the server dropped an idle pooled connection; retry once on a fresh one
+                return self._failed(mail, e)
+            except Exception as e:
+                return self._failed(mail, e)
+            self._latency_ms.append((time.perf_counter() - start) * 1000)
+            logger.info(f"📧 Sent email #{mail.id} to {mail.to_email}")
+            return SendResult(mail)
+
+    @staticmethod
+    def _failed(mail: QueuedMail, error: Exception) -> SendResult:
+        logger.warning(f"⚠️ Sending email #{mail.id} to {mail.to_email} failed: {error}")
+        return SendResult(mail, error=f"{type(error).__name__}: {error}", permanent=_is_permanent(error))
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "smtp_host": f"{SMTP_HOST}:{SMTP_PORT}",
+            "queue": await run_db(_queue_depth),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+            "send_latency_p50_ms": percentile(self._latency_ms, 50),
+            "send_latency_p95_ms": percentile(self._latency_ms, 95),
+            "pool": self.pool.stats(),
+        }
+
+
+mail_worker = MailWorker(SMTPPool(SMTP_POOL_SIZE), RateLimiter(MAIL_RATE_PER_SEC, MAIL_BATCH_SIZE))
+
+
+def _depth_gauge() -> Dict[Tuple[str, ...], float]:
+    db = SessionLocal()
+    try:
+        depth = _queue_depth(db)
+    finally:
+        db.close()
+    return {(status,): depth[status] for status in ("pending", "sending", "failed")}
+
+
+Gauge("mail_queue_depth", "Outbound emails by status (read at scrape time).", ("status",), fn=_depth_gauge)
@@ -1,42 +1,60 @@
 # main.py
-from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException
+from startup import DB_SCHEMA_ON_STARTUP, startup_profile, warmup
+from settings import load_env
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from database import get_db, engine
-from models import Base, EmailRequest, User
-import logging, os
-from typing import List
-import httpx
-
-from openai import OpenAI
+from database import get_db, engine, run_db
+from models import EmailRequest
+from db_migrations import prepare_schema
+from pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from search import search_emails
+import asyncio, json, logging, os, time
+from collections import defaultdict
+from typing import Dict, List, Optional
 
 from auth_router import router as auth_router
 from user_router import router as user_router
-from schemas import PromptRequest, EmailResponse, TokenData
-from auth import get_current_token
+from jobs_router import router as jobs_router
+from schemas import (
+    PromptRequest, GenerateRequest, EmailResponse, GeneratedEmails, BatchPromptRequest, BatchItemResult, BatchResponse,
+    EmailSummary, EmailSummaryPage, SearchHit, SearchPage, RefineRequest, RefineResponse, EmailTone, EmailLength,
+)
+from user_cache import CurrentUser, get_current_user_identity
+from auth import require_ops, shutdown_hash_executor
+from mail_queue import MAIL_WORKER_ENABLED, mail_worker
+from jobs import JOB_WORKER_ENABLED, job_worker
+from metrics import CONTENT_TYPE, METRICS_ENABLED, REGISTRY, MetricsMiddleware, span
+from llm_client import llm, StreamStats, BACKEND, MODEL_NAME, base_url
+from generation import (
+    ItemResult, generation_key, generate_text, generate_many, generate_variants, record_variants, single_flight,
+)
+from prompts import BuiltPrompt, PromptTooLong, build_prompt, build_refine_prompt
+from refinement import chain_conflict, load_chain, refine_text, save_refinement
+from admission import AdmissionRejected, admission
+from generation_cache import generation_cache
+from token_revocation import purge_expired
+from maintenance import MAINTENANCE_ENABLED, maintenance
+from http_compression import RESPONSE_COMPRESSION_ENABLED, CompressionMiddleware
+from responses import FastJSONResponse, dumps
 
-load_dotenv()
+load_env()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+startup_profile.imported()
 
-VLLM_BASE_URL = os.getenv("VLLM_BASE_URL", "").rstrip("/")
-VLLM_MODEL    = os.getenv("VLLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
-HF_TOKEN      = os.getenv("HF_TOKEN")
 ANGULAR_ORIGIN = os.getenv("ANGULAR_ORIGIN", "http://localhost:4200")
 
-if VLLM_BASE_URL:
-    base_url = f"{VLLM_BASE_URL}/v1"
-    client = OpenAI(base_url=base_url, api_key="dummy", timeout=60)
-    MODEL_NAME = VLLM_MODEL
-    BACKEND = "vllm"
-    logger.info(f"🔌 Using vLLM at {base_url} with model '{MODEL_NAME}'")
+if len(llm.backends) > 1:
+    logger.info(f"🔌 Routing across {len(llm.backends)} backends ({base_url}) with model '{MODEL_NAME}', policy {llm.policy}")
+elif BACKEND == "local":
+    logger.info(f"🔌 Using the local CPU model at {base_url[len('local://'):]} (max concurrency {llm.max_concurrency})")
+elif BACKEND == "vllm":
+    logger.info(f"🔌 Using vLLM at {base_url} with model '{MODEL_NAME}' (max concurrency {llm.max_concurrency})")
 else:
-    base_url = "https://router.huggingface.co/v1"
-    client = OpenAI(base_url=base_url, api_key=HF_TOKEN, timeout=60)
-    MODEL_NAME = os.getenv("HF_MODEL", "Qwen/Qwen2.5-7B-Instruct")
-    BACKEND = "huggingface_router"
-    logger.info(f"🔌 Using Hugging Face Router with model '{MODEL_NAME}'")
+    logger.info(f"🔌 Using Hugging Face Router with model '{MODEL_NAME}' (max concurrency {llm.max_concurrency})")
 
 app = FastAPI(
     title="LLM Email AutoWriter",
@@ -52,7 +70,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Cache", "Retry-After"],
 )
+if RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+# Outermost, so latency covers CORS and the full (streamed) response body.
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 @app.get("/")
 def root():
@@ -66,84 +97,424 @@ def root():
 
 @app.get("/api/llm/health")
 async def llm_health():
-    url = f"{VLLM_BASE_URL}/v1/models" if BACKEND == "vllm" else f"{base_url}/models"
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as hx:
-            r = await hx.get(url)
-        return {"ok": r.status_code == 200, "status": r.status_code, "url": url, "json": r.json()}
-    except Exception as e:
-        return {"ok": False, "url": url, "error": str(e)}
+    return await llm.health()
+
+@app.get("/api/llm/stats", dependencies=[Depends(require_ops)])
+def llm_stats():
+    return {**llm.stats(), "single_flight": single_flight.stats()}
+
+@app.get("/api/llm/admission", dependencies=[Depends(require_ops)])
+async def llm_admission_stats():
+    return await admission.stats()
+
+@app.get("/api/llm/cache", dependencies=[Depends(require_ops)])
+def llm_cache_stats():
+    return generation_cache.stats()
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_ops)])
+def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/startup", dependencies=[Depends(require_ops)])
+def startup_report():
+    return startup_profile.report()
+
+@app.get("/api/mail/stats", dependencies=[Depends(require_ops)])
+async def mail_stats():
+    return await mail_worker.stats()
+
+@app.get("/api/maintenance", dependencies=[Depends(require_ops)])
+async def maintenance_stats():
+    return await maintenance.stats()
 
 app.include_router(auth_router, prefix="/api/auth")
 app.include_router(user_router, prefix="/api/user")
+app.include_router(jobs_router, prefix="/api/jobs")
+
+_warmup_task: Optional[asyncio.Task] = None
 
 @app.on_event("startup")
 async def startup():
-    Base.metadata.create_all(bind=engine)
-    logger.info("✅ Database tables ensured.")
+    global _warmup_task
+    with startup_profile.phase("schema"):
+        outcome = prepare_schema(engine, DB_SCHEMA_ON_STARTUP)
+    logger.info(f"✅ Database schema {outcome}.")
+    with startup_profile.phase("workers"):
+        if MAIL_WORKER_ENABLED:
+            mail_worker.start()
+        if JOB_WORKER_ENABLED:
+            job_worker.start()
+        if MAINTENANCE_ENABLED:
+            maintenance.start()
+        llm.start()
+    _warmup_task = asyncio.create_task(after_startup())
+    startup_profile.ready()
+
+async def after_startup():
+    """Housekeeping and warmup that don't need to finish before the first request."""
+    if not MAINTENANCE_ENABLED:  # otherwise the scheduler's "tokens" task does this in batches
+        with startup_profile.phase("purge_revoked_tokens"):
+            await run_db(purge_expired)
+    await warmup(llm)
 
-@app.post("/api/generate", response_model=EmailResponse)
+@app.on_event("shutdown")
+async def shutdown():
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+    await job_worker.stop()
+    await maintenance.stop()
+    await llm.aclose()
+    await mail_worker.stop()
+    shutdown_hash_executor()
+
+def sse_event(event: str, data: dict) -> str:
+    # Same encoding as the JSON endpoints (ISO datetimes).
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+def save_email(db: Session, user_id: int, prompt: str, tone: str, length: str, text: str) -> EmailResponse:
+    email_record = EmailRequest(
+        prompt=prompt,
+        tone=tone,
+        length=length,
+        generated_email=text,
+        user_id=user_id,
+    )
+    with span("db_insert"):
+        db.add(email_record)
+        db.commit()
+        db.refresh(email_record)
+    return EmailResponse.from_orm(email_record)
+
+def save_variants(
+    db: Session, user_id: int, prompt: str, tone: str, length: str, texts: List[str]
+) -> List[EmailResponse]:
+    """Every draft of one generation in a single commit, linked by `variant_group` (the first draft's id)."""
+    records = [
+        EmailRequest(prompt=prompt, tone=tone, length=length, generated_email=text, user_id=user_id)
+        for text in texts
+    ]
+    with span("db_insert"):
+        db.add_all(records)
+        db.flush()
+        ids = [record.id for record in records]
+        db.query(EmailRequest).filter(EmailRequest.id.in_(ids)).update(
+            {EmailRequest.variant_group: ids[0]}, synchronize_session=False
+        )
+        db.commit()
+        db.query(EmailRequest).filter(EmailRequest.id.in_(ids)).all()
+    return [EmailResponse.from_orm(record) for record in records]
+
+def checked_prompt(req: PromptRequest) -> BuiltPrompt:
+    try:
+        return build_prompt(req)
+    except PromptTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+@app.post("/api/generate", response_model=GeneratedEmails)
 async def generate_email(
-    req: PromptRequest,
-    db: Session = Depends(get_db),
-    token: TokenData = Depends(get_current_token),
+    req: GenerateRequest,
+    response: Response,
+    fresh: bool = False,
+    user: CurrentUser = Depends(get_current_user_identity),
 ):
-    tone_str   = getattr(req.tone, "value", str(req.tone))
-    length_str = getattr(req.length, "value", str(req.length))
-    user_msg = f"Write a {tone_str} {length_str} email: {req.prompt}"
+    """With `variants` > 1 all drafts come from one upstream call and are returned together."""
+    prompt = checked_prompt(req)
+    await admission.check_rate(user.id, cost=req.variants)
 
     try:
-        completion = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": user_msg}],
-            temperature=0.7,
-            max_tokens=500,
-        )
-        result = completion.choices[0].message.content
+        if req.variants > 1:
+            texts = await generate_variants(prompt, user.id, req.variants)
+            response.headers["X-Cache"] = "MISS"
+        else:
+            result, source = await generate_text(prompt, user.id, fresh=fresh)
+            response.headers["X-Cache"] = source
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"[LLM ERROR] url={base_url} model={MODEL_NAME} backend={BACKEND} :: {e}")
         raise HTTPException(status_code=503, detail="Email generation service unavailable")
 
-    user = db.query(User).filter(User.email == token.sub).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     try:
-        email_record = EmailRequest(
-            prompt=req.prompt,
-            tone=tone_str,
-            length=length_str,
-            generated_email=result,
-            user_id=user.id,
+        if req.variants > 1:
+            emails = await run_db(save_variants, user.id, req.prompt, prompt.tone, prompt.length, texts)
+            return GeneratedEmails(**emails[0].dict(), variants=emails)
+        return await run_db(save_email, user.id, req.prompt, prompt.tone, prompt.length, result)
+    except Exception as e:
+        logger.error(f"[DB ERROR] {e}")
+        raise HTTPException(status_code=500, detail="Failed to save email")
+
+@app.post("/api/generate/stream")
+async def generate_email_stream(
+    req: GenerateRequest,
+    fresh: bool = False,
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    """Server-Sent Events: `token` events with text deltas, then `done` with the saved email and timings.
+    With `variants` > 1 the drafts stream interleaved from one upstream call, each `token` event naming
+    its `variant`, and `done` also lists every saved draft under `variants`."""
+    prompt = checked_prompt(req)
+    variants = req.variants
+    await admission.check_rate(user.id, cost=variants)
+    key = generation_key(prompt)
+    cached = await generation_cache.lookup(key, prompt.params, fresh=fresh) if variants == 1 else None
+    # Admit before the response starts so a rejection is still a plain 429.
+    ticket = await admission.acquire(user.id) if cached is None else None
+    stats = StreamStats()
+
+    async def events():
+        parts: Dict[int, List[str]] = defaultdict(list)
+        try:
+            if cached is not None:
+                stats.first_token_at = stats.finished_at = time.perf_counter()
+                parts[0].append(cached)
+                yield sse_event("token", {"text": cached})
+            elif variants > 1:
+                async for index, delta in llm.stream_chat_completion(
+                    messages=prompt.messages,
+                    stats=stats,
+                    n=variants,
+                    **prompt.params,
+                ):
+                    parts[index].append(delta)
+                    yield sse_event("token", {"text": delta, "variant": index})
+                record_variants(variants, len(parts), stats.usage)
+            else:
+                async for delta in llm.stream_chat_completion(
+                    messages=prompt.messages,
+                    stats=stats,
+                    **prompt.params,
+                ):
+                    parts[0].append(delta)
+                    yield sse_event("token", {"text": delta})
+                await generation_cache.store(
+                    key, prompt.params, "".join(parts[0]).strip(), stats.finished_at - stats.started
+                )
+        except asyncio.CancelledError:
+            logger.info(f"[STREAM] client disconnected after {stats.completion_tokens} tokens; upstream cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"[LLM ERROR] url={base_url} model={MODEL_NAME} backend={BACKEND} :: {e}")
+            yield sse_event("error", {"detail": "Email generation service unavailable"})
+            return
+        finally:
+            if ticket is not None:
+                await ticket.release()
+
+        logger.info(
+            f"[STREAM] ttft={stats.ttft_ms}ms total={stats.total_ms}ms "
+            f"tokens={stats.completion_tokens} tok/s={stats.tokens_per_sec}"
         )
-        db.add(email_record)
+        try:
+            if variants > 1:
+                texts = ["".join(parts[index]).strip() for index in sorted(parts)] or [""]
+                emails = await run_db(save_variants, user.id, req.prompt, prompt.tone, prompt.length, texts)
+            else:
+                emails = [await run_db(save_email, user.id, req.prompt, prompt.tone, prompt.length,
+                                       "".join(parts[0]).strip())]
+        except Exception as e:
+            logger.error(f"[DB ERROR] {e}")
+            yield sse_event("error", {"detail": "Failed to save email"})
+            return
+
+        done = {"email": emails[0].dict(), "cached": cached is not None, "metrics": stats.as_dict()}
+        if variants > 1:
+            done["variants"] = [email.dict() for email in emails]
+        yield sse_event("done", done)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs when the client disconnects before the generator starts.
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+
+def save_batch(db: Session, user_id: int, results: List[ItemResult]) -> Dict[int, EmailResponse]:
+    """Insert every successful item in one transaction; returns {item index: saved email}."""
+    records = {
+        r.index: EmailRequest(
+            prompt=r.request.prompt,
+            tone=r.tone,
+            length=r.length,
+            generated_email=r.text,
+            user_id=user_id,
+        )
+        for r in results if r.error is None
+    }
+    if not records:
+        return {}
+    with span("db_insert"):
+        db.add_all(records.values())
+        db.flush()
+        ids = [record.id for record in records.values()]
         db.commit()
-        db.refresh(email_record)
+        # One SELECT reloads the expired rows instead of a refresh() per row.
+        db.query(EmailRequest).filter(EmailRequest.id.in_(ids)).all()
+    return {index: EmailResponse.from_orm(record) for index, record in records.items()}
+
+@app.post("/api/generate/batch", response_model=BatchResponse)
+async def generate_email_batch(
+    batch: BatchPromptRequest,
+    stream: bool = False,
+    fresh: bool = False,
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    """Generate many emails in one call. With `?stream=true` the response is NDJSON: one line per item
+    as it completes, then a `summary` line with the ids of the rows saved in a single transaction."""
+    await admission.check_rate(user.id, cost=0)  # items are charged as they reach the LLM
+
+    if stream:
+        async def lines():
+            results: List[ItemResult] = []
+            async for r in generate_many(batch.items, user.id, fresh=fresh):
+                results.append(r)
+                if r.error:
+                    line = {"type": "error", "index": r.index, "detail": r.error}
+                else:
+                    line = {"type": "item", "index": r.index, "prompt": r.request.prompt, "tone": r.tone,
+                            "length": r.length, "generated_email": r.text, "source": r.source}
+                yield json.dumps(line) + "\n"
+
+            try:
+                records = await run_db(save_batch, user.id, results)
+                summary = {
+                    "type": "summary",
+                    "succeeded": len(records),
+                    "failed": len(results) - len(records),
+                    "ids": {str(index): record.id for index, record in records.items()},
+                }
+            except Exception as e:
+                logger.error(f"[DB ERROR] {e}")
+                summary = {"type": "summary", "error": "Failed to save emails"}
+            yield json.dumps(summary) + "\n"
 
-        
-        return EmailResponse.from_orm(email_record)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
+    results = [r async for r in generate_many(batch.items, user.id, fresh=fresh)]
+    try:
+        records = await run_db(save_batch, user.id, results)
+    except Exception as e:
+        logger.error(f"[DB ERROR] {e}")
+        raise HTTPException(status_code=500, detail="Failed to save emails")
+
+    items = [
+        BatchItemResult(index=r.index, email=records[r.index])
+        if r.error is None else BatchItemResult(index=r.index, error=r.error)
+        for r in sorted(results, key=lambda r: r.index)
+    ]
+    return BatchResponse(succeeded=len(records), failed=len(results) - len(records), results=items)
+
+@app.post("/api/emails/{email_id}/refine", response_model=RefineResponse)
+async def refine_email(
+    email_id: int,
+    req: RefineRequest,
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    """Revise a saved draft with an instruction. The prompt replays the conversation that led to the
+    draft and appends the instruction, so the server's prefix cache reuses everything before it;
+    the new draft is saved as a child row (`parent_id`) and `metrics` reports the step's latency
+    and how many prompt tokens were a reusable prefix."""
+    chain = await run_db(load_chain, user.id, email_id)
+    if not chain:
+        raise HTTPException(status_code=404, detail="Email not found")
+    conflict = chain_conflict(chain)
+    if conflict:
+        raise HTTPException(status_code=409, detail=conflict)
+    draft = chain[-1]
+    try:
+        prompt = build_refine_prompt(
+            chain, req.instruction, req.tone or EmailTone(draft.tone), req.length or EmailLength(draft.length)
+        )
+    except PromptTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    await admission.check_rate(user.id)
+
+    try:
+        text, metrics = await refine_text(prompt, user.id, step=len(chain))
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error(f"[LLM ERROR] url={base_url} model={MODEL_NAME} backend={BACKEND} :: {e}")
+        raise HTTPException(status_code=503, detail="Email generation service unavailable")
+    logger.info(
+        f"[REFINE] step={metrics.step} latency={metrics.latency_ms}ms prompt={metrics.prompt_tokens} "
+        f"prefix={metrics.prefix_tokens} cached={metrics.cached_tokens}"
+    )
+
+    try:
+        email = await run_db(
+            save_refinement, user.id, draft.id, chain[0].prompt, prompt.tone, prompt.length, req.instruction, text
+        )
     except Exception as e:
-        db.rollback()
         logger.error(f"[DB ERROR] {e}")
         raise HTTPException(status_code=500, detail="Failed to save email")
+    return RefineResponse(**email.dict(), metrics=metrics)
+
+EMAIL_COLUMNS = (
+    EmailRequest.prompt, EmailRequest.tone, EmailRequest.length,
+    EmailRequest.id, EmailRequest.generated_email, EmailRequest.created_at, EmailRequest.variant_group,
+    EmailRequest.parent_id, EmailRequest.refine_instruction,
+)
 
-@app.get("/api/emails", response_model=List[EmailResponse])
-async def get_emails(
+@app.get("/api/emails", response_class=FastJSONResponse)
+def get_emails(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    full: bool = Query(False, alias="all", description="the whole history in one response; ignores limit/before"),
     db: Session = Depends(get_db),
-    token: TokenData = Depends(get_current_token),
+    user: CurrentUser = Depends(get_current_user_identity),
 ):
-    user = db.query(User).filter(User.email == token.sub).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    """Newest first, one keyset page of `EmailResponse` objects; `X-Next-Cursor` carries the
+    `before` value for the next page. Rows are serialized straight from the selected columns."""
+    headers = {}
     try:
-        email_records = (
-            db.query(EmailRequest)
-            .filter(EmailRequest.user_id == user.id)
-            .order_by(EmailRequest.created_at.desc())
-            .all()
-        )
-        return [EmailResponse.from_orm(email) for email in email_records]
+        if full:
+            rows = (
+                db.query(*EMAIL_COLUMNS)
+                .filter(EmailRequest.user_id == user.id)
+                .order_by(EmailRequest.created_at.desc(), EmailRequest.id.desc())
+                .all()
+            )
+        else:
+            rows, next_cursor = keyset_page(db.query(*EMAIL_COLUMNS), user.id, before, limit)
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+        return FastJSONResponse([row._asdict() for row in rows], headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[DB ERROR] {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve emails")
+
+@app.get("/api/emails/summary", response_model=EmailSummaryPage)
+def get_email_summaries(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    """Lightweight history page: the `generated_email` bodies are never read from the DB."""
+    columns = db.query(
+        EmailRequest.id, EmailRequest.prompt, EmailRequest.tone, EmailRequest.length, EmailRequest.created_at
+    )
+    rows, next_cursor = keyset_page(columns, user.id, before, limit)
+    return EmailSummaryPage(items=[EmailSummary.from_orm(row) for row in rows], next_cursor=next_cursor)
+
+@app.get("/api/emails/search", response_model=SearchPage)
+def search_user_emails(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user_identity),
+):
+    """Ranked full-text search over the user's prompts and generated emails."""
+    try:
+        hits = search_emails(db.connection(), user.id, q, limit + 1, offset)
+    except Exception as e:
+        logger.error(f"[DB ERROR] search: {e}")
+        raise HTTPException(status_code=500, detail="Search failed")
+    next_offset = offset + limit if len(hits) > limit else None
+    return SearchPage(items=[SearchHit(**hit) for hit in hits[:limit]], next_offset=next_offset)
@@ -0,0 +1,403 @@
+# maintenance.py
+# Periodic housekeeping inside the API process. Every task has a row in `maintenance_tasks`;
+# with several workers, the one whose conditional UPDATE takes the row's lease runs the task
+# (it is that task's leader until it finishes or the lease expires), the others skip it.
+# Work is done in transactions of MAINTENANCE_BATCH_SIZE rows with a pause between them, so
+# request-path writes interleave instead of waiting behind one long delete.
+#   tokens     expired verification tokens, stale unverified users, expired revoked refresh tokens
+#   retention  emails older than EMAIL_RETENTION_DAYS / beyond EMAIL_RETENTION_MAX_PER_USER (archived first)
+#   analyze    planner statistics (ANALYZE)
+#   vacuum     give freed pages back (SQLite incremental vacuum, PostgreSQL VACUUM)
+#   python maintenance.py run [task ...]   # run now, e.g. from cron with MAINTENANCE_ENABLED=false
+import asyncio
+import gzip
+import logging
+import os
+import socket
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from settings import load_env
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import engine, run_db
+from metrics import Counter, Histogram
+from models import EmailRequest, MaintenanceTask, RevokedToken, User
+from token_revocation import forget_expired
+from user_cache import invalidate_user
+
+load_env()
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_ENABLED          = os.getenv("MAINTENANCE_ENABLED", "true").lower() in {"1", "true", "yes"}
+MAINTENANCE_BATCH_SIZE       = int(os.getenv("MAINTENANCE_BATCH_SIZE", 500))
+MAINTENANCE_BATCH_PAUSE      = float(os.getenv("MAINTENANCE_BATCH_PAUSE", 0.05))
+MAINTENANCE_TICK_SECONDS     = float(os.getenv("MAINTENANCE_TICK_SECONDS", 60))
+MAINTENANCE_START_DELAY      = float(os.getenv("MAINTENANCE_START_DELAY", 60))
+MAINTENANCE_LEASE_SECONDS    = float(os.getenv("MAINTENANCE_LEASE_SECONDS", 300))  # renewed after every batch
+# Seconds between runs of each task; 0 disables it.
+MAINTENANCE_TOKENS_INTERVAL    = float(os.getenv("MAINTENANCE_TOKENS_INTERVAL", 3600))
+MAINTENANCE_RETENTION_INTERVAL = float(os.getenv("MAINTENANCE_RETENTION_INTERVAL", 86400))
+MAINTENANCE_ANALYZE_INTERVAL   = float(os.getenv("MAINTENANCE_ANALYZE_INTERVAL", 86400))
+MAINTENANCE_VACUUM_INTERVAL    = float(os.getenv("MAINTENANCE_VACUUM_INTERVAL", 604800))
+
+UNVERIFIED_USER_TTL_DAYS     = float(os.getenv("UNVERIFIED_USER_TTL_DAYS", 7))  # 0 keeps them
+EMAIL_RETENTION_DAYS         = float(os.getenv("EMAIL_RETENTION_DAYS", 0))  # 0 keeps all history
+EMAIL_RETENTION_MAX_PER_USER = int(os.getenv("EMAIL_RETENTION_MAX_PER_USER", 0))  # 0: no cap
+EMAIL_ARCHIVE_DIR            = os.getenv("EMAIL_ARCHIVE_DIR", "")  # gzipped JSONL per day; empty: delete only
+# SQLite databases without incremental auto-vacuum get one full VACUUM (which converts them)
+# once this share of their pages is free; after that, freed pages are returned in batches.
+SQLITE_VACUUM_FREE_RATIO     = float(os.getenv("SQLITE_VACUUM_FREE_RATIO", 0.2))
+
+MAINTENANCE_ROWS = Counter("maintenance_rows_total", "Rows changed by maintenance tasks.", ("task", "action"))
+MAINTENANCE_SECONDS = Histogram("maintenance_run_seconds", "Maintenance task run time.", ("task",),
+                                buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800))
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+# Batch steps: each runs in its own session/transaction via run_db and returns rows affected.
+
+def _clear_expired_verification_tokens(db: Session, now: datetime, limit: int) -> int:
+    ids = db.scalars(
+        select(User.id).where(User.verification_token_expires < now).limit(limit)
+    ).all()
+    if ids:
+        db.query(User).filter(User.id.in_(ids)).update(
+            {User.verification_token: None, User.verification_token_expires: None}, synchronize_session=False)
+        db.commit()
+    return len(ids)
+
+
+def _delete_unverified_users(db: Session, cutoff: datetime, now: datetime, limit: int) -> int:
+    """Unverified accounts older than the cutoff whose link can no longer be used."""
+    rows = db.execute(
+        select(User.id, User.email)
+        .where(User.is_verified.is_(False), User.created_at < cutoff,
+               or_(User.verification_token_expires.is_(None), User.verification_token_expires < now))
+        .limit(limit)
+    ).all()
+    if rows:
+        db.query(User).filter(User.id.in_([r.id for r in rows])).delete(synchronize_session=False)
+        db.commit()
+        for row in rows:
+            invalidate_user(row.email)
+    return len(rows)
+
+
+def _delete_revoked_tokens(db: Session, now: datetime, limit: int) -> int:
+    jtis = db.scalars(select(RevokedToken.jti).where(RevokedToken.expires_at <= now).limit(limit)).all()
+    if jtis:
+        db.query(RevokedToken).filter(RevokedToken.jti.in_(jtis)).delete(synchronize_session=False)
+        db.commit()
+    return len(jtis)
+
+
+ARCHIVE_COLUMNS = (EmailRequest.id, EmailRequest.user_id, EmailRequest.tone, EmailRequest.length,
+                   EmailRequest.prompt, EmailRequest.created_at, EmailRequest.generated_email)
+
+
+def _archive(rows: List[Any]) -> None:
+    """Append rows to the day's gzipped JSONL before they are deleted (a failed delete can
+    archive a row twice, never lose one)."""
+    from responses import dumps
+
+    os.makedirs(EMAIL_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(EMAIL_ARCHIVE_DIR, f"emails-{datetime.utcnow():%Y-%m-%d}.jsonl.gz")
+    with gzip.open(path, "ab") as f:  # appending adds a gzip member; readers see one stream
+        f.write(b"".join(dumps(row._asdict()) + b"\n" for row in rows))
+
+
+def _delete_email_ids(db: Session, ids: List[int], archive_columns: bool) -> None:
+    if archive_columns:
+        _archive(db.execute(select(*ARCHIVE_COLUMNS).where(EmailRequest.id.in_(ids)).order_by(EmailRequest.id)).all())
+    db.query(EmailRequest).filter(EmailRequest.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+
+
+def _delete_expired_emails(db: Session, cutoff: datetime, limit: int) -> int:
+    ids = db.scalars(
+        select(EmailRequest.id).where(EmailRequest.created_at < cutoff).order_by(EmailRequest.id).limit(limit)
+    ).all()
+    if ids:
+        _delete_email_ids(db, ids, bool(EMAIL_ARCHIVE_DIR))
+    return len(ids)
+
+
+def _delete_emails_over_cap(db: Session, user_id: int, keep: int, limit: int) -> int:
+    """The user's emails after the `keep` newest, found by walking the history index."""
+    ids = db.scalars(
+        select(EmailRequest.id)
+        .where(EmailRequest.user_id == user_id)
+        .order_by(EmailRequest.created_at.desc(), EmailRequest.id.desc())
+        .offset(keep).limit(limit)
+    ).all()
+    if ids:
+        _delete_email_ids(db, ids, bool(EMAIL_ARCHIVE_DIR))
+    return len(ids)
+
+
+def _users_over_cap(db: Session, keep: int) -> List[int]:
+    return db.scalars(
+        select(EmailRequest.user_id).group_by(EmailRequest.user_id).having(func.count() > keep)
+    ).all()
+
+
+def _analyze(_: Session) -> int:
+    dialect = engine.dialect.name
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if dialect == "mysql":
+            conn.exec_driver_sql("ANALYZE TABLE users, email_requests, outbound_emails, generation_job_items")
+        else:
+            conn.exec_driver_sql("ANALYZE")
+        if dialect == "sqlite":
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return 0
+
+
+def _sqlite_pages(conn) -> Dict[str, int]:
+    return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("auto_vacuum", "freelist_count", "page_count")}
+
+
+def _vacuum_step(_: Session, limit: int) -> int:
+    """Return up to `limit` free pages (SQLite, incremental), or vacuum once (otherwise)."""
+    dialect = engine.dialect.name
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if dialect == "postgresql":
+            conn.exec_driver_sql("VACUUM")  # plain VACUUM: no exclusive locks
+            return 0
+        if dialect != "sqlite":
+            return 0  # MySQL's OPTIMIZE TABLE rebuilds and locks the table; run it by hand
+        pages = _sqlite_pages(conn)
+        if pages["auto_vacuum"] == 2:  # INCREMENTAL
+            # One page per step; pysqlite steps a statement without result columns only once.
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({limit});")
+            return pages["freelist_count"] - _sqlite_pages(conn)["freelist_count"]
+        if pages["page_count"] and pages["freelist_count"] / pages["page_count"] >= SQLITE_VACUUM_FREE_RATIO:
+            logger.warning(f"⚠️ Full VACUUM of the SQLite database ({pages['freelist_count']} free pages); "
+                           f"writers wait until it finishes. Later runs vacuum incrementally.")
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+            return pages["freelist_count"]
+        return 0
+
+
+# Lease bookkeeping
+
+def _ensure_rows(db: Session, names: Sequence[str]) -> None:
+    existing = set(db.scalars(select(MaintenanceTask.name)).all())
+    for name in set(names) - existing:
+        db.add(MaintenanceTask(name=name))
+        try:
+            db.commit()
+        except IntegrityError:  # another worker inserted it first
+            db.rollback()
+
+
+def _claim(db: Session, name: str, holder: str, interval: float, lease: float, force: bool) -> bool:
+    now = datetime.utcnow()
+    due = or_(MaintenanceTask.last_run_at.is_(None), MaintenanceTask.last_run_at <= now - timedelta(seconds=interval))
+    claimed = db.query(MaintenanceTask).filter(
+        MaintenanceTask.name == name,
+        or_(MaintenanceTask.lease_until.is_(None), MaintenanceTask.lease_until < now),
+        *(() if force else (due,)),
+    ).update({MaintenanceTask.holder: holder, MaintenanceTask.lease_until: now + timedelta(seconds=lease)},
+             synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def _renew(db: Session, name: str, holder: str, lease: float) -> bool:
+    renewed = db.query(MaintenanceTask).filter(MaintenanceTask.name == name, MaintenanceTask.holder == holder).update(
+        {MaintenanceTask.lease_until: datetime.utcnow() + timedelta(seconds=lease)}, synchronize_session=False)
+    db.commit()
+    return renewed == 1
+
+
+def _finish(db: Session, name: str, holder: str, duration_ms: int, rows: int, error: Optional[str]) -> None:
+    db.query(MaintenanceTask).filter(MaintenanceTask.name == name, MaintenanceTask.holder == holder).update({
+        MaintenanceTask.holder: None, MaintenanceTask.lease_until: None,
+        MaintenanceTask.last_run_at: datetime.utcnow(), MaintenanceTask.last_duration_ms: duration_ms,
+        MaintenanceTask.last_rows: rows, MaintenanceTask.last_error: error,
+    }, synchronize_session=False)
+    db.commit()
+
+
+def _task_rows(db: Session) -> List[Dict[str, Any]]:
+    return [
+        {"task": t.name, "holder": t.holder, "lease_until": t.lease_until, "last_run_at": t.last_run_at,
+         "last_duration_ms": t.last_duration_ms, "last_rows": t.last_rows, "last_error": t.last_error}
+        for t in db.query(MaintenanceTask).order_by(MaintenanceTask.name).all()
+    ]
+
+
+@dataclass
+class Task:
+    name: str
+    interval: float
+    run: Callable[["MaintenanceScheduler", "TaskRun"], Awaitable[None]]
+
+
+class TaskRun:
+    """Rows affected per action during one run of a task, plus the lease it runs under."""
+
+    def __init__(self, scheduler: "MaintenanceScheduler", name: str):
+        self.scheduler = scheduler
+        self.name = name
+        self.rows: Dict[str, int] = {}
+
+    async def batched(self, action: str, step: Callable[..., int], *args: Any) -> int:
+        """Call `step(db, *args, limit)` until a batch comes back short, renewing the lease and
+        pausing between batches."""
+        total = 0
+        while True:
+            n = await run_db(step, *args, MAINTENANCE_BATCH_SIZE)
+            total += n
+            if n < MAINTENANCE_BATCH_SIZE:
+                break
+            await self.scheduler.renew(self.name)
+            await asyncio.sleep(MAINTENANCE_BATCH_PAUSE)
+        self.count(action, total)
+        return total
+
+    def count(self, action: str, n: int) -> None:
+        self.rows[action] = self.rows.get(action, 0) + n
+        if n:
+            MAINTENANCE_ROWS.labels(self.name, action).inc(n)
+
+
+async def sweep_tokens(_: "MaintenanceScheduler", run: TaskRun) -> None:
+    now = datetime.utcnow()
+    await run.batched("verification_tokens_cleared", _clear_expired_verification_tokens, now)
+    if UNVERIFIED_USER_TTL_DAYS > 0:
+        cutoff = now - timedelta(days=UNVERIFIED_USER_TTL_DAYS)
+        await run.batched("unverified_users_deleted", _delete_unverified_users, cutoff, now)
+    await run.batched("revoked_tokens_deleted", _delete_revoked_tokens, now)
+    forget_expired(now)
+
+
+async def apply_retention(_: "MaintenanceScheduler", run: TaskRun) -> None:
+    if EMAIL_RETENTION_DAYS > 0:
+        cutoff = datetime.utcnow() - timedelta(days=EMAIL_RETENTION_DAYS)
+        await run.batched("emails_expired", _delete_expired_emails, cutoff)
+    keep = EMAIL_RETENTION_MAX_PER_USER
+    if keep > 0:
+        for user_id in await run_db(_users_over_cap, keep):
+            await run.batched("emails_over_cap", _delete_emails_over_cap, user_id, keep)
+
+
+async def analyze(_: "MaintenanceScheduler", run: TaskRun) -> None:
+    await run_db(_analyze)
+
+
+async def vacuum(_: "MaintenanceScheduler", run: TaskRun) -> None:
+    await run.batched("pages_freed", _vacuum_step)
+
+
+TASKS = [
+    Task("tokens", MAINTENANCE_TOKENS_INTERVAL, sweep_tokens),
+    Task("retention", MAINTENANCE_RETENTION_INTERVAL, apply_retention),
+    Task("analyze", MAINTENANCE_ANALYZE_INTERVAL, analyze),
+    Task("vacuum", MAINTENANCE_VACUUM_INTERVAL, vacuum),
+]
+
+
+class MaintenanceScheduler:
+    def __init__(self, tasks: List[Task]):
+        self.tasks = {task.name: task for task in tasks}
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.runs = 0
+        self.last: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        enabled = ", ".join(f"{t.name}/{t.interval:g}s" for t in self.tasks.values() if t.interval > 0)
+        logger.info(f"🧹 Maintenance scheduler started ({enabled}).")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        await asyncio.sleep(MAINTENANCE_START_DELAY)
+        while True:
+            try:
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Maintenance tick failed: {e}")
+            await asyncio.sleep(MAINTENANCE_TICK_SECONDS)
+
+    async def run_due(self, names: Optional[Sequence[str]] = None, force: bool = False) -> List[Dict[str, Any]]:
+        """Run every due task (or `names`, due or not with `force`) whose lease this worker wins."""
+        await run_db(_ensure_rows, list(self.tasks))
+        results = []
+        for task in (self.tasks[n] for n in names) if names else self.tasks.values():
+            if task.interval <= 0 and not force:
+                continue
+            if await run_db(_claim, task.name, self.holder, task.interval, MAINTENANCE_LEASE_SECONDS, force):
+                results.append(await self._execute(task))
+        return results
+
+    async def renew(self, name: str) -> None:
+        if not await run_db(_renew, name, self.holder, MAINTENANCE_LEASE_SECONDS):
+            raise LeaseLost(f"lease on maintenance task {name} was taken over")
+
+    async def _execute(self, task: Task) -> Dict[str, Any]:
+        run = TaskRun(self, task.name)
+        start = time.perf_counter()
+        error = None
+        try:
+            await task.run(self, run)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"❌ Maintenance task {task.name} failed: {error}")
+        elapsed = time.perf_counter() - start
+        MAINTENANCE_SECONDS.labels(task.name).observe(elapsed)
+        total = sum(run.rows.values())
+        await run_db(_finish, task.name, self.holder, int(elapsed * 1000), total, error)
+        self.runs += 1
+        self.last[task.name] = {"at": datetime.utcnow(), "ms": round(elapsed * 1000, 1), "rows": run.rows, "error": error}
+        if error is None:
+            logger.info(f"🧹 Maintenance {task.name}: {run.rows or 'done'} in {elapsed * 1000:.0f} ms")
+        return {"task": task.name, **self.last[task.name]}
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "holder": self.holder,
+            "runs": self.runs,
+            "last_here": self.last,
+            "tasks": await run_db(_task_rows),
+        }
+
+
+maintenance = MaintenanceScheduler(TASKS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if not args or args[0] != "run" or set(args[1:]) - set(maintenance.tasks):
+        sys.exit(f"usage: python maintenance.py run [{' | '.join(maintenance.tasks)} ...]")
+    for result in asyncio.run(maintenance.run_due(args[1:] or None, force=True)):
+        print(result)
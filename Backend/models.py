@@ -1,22 +1,40 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, declarative_base
 
+from compressed_text import CompressedText
+from prompts import PROMPT_VERSION
+
 Base = declarative_base()
 
 class EmailRequest(Base):
     __tablename__ = "email_requests"
 
     id = Column(Integer, primary_key=True, index=True)
-    prompt = Column(Text, nullable=False)
+    # Both texts are compressed at rest and not searchable in SQL: use search.py's index.
+    prompt = Column(CompressedText(), nullable=False)
     tone = Column(String(50), nullable=False)
     length = Column(String(50), nullable=False)
-    generated_email = Column(Text, nullable=False)
+    generated_email = Column(CompressedText(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     user = relationship("User", back_populates="emails")
+    # Drafts generated together (`variants` > 1) share the id of the first one; NULL otherwise.
+    variant_group = Column(Integer, nullable=True)
+    # A refinement (POST /api/emails/{id}/refine) points at the draft it revised and keeps the
+    # instruction, so the whole conversation can be rebuilt; both NULL for fresh generations.
+    parent_id = Column(Integer, ForeignKey("email_requests.id", ondelete="SET NULL"), nullable=True)
+    refine_instruction = Column(Text, nullable=True)
+    # prompts.PROMPT_VERSION the conversation was built with: a refinement replays the original
+    # turns, which is only exact under the same templates. NULL for rows written before it existed.
+    prompt_version = Column(String(20), nullable=True, default=PROMPT_VERSION)
+
+    # Backs the per-user history keyset: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+    __table_args__ = (
+        Index("ix_email_requests_user_created_id", "user_id", "created_at", "id"),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -31,3 +49,97 @@ class User(Base):
     verification_token_expires = Column(DateTime, nullable=True)
 
     emails = relationship("EmailRequest", back_populates="user", cascade="all, delete-orphan")
+
+class OutboundEmail(Base):
+    """Durable outbound mail queue drained by mail_queue.MailWorker."""
+    __tablename__ = "outbound_emails"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(100), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body_text = Column(Text, nullable=False)
+    body_html = Column(Text, nullable=True)
+    status = Column(String(20), default="pending", nullable=False)  # pending | sending | sent | failed
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, server_default=func.now(), nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    # Backs the worker's claim: WHERE status = ? AND next_attempt_at <= ? ORDER BY id
+    __table_args__ = (
+        Index("ix_outbound_emails_status_next", "status", "next_attempt_at", "id"),
+    )
+
+class GenerationJob(Base):
+    """An offline batch of prompts; items are generated by jobs.JobWorker."""
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(20), default="pending", nullable=False)  # pending | running | completed | cancelled
+    total_items = Column(Integer, nullable=False)
+    completed_items = Column(Integer, default=0, nullable=False)
+    failed_items = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_generation_jobs_user_created", "user_id", "created_at"),
+    )
+
+class GenerationJobItem(Base):
+    __tablename__ = "generation_job_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("generation_jobs.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    prompt = Column(Text, nullable=False)
+    tone = Column(String(50), nullable=False)
+    length = Column(String(50), nullable=False)
+    status = Column(String(20), default="pending", nullable=False)  # pending | running | done | failed | cancelled
+    attempts = Column(Integer, default=0, nullable=False)
+    lease_until = Column(DateTime, server_default=func.now(), nullable=False)  # also the retry time of pending rows
+    generated_email = Column(CompressedText(), nullable=True)
+    error = Column(Text, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Worker claim: WHERE status IN (...) AND lease_until <= ? ORDER BY position, id
+        # (position first, so jobs submitted later are interleaved instead of queued behind a big one)
+        Index("ix_generation_job_items_status_position", "status", "position", "id"),
+        # Results export: WHERE job_id = ? ORDER BY position
+        Index("ix_generation_job_items_job_position", "job_id", "position"),
+    )
+
+class RevokedToken(Base):
+    """Refresh tokens already rotated by /api/auth/refresh; see token_revocation."""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(32), primary_key=True)
+    expires_at = Column(DateTime, nullable=False)  # the token's own exp; the row is useless after it
+
+    __table_args__ = (
+        Index("ix_revoked_tokens_expires_at", "expires_at"),
+    )
+
+class MaintenanceTask(Base):
+    """One row per maintenance.py task: which worker holds its lease, and its last run."""
+    __tablename__ = "maintenance_tasks"
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(100), nullable=True)  # host:pid of the worker running it
+    lease_until = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    last_duration_ms = Column(Integer, nullable=True)
+    last_rows = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+class SchemaState(Base):
+    """One row: the fingerprint of the schema db_migrations.ensure_schema last applied."""
+    __tablename__ = "schema_state"
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    applied_at = Column(DateTime, server_default=func.now(), nullable=False)
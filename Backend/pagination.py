@@ -0,0 +1,78 @@
+# pagination.py
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, cast, literal, or_, select
+from sqlalchemy.orm import Query
+
+from models import EmailRequest
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(email_id: int, created_at: str) -> str:
+    return base64.urlsafe_b64encode(f"e:{email_id}:{created_at}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[int, Optional[str]]:
+    """(anchor id, anchor created_at); cursors issued before the key was encoded carry only the id."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, email_id, *created_at = raw.split(":", 2)
+        if prefix != "e":
+            raise ValueError(prefix)
+        return int(email_id), created_at[0] if created_at else None
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _is_sqlite(query: Query) -> bool:
+    return query.session.get_bind().dialect.name == "sqlite"
+
+def _stored_created_at(query: Query, user_id: int, email_id: int) -> Optional[str]:
+    """The row's created_at as the cursor carries it: on SQLite the stored text itself
+    (CURRENT_TIMESTAMP has no microseconds, so a re-rendered datetime would not compare equal),
+    elsewhere ISO 8601."""
+    where = (EmailRequest.id == email_id, EmailRequest.user_id == user_id)
+    if _is_sqlite(query):
+        return query.session.execute(select(cast(EmailRequest.created_at, String)).where(*where)).scalar()
+    value = query.session.execute(select(EmailRequest.created_at).where(*where)).scalar()
+    return value.isoformat() if value is not None else None
+
+def keyset_page(query: Query, user_id: int, before: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """Newest-first page of `query` (rows must expose `id`), strictly older than the `before` cursor.
+
+    The cursor carries the anchor's full key (created_at, id), so a page still follows on when the
+    anchor row has been deleted since (retention, account cleanup).
+    """
+    query = query.filter(EmailRequest.user_id == user_id)
+    if before:
+        anchor_id, anchor_created = decode_cursor(before)
+        if anchor_created is None:
+            anchor_created = _stored_created_at(query, user_id, anchor_id)
+            if anchor_created is None:
+                raise HTTPException(status_code=400, detail="Cursor no longer valid; start from the first page")
+        if _is_sqlite(query):
+            key = literal(anchor_created, String)  # compared as stored text
+        else:
+            try:
+                key = datetime.fromisoformat(anchor_created)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(
+            or_(
+                EmailRequest.created_at < key,
+                and_(EmailRequest.created_at == key, EmailRequest.id < anchor_id),
+            )
+        )
+    rows = (
+        query.order_by(EmailRequest.created_at.desc(), EmailRequest.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        last_id = rows[limit - 1].id
+        next_cursor = encode_cursor(last_id, _stored_created_at(query, user_id, last_id))
+    return rows[:limit], next_cursor
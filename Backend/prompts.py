@@ -0,0 +1,182 @@
+# prompts.py
+# Prompt construction: tone/length -> system prompt, per-length decode budget and stop
+# sequences, with prompt tokens counted by a local tokenizer so requests that can't fit the
+# model context are rejected (or their budget trimmed) before they reach the GPU.
+# Bump PROMPT_VERSION whenever a template, budget or stop list changes: it is part of the
+# generation cache key, so old completions are not served for new prompts.
+import logging
+import math
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from settings import load_env
+
+from schemas import EmailLength, EmailTone, PromptRequest
+
+load_env()
+logger = logging.getLogger(__name__)
+
+PROMPT_VERSION = "2"
+
+TOKENIZER_PATH        = os.getenv("TOKENIZER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Qwen2.5-0.5B"))
+LLM_CONTEXT_TOKENS    = int(os.getenv("LLM_CONTEXT_TOKENS", 32768))  # match vLLM --max-model-len
+MIN_COMPLETION_TOKENS = int(os.getenv("MIN_COMPLETION_TOKENS", 64))
+GENERATION_TEMPERATURE = float(os.getenv("GENERATION_TEMPERATURE", 0.7))
+
+# Qwen chat template: <|im_start|>{role}\n{content}<|im_end|>\n per message, then <|im_start|>assistant\n
+MESSAGE_OVERHEAD_TOKENS = 5
+REPLY_PRIMING_TOKENS = 3
+
+STOP_SEQUENCES = ["<|im_end|>", "<|endoftext|>", "\nNote:", "\n\n\n"]
+
+
+@dataclass(frozen=True)
+class LengthSpec:
+    words: str
+    max_tokens: int
+
+
+# ~1.35 tokens per English word, plus the subject line, greeting and sign-off.
+LENGTH_SPECS: Dict[EmailLength, LengthSpec] = {
+    EmailLength.SHORT:  LengthSpec("60-100 words",  int(os.getenv("PROMPT_MAX_TOKENS_SHORT", 192))),
+    EmailLength.MEDIUM: LengthSpec("120-200 words", int(os.getenv("PROMPT_MAX_TOKENS_MEDIUM", 352))),
+    EmailLength.LONG:   LengthSpec("250-400 words", int(os.getenv("PROMPT_MAX_TOKENS_LONG", 640))),
+}
+
+TONE_GUIDANCE: Dict[EmailTone, str] = {
+    EmailTone.FORMAL:       "Use a formal register: complete sentences, no contractions, a courteous greeting and closing.",
+    EmailTone.INFORMAL:     "Keep it relaxed and conversational; contractions and a casual sign-off are fine.",
+    EmailTone.NEUTRAL:      "Keep it plain and matter-of-fact, neither stiff nor chatty.",
+    EmailTone.FRIENDLY:     "Sound warm and upbeat while staying clear about the request.",
+    EmailTone.PROFESSIONAL: "Be polite, concise and action-oriented, as to a colleague or client.",
+}
+
+SYSTEM_TEMPLATE = (
+    "You write emails. Write one {tone} email of {words}. {guidance} "
+    "Start with a 'Subject:' line, then the body with a greeting and a sign-off. "
+    "Output only the email: no explanations, notes or alternative versions."
+)
+
+
+# A refinement is a user turn appended to the conversation that produced the draft.
+REFINE_TEMPLATE = "Revise the email above: {instruction}{changes} Output only the revised email."
+
+
+class PromptTooLong(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """The local Hugging Face tokenizer (tokenizer.json under TOKENIZER_PATH), or None."""
+    path = os.path.join(TOKENIZER_PATH, "tokenizer.json")
+    if not os.path.exists(path):
+        logger.warning(f"⚠️ No tokenizer at {path}; estimating prompt tokens from length.")
+        return None
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        logger.warning("⚠️ `tokenizers` not installed (pip install tokenizers); estimating prompt tokens from length.")
+        return None
+    return Tokenizer.from_file(path)
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        # Deliberately high (~3 chars/token vs ~4 for English BPE) so context checks stay safe.
+        return math.ceil(len(text) / 3)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages) + REPLY_PRIMING_TOKENS
+
+
+def system_prompt(tone: EmailTone, length: EmailLength) -> str:
+    return SYSTEM_TEMPLATE.format(tone=tone.value, words=LENGTH_SPECS[length].words, guidance=TONE_GUIDANCE[tone])
+
+
+def fit_budget(prompt_tokens: int, budget: int) -> int:
+    """Largest decode budget <= `budget` that fits the context after the prompt."""
+    available = LLM_CONTEXT_TOKENS - prompt_tokens
+    if available < MIN_COMPLETION_TOKENS:
+        raise PromptTooLong(
+            f"Prompt needs {prompt_tokens} tokens; the model context is {LLM_CONTEXT_TOKENS} "
+            f"and at least {MIN_COMPLETION_TOKENS} are kept for the reply"
+        )
+    return min(budget, available)
+
+
+@dataclass(frozen=True)
+class BuiltPrompt:
+    tone: str
+    length: str
+    messages: List[Dict[str, str]]
+    params: Dict[str, Any]
+    prompt_tokens: int
+    version: str = PROMPT_VERSION
+
+    @property
+    def cache_text(self) -> str:
+        return "\n".join(f"{m['role']}: {m['content']}" for m in self.messages)
+
+
+def build_prompt(req: PromptRequest) -> BuiltPrompt:
+    tone, length = EmailTone(req.tone), EmailLength(req.length)
+    messages = [
+        {"role": "system", "content": system_prompt(tone, length)},
+        {"role": "user", "content": req.prompt.strip()},
+    ]
+    prompt_tokens = count_message_tokens(messages)
+    params = {
+        "temperature": GENERATION_TEMPERATURE,
+        "max_tokens": fit_budget(prompt_tokens, LENGTH_SPECS[length].max_tokens),
+        "stop": STOP_SEQUENCES,
+    }
+    return BuiltPrompt(tone.value, length.value, messages, params, prompt_tokens)
+
+
+def refine_turn(instruction: str, tone: Optional[EmailTone] = None, length: Optional[EmailLength] = None) -> str:
+    """The user message of one refinement step; a new tone or length is spelled out in it."""
+    changes = ""
+    if tone is not None:
+        changes += f" Make it {tone.value}. {TONE_GUIDANCE[tone]}"
+    if length is not None:
+        changes += f" Aim for {LENGTH_SPECS[length].words}."
+    return REFINE_TEMPLATE.format(instruction=instruction.strip().rstrip(".") + ".", changes=changes)
+
+
+def build_refine_prompt(chain: Sequence[Any], instruction: str, tone: EmailTone, length: EmailLength) -> BuiltPrompt:
+    """The conversation so far plus one new instruction. `chain` is the rows from the original
+    generation to the draft being refined (prompt, tone, length, refine_instruction, generated_email).
+    The original system and user turns are rebuilt exactly, and every step only appends turns, so
+    each refinement's prompt starts with the previous one and a prefix cache (vLLM's automatic
+    prefix caching, the local backend's) serves all but the newest turns without prefilling them.
+    A changed tone/length goes into the instruction turn: changing the system prompt would break that."""
+    root = chain[0]
+    messages = build_prompt(PromptRequest(prompt=root.prompt, tone=root.tone, length=root.length)).messages
+    previous = root
+    for row in chain:
+        if row is not root:
+            messages.append({"role": "user", "content": refine_turn(
+                row.refine_instruction or "",
+                EmailTone(row.tone) if row.tone != previous.tone else None,
+                EmailLength(row.length) if row.length != previous.length else None,
+            )})
+        messages.append({"role": "assistant", "content": row.generated_email})
+        previous = row
+    messages.append({"role": "user", "content": refine_turn(
+        instruction,
+        tone if tone.value != previous.tone else None,
+        length if length.value != previous.length else None,
+    )})
+    prompt_tokens = count_message_tokens(messages)
+    params = {
+        "temperature": GENERATION_TEMPERATURE,
+        "max_tokens": fit_budget(prompt_tokens, LENGTH_SPECS[length].max_tokens),
+        "stop": STOP_SEQUENCES,
+    }
+    return BuiltPrompt(tone.value, length.value, messages, params, prompt_tokens)
@@ -0,0 +1,123 @@
+# refinement.py
+# POST /api/emails/{id}/refine: revise a saved draft with an instruction ("make it shorter").
+# The new draft is a child row (parent_id) of the one it revises, and its prompt is the whole
+# conversation so far plus the instruction (prompts.build_refine_prompt), so each step's prompt
+# extends the previous step's and the server's prefix cache only prefills the newest turns.
+import logging
+import os
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+from settings import load_env
+from sqlalchemy import literal, select
+from sqlalchemy.orm import Session, aliased
+
+from admission import admission
+from llm_client import llm
+from metrics import Counter, Histogram, span
+from models import EmailRequest
+from prompts import PROMPT_VERSION, REPLY_PRIMING_TOKENS, BuiltPrompt, count_message_tokens
+from schemas import EmailResponse, RefineMetrics
+
+load_env()
+logger = logging.getLogger(__name__)
+
+REFINE_MAX_STEPS = int(os.getenv("REFINE_MAX_STEPS", 20))  # refinements of one generated email
+
+REFINE_SECONDS = Histogram("refine_step_seconds", "Upstream latency of a refinement, by step in its chain.", ("step",))
+REFINE_PROMPT_TOKENS = Counter("refine_prompt_tokens_total",
+                               "Refinement prompt tokens: prefix (the previous step's conversation, reusable "
+                               "from a prefix cache) or new (the instruction turn).", ("kind",))
+REFINE_CACHED_TOKENS = Counter("refine_cached_prompt_tokens_total",
+                               "Refinement prompt tokens the server reported serving from its prefix cache.")
+
+CHAIN_COLUMNS = (
+    "id", "parent_id", "prompt", "tone", "length", "refine_instruction", "generated_email", "prompt_version",
+)
+
+
+def load_chain(db: Session, user_id: int, email_id: int) -> List[Any]:
+    """The user's email `email_id` and its ancestors, oldest first, in one recursive query.
+    The walk stops after REFINE_MAX_STEPS + 1 rows: a chain that long cannot be refined again."""
+    columns = [getattr(EmailRequest, name) for name in CHAIN_COLUMNS]
+    chain = (
+        select(*columns, literal(0).label("depth"))
+        .where(EmailRequest.id == email_id, EmailRequest.user_id == user_id)
+        .cte("chain", recursive=True)
+    )
+    parent = aliased(EmailRequest)
+    chain = chain.union_all(
+        select(*[getattr(parent, name) for name in CHAIN_COLUMNS], chain.c.depth + 1)
+        .join(chain, parent.id == chain.c.parent_id)
+        .where(chain.c.depth < REFINE_MAX_STEPS)
+    )
+    return db.execute(select(chain).order_by(chain.c.depth.desc())).all()
+
+
+def chain_conflict(chain: Sequence[Any]) -> Optional[str]:
+    """Why the conversation behind `chain` cannot be replayed, or None. Deleting a row (by hand
+    or by retention) leaves its refinements with parent_id NULL, so the oldest row is then a
+    refinement, not the original generation; and the original turns are rebuilt from the current
+    templates, which must be the ones the original was generated with."""
+    if len(chain) > REFINE_MAX_STEPS:
+        return f"Email has been refined {REFINE_MAX_STEPS} times already"
+    root = chain[0]
+    if root.refine_instruction is not None:
+        return "An earlier draft of this email was deleted; its conversation cannot be replayed"
+    if root.prompt_version is not None and root.prompt_version != PROMPT_VERSION:
+        return "Email was generated with an older prompt template; generate it again to refine it"
+    return None
+
+
+def cached_prompt_tokens(usage) -> Optional[int]:
+    """vLLM/OpenAI report `prompt_tokens_details.cached_tokens` (vLLM with
+    --enable-prompt-tokens-details); the local backend reports `cached_tokens`."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens")
+    if details is not None:
+        return getattr(details, "cached_tokens", None)
+    return getattr(usage, "cached_tokens", None)
+
+
+async def refine_text(prompt: BuiltPrompt, user_id: int, step: int) -> Tuple[str, RefineMetrics]:
+    """One upstream call for a refinement (never cached: it is an explicit request for a new draft)."""
+    async with admission.slot(user_id):
+        start = time.perf_counter()
+        completion = await llm.chat_completion(messages=prompt.messages, **prompt.params)
+        latency = time.perf_counter() - start
+    text = completion.choices[0].message.content.strip()
+    usage = getattr(completion, "usage", None)
+    prefix_tokens = count_message_tokens(prompt.messages[:-1]) - REPLY_PRIMING_TOKENS
+    metrics = RefineMetrics(
+        step=step,
+        latency_ms=round(latency * 1000, 2),
+        prompt_tokens=prompt.prompt_tokens,
+        prefix_tokens=prefix_tokens,
+        cached_tokens=cached_prompt_tokens(usage) if usage is not None else None,
+    )
+    REFINE_SECONDS.labels(str(step) if step < 5 else "5+").observe(latency)
+    REFINE_PROMPT_TOKENS.labels("prefix").inc(prefix_tokens)
+    REFINE_PROMPT_TOKENS.labels("new").inc(max(0, prompt.prompt_tokens - prefix_tokens))
+    if metrics.cached_tokens:
+        REFINE_CACHED_TOKENS.inc(metrics.cached_tokens)
+    return text, metrics
+
+
+def save_refinement(
+    db: Session, user_id: int, parent_id: int, prompt: str, tone: str, length: str, instruction: str, text: str
+) -> EmailResponse:
+    record = EmailRequest(
+        prompt=prompt,
+        tone=tone,
+        length=length,
+        generated_email=text,
+        user_id=user_id,
+        parent_id=parent_id,
+        refine_instruction=instruction,
+    )
+    with span("db_insert"):
+        db.add(record)
+        db.commit()
+        db.refresh(record)
+    return EmailResponse.from_orm(record)
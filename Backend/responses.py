@@ -0,0 +1,35 @@
+# responses.py
+import json
+import logging
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson  # optional dependency
+except ImportError:
+    orjson = None
+    logger.info("ℹ️ orjson not installed (pip install orjson); large lists are serialized with the json module.")
+
+
+def dumps(content: Any) -> bytes:
+    """Same output as FastAPI's encoder for plain dicts/lists of str, int and datetime."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """For endpoints that build plain rows themselves and skip response_model validation.
+    Serializes with orjson when it's installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
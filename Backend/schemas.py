@@ -1,6 +1,6 @@
 # schemas.py
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -41,6 +41,9 @@ class EmailResponse(PromptRequest):
     id: int
     generated_email: str
     created_at: datetime
+    variant_group: Optional[int] = None
+    parent_id: Optional[int] = None
+    refine_instruction: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -48,6 +51,74 @@ class EmailResponse(PromptRequest):
 
     model_config = ConfigDict(from_attributes=True, orm_mode=True)
 
+MAX_VARIANTS = 8
+
+class GenerateRequest(PromptRequest):
+    # Drafts of the same prompt, sampled in one upstream call (`n`) and saved together.
+    variants: int = Field(1, ge=1, le=MAX_VARIANTS)
+
+class GeneratedEmails(EmailResponse):
+    """The first draft, as before; with `variants` > 1 every draft (the first included) in `variants`."""
+    variants: List[EmailResponse] = []
+
+class RefineRequest(BaseModel):
+    instruction: str = Field(..., min_length=2, max_length=500)
+    # Omitted: keep the draft's tone/length.
+    tone: Optional[EmailTone] = None
+    length: Optional[EmailLength] = None
+
+    model_config = ConfigDict(
+        json_schema_extra={"example": {"instruction": "Make it shorter and mention the Friday deadline"}}
+    )
+
+class RefineMetrics(BaseModel):
+    step: int  # 1 for the first refinement of a generated email
+    latency_ms: float  # upstream call
+    prompt_tokens: int
+    prefix_tokens: int  # the previous step's conversation, which a prefix cache can reuse
+    cached_tokens: Optional[int] = None  # prompt tokens the server reports it served from its cache
+
+class RefineResponse(EmailResponse):
+    metrics: RefineMetrics
+
+class EmailSummary(BaseModel):
+    """History list entry without the generated body."""
+    id: int
+    prompt: str
+    tone: EmailTone
+    length: EmailLength
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class EmailSummaryPage(BaseModel):
+    items: List[EmailSummary]
+    next_cursor: Optional[str] = None
+
+class SearchHit(EmailSummary):
+    snippet: str
+    rank: Optional[float] = None
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_offset: Optional[int] = None
+
+MAX_BATCH_ITEMS = 500
+
+class BatchPromptRequest(BaseModel):
+    items: List[PromptRequest] = Field(..., min_items=1, max_items=MAX_BATCH_ITEMS)
+
+class BatchItemResult(BaseModel):
+    index: int
+    email: Optional[EmailResponse] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
 # ---------------------------------------------------------------------
 # User Models
 # ---------------------------------------------------------------------
@@ -70,6 +141,7 @@ class TokenData(BaseModel):
     sub: Optional[str] = None
     exp: Optional[int] = None
     type: Optional[str] = None
+    jti: Optional[str] = None
 
 class UserResponse(UserBase):
     id: int
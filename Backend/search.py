@@ -0,0 +1,321 @@
+# search.py
+# Full-text index over EmailRequest.prompt / generated_email. Neither index keeps a copy of
+# the text, so it stays compressed at rest; snippets are highlighted from the decompressed rows.
+#   SQLite:     contentless FTS5 table `email_requests_fts` (rowid = email id), kept in step by
+#               triggers that read the rows through the `decompress_text` SQL function
+#               (compressed_text.register_sqlite_functions, installed on every app connection)
+#   PostgreSQL: side table `email_search` (email id + GIN-indexed tsvector), filled from the ORM
+#               `after_insert` / `after_update` hooks; deletes cascade through the FK
+#   python search.py backfill   # (re)build the index for an existing database
+import logging
+import re
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from compressed_text import CompressedText
+from models import EmailRequest
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "email_requests_fts"
+PG_TABLE = "email_search"
+PG_CONFIG = "english"
+PG_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=1, MaxWords=24"
+BACKFILL_BATCH = 1000
+SNIPPET_WORDS = 16
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_fts_available: Dict[str, bool] = {}
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+def ensure_search_index(engine: Engine) -> None:
+    dialect = _dialect(engine)
+    rebuild = False
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            existing = conn.exec_driver_sql(
+                f"SELECT sql FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'"
+            ).scalar()
+            if existing and "content=''" not in existing:
+                # Earlier versions kept plain-text copies of both columns in the FTS table.
+                logger.info("🔎 Replacing the FTS5 table with a contentless one (reindexes every email)...")
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad")
+                conn.exec_driver_sql(f"DROP TABLE {FTS_TABLE}")
+                rebuild = True
+            try:
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    f"USING fts5(prompt, generated_email, content='', tokenize='porter unicode61')"
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ SQLite FTS5 unavailable, search falls back to LIKE: {e}")
+                _fts_available[dialect] = False
+                return
+            # A contentless table can only forget a row given the text it indexed, hence the
+            # decompressed old values in the delete and update triggers.
+            plain = "decompress_text({0}.prompt), decompress_text({0}.generated_email)"
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON email_requests BEGIN "
+                f"INSERT INTO {FTS_TABLE} (rowid, prompt, generated_email) "
+                f"VALUES (new.id, {plain.format('new')}); END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON email_requests BEGIN "
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, prompt, generated_email) "
+                f"VALUES ('delete', old.id, {plain.format('old')}); END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF prompt, generated_email "
+                f"ON email_requests BEGIN "
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, prompt, generated_email) "
+                f"VALUES ('delete', old.id, {plain.format('old')}); "
+                f"INSERT INTO {FTS_TABLE} (rowid, prompt, generated_email) "
+                f"VALUES (new.id, {plain.format('new')}); END"
+            )
+        elif dialect == "postgresql":
+            conn.exec_driver_sql(
+                f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+                f"email_id INTEGER PRIMARY KEY REFERENCES email_requests(id) ON DELETE CASCADE, "
+                f"document TSVECTOR NOT NULL)"
+            )
+            # Earlier versions kept plain-text copies of both columns here.
+            conn.exec_driver_sql(
+                f"ALTER TABLE {PG_TABLE} DROP COLUMN IF EXISTS prompt, DROP COLUMN IF EXISTS generated_email"
+            )
+            conn.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS ix_{PG_TABLE}_document ON {PG_TABLE} USING GIN (document)"
+            )
+        else:
+            _fts_available[dialect] = False
+            return
+    _fts_available[dialect] = True
+    if rebuild:
+        _rebuild(engine)
+
+
+def detect_search_index(engine: Engine) -> None:
+    """Record whether the index exists without creating it (startup when the schema is current)."""
+    dialect = _dialect(engine)
+    with engine.connect() as conn:
+        if dialect == "sqlite":
+            found = conn.exec_driver_sql(
+                f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'"
+            ).first()
+        elif dialect == "postgresql":
+            found = conn.exec_driver_sql(f"SELECT to_regclass('{PG_TABLE}')").scalar()
+        else:
+            found = None
+    _fts_available[dialect] = bool(found)
+
+
+def _index_rows(conn: Connection, rows: List[Tuple[int, str, str]]) -> None:
+    if not rows:
+        return
+    params = [{"id": r[0], "prompt": r[1], "body": r[2]} for r in rows]
+    if _dialect(conn) == "sqlite":
+        conn.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, prompt, generated_email) VALUES (:id, :prompt, :body)"),
+            params,
+        )
+    else:
+        conn.execute(
+            text(
+                f"INSERT INTO {PG_TABLE} (email_id, document) "
+                f"VALUES (:id, "
+                f"setweight(to_tsvector('{PG_CONFIG}', :prompt), 'A') || "
+                f"setweight(to_tsvector('{PG_CONFIG}', :body), 'B')) "
+                f"ON CONFLICT (email_id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            params,
+        )
+
+
+# SQLite's index is maintained by its triggers; these keep the PostgreSQL side table in step.
+@event.listens_for(EmailRequest, "after_insert")
+def _index_inserted(mapper, connection: Connection, target: EmailRequest) -> None:
+    if _dialect(connection) == "postgresql" and _fts_available.get("postgresql"):
+        _index_rows(connection, [(target.id, target.prompt, target.generated_email)])
+
+
+@event.listens_for(EmailRequest, "after_update")
+def _index_updated(mapper, connection: Connection, target: EmailRequest) -> None:
+    if _dialect(connection) == "postgresql" and _fts_available.get("postgresql"):
+        _index_rows(connection, [(target.id, target.prompt, target.generated_email)])
+
+
+def backfill(engine: Engine, batch_size: int = BACKFILL_BATCH) -> int:
+    """Rebuild the index from email_requests in id order, one transaction per batch."""
+    ensure_search_index(engine)
+    if not _fts_available.get(_dialect(engine)):
+        raise RuntimeError(f"No full-text index support for dialect '{_dialect(engine)}'")
+    return _rebuild(engine, batch_size)
+
+
+def _rebuild(engine: Engine, batch_size: int = BACKFILL_BATCH) -> int:
+    with engine.begin() as conn:
+        if _dialect(engine) == "sqlite":
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')")
+        else:
+            conn.exec_driver_sql(f"DELETE FROM {PG_TABLE}")
+    total, last_id = 0, 0
+    columns = select(EmailRequest.id, EmailRequest.prompt, EmailRequest.generated_email)
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                columns.where(EmailRequest.id > last_id).order_by(EmailRequest.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            _index_rows(conn, [tuple(r) for r in rows])
+        total += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"🔎 indexed {total} emails (last id {last_id})")
+    return total
+
+
+def _fts5_query(q: str) -> Optional[str]:
+    tokens = _TOKEN.findall(q)
+    if not tokens:
+        return None
+    # Quote every token so user input can never be parsed as FTS5 syntax; prefix-match the last one.
+    parts = [f'"{t}"' for t in tokens]
+    parts[-1] += "*"
+    return " ".join(parts)
+
+
+def _stem(word: str) -> str:
+    """A rough English stem, only for deciding what to highlight (ranking is the index's)."""
+    for suffix in ("es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    for suffix in ("ing", "ed", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def highlight(q: str, *texts: str, words: int = SNIPPET_WORDS) -> str:
+    """About `words` words around the first match of `q` in the first of `texts` that has one
+    (the opening of the first text otherwise), matches wrapped in <mark>. Stemmed words match,
+    and the last term also as a prefix, like _fts5_query."""
+    terms = [t.lower() for t in _TOKEN.findall(q)]
+    stems = {_stem(t) for t in terms}
+
+    def hit(token: str) -> bool:
+        token = token.lower()
+        return _stem(token) in stems or (bool(terms) and token.startswith(terms[-1]))
+
+    spans, first = re.findall(r"\S+", texts[0]), 0
+    for candidate in texts:
+        candidate_spans = re.findall(r"\S+", candidate)
+        found = next((i for i, span in enumerate(candidate_spans) if any(hit(t) for t in _TOKEN.findall(span))), None)
+        if found is not None:
+            spans, first = candidate_spans, found
+            break
+    start = max(0, first - words // 4)
+    window = [_TOKEN.sub(lambda m: f"<mark>{m.group()}</mark>" if hit(m.group()) else m.group(), span)
+              for span in spans[start:start + words]]
+    return ("…" if start else "") + " ".join(window) + ("…" if start + words < len(spans) else "")
+
+
+def search_emails(conn: Connection, user_id: int, q: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    """Ranked hits (best first) for one user, with a highlighted snippet."""
+    dialect = _dialect(conn)
+    if _fts_available.get(dialect) and dialect == "sqlite":
+        return _search_sqlite(conn, user_id, q, limit, offset)
+    if _fts_available.get(dialect) and dialect == "postgresql":
+        return _search_pg(conn, user_id, q, limit, offset)
+    return _search_like(conn, user_id, q, limit, offset)
+
+
+def _with_snippets(rows: List[Any], snippets: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {**{k: v for k, v in row._mapping.items() if k != "generated_email"}, "snippet": snippet}
+        for row, snippet in zip(rows, snippets)
+    ]
+
+
+def _search_sqlite(conn: Connection, user_id: int, q: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    """Rank with bm25 on the contentless index (prompt weighted 2:1), then highlight the
+    page's decompressed bodies here: snippet() needs the stored text the index doesn't keep."""
+    match = _fts5_query(q)
+    if match is None:
+        return []
+    sql = text(
+        f"SELECT e.id, e.prompt, e.tone, e.length, e.created_at, e.generated_email, "
+        f"bm25({FTS_TABLE}, 2.0, 1.0) AS rank "
+        f"FROM {FTS_TABLE} JOIN email_requests e ON e.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH :match AND e.user_id = :user_id "
+        f"ORDER BY rank LIMIT :limit OFFSET :offset"
+    ).columns(prompt=CompressedText(), generated_email=CompressedText())
+    rows = conn.execute(sql, {"match": match, "user_id": user_id, "limit": limit, "offset": offset}).all()
+    return _with_snippets(rows, [highlight(q, row.generated_email, row.prompt) for row in rows])
+
+
+def _search_pg(conn: Connection, user_id: int, q: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    """Rank on the tsvector, then highlight the page's decompressed bodies in one more round trip
+    (ts_headline over the texts passed back as an array), since no plain copy is stored."""
+    sql = text(
+        f"SELECT e.id, e.prompt, e.tone, e.length, e.created_at, e.generated_email, "
+        f"-ts_rank_cd(s.document, query) AS rank "
+        f"FROM {PG_TABLE} s JOIN email_requests e ON e.id = s.email_id, "
+        f"websearch_to_tsquery('{PG_CONFIG}', :q) query "
+        f"WHERE s.document @@ query AND e.user_id = :user_id "
+        f"ORDER BY rank LIMIT :limit OFFSET :offset"
+    ).columns(prompt=CompressedText(), generated_email=CompressedText())
+    rows = conn.execute(sql, {"q": q, "user_id": user_id, "limit": limit, "offset": offset}).all()
+    if not rows:
+        return []
+    snippets = conn.execute(
+        text(
+            f"SELECT ts_headline('{PG_CONFIG}', body, websearch_to_tsquery('{PG_CONFIG}', :q), "
+            f"'{PG_HEADLINE_OPTIONS}') FROM unnest(CAST(:bodies AS TEXT[])) WITH ORDINALITY AS t(body, i) "
+            f"ORDER BY i"
+        ),
+        {"q": q, "bodies": [row.generated_email for row in rows]},
+    ).scalars().all()
+    return _with_snippets(rows, snippets)
+
+
+def _search_like(conn: Connection, user_id: int, q: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    """Substring match, newest first. Bodies are compressed at rest, so they're matched here
+    rather than with LIKE; this is the no-FTS fallback and scans the user's history."""
+    needle = q.strip().lower()
+    rows = conn.execution_options(yield_per=BACKFILL_BATCH).execute(
+        select(
+            EmailRequest.id, EmailRequest.prompt, EmailRequest.tone, EmailRequest.length,
+            EmailRequest.created_at, EmailRequest.generated_email,
+        )
+        .where(EmailRequest.user_id == user_id)
+        .order_by(EmailRequest.created_at.desc(), EmailRequest.id.desc())
+    )
+    hits: List[Dict[str, Any]] = []
+    for row in rows:
+        if needle not in row.prompt.lower() and needle not in row.generated_email.lower():
+            continue
+        if offset:
+            offset -= 1
+            continue
+        hits.append({**{k: v for k, v in row._mapping.items() if k != "generated_email"},
+                     "snippet": row.generated_email[:160], "rank": None})
+        if len(hits) >= limit:
+            break
+    rows.close()
+    return hits
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("usage: python search.py backfill")
+    from database import engine
+
+    logger.info(f"✅ Backfilled {backfill(engine)} emails into the search index.")
@@ -0,0 +1,14 @@
+# settings.py
+# .env is read once per process, here. Modules call load_env() before their os.getenv block;
+# python-dotenv never overrides variables that are already set in the environment.
+_loaded = False
+
+
+def load_env() -> None:
+    global _loaded
+    if _loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _loaded = True
@@ -0,0 +1,147 @@
+# tests/conftest.py
+# The app runs in-process against a throwaway SQLite database with the background workers
+# off; `fake_llm` stands in for the upstream model, so nothing leaves the process.
+#   cd Backend && python -m pytest
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# Settings are read at import time, so they must be in place before any app module loads.
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='autowriter-tests-'), 'test.db')}",
+    "SECRET_KEY": "test-secret",
+    "OPS_TOKEN": "test-ops",
+    "VLLM_BASE_URL": "http://127.0.0.1:9/v1",  # never called: fake_llm replaces the client
+    "BCRYPT_ROUNDS": "4",
+    "EMAIL_USER": "",
+    "EMAIL_PASS": "",
+    "LLM_WARMUP": "off",
+    "MAIL_WORKER_ENABLED": "false",
+    "JOB_WORKER_ENABLED": "false",
+    "MAINTENANCE_ENABLED": "false",
+    "GENERATION_CACHE_BACKEND": "memory",
+    "ADMISSION_STORE": "memory",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+_emails = itertools.count(1)
+
+
+class FakeLLM:
+    """Replaces `llm.chat_completion`: every call answers a new draft ("Draft <call number>: ...")
+    after `delay` seconds, so tests can tell a cached reply from a fresh one. The streamed
+    variant sends the same draft one word per `delay` and counts streams closed before the end."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.abandoned_streams = 0
+
+    async def chat_completion(self, messages, **params):
+        self.calls.append({"messages": messages, **params})
+        number = len(self.calls)
+        await asyncio.sleep(self.delay)
+        text = f"Draft {number}: {messages[-1]['content']}"
+        choices = [SimpleNamespace(index=i, message=SimpleNamespace(content=text), finish_reason="stop")
+                   for i in range(params.get("n") or 1)]
+        return SimpleNamespace(choices=choices, usage=None)
+
+    async def stream_chat_completion(self, messages, stats, **params):
+        self.calls.append({"messages": messages, "stream": True, **params})
+        n = params.get("n") or 1
+        words = f"Draft {len(self.calls)}: {messages[-1]['content']}".split(" ")
+        finished = False
+        try:
+            for position, word in enumerate(words):
+                await asyncio.sleep(self.delay)
+                if stats.first_token_at is None:
+                    stats.first_token_at = time.perf_counter()
+                for index in range(n):
+                    stats.completion_tokens += 1
+                    delta = word if position == 0 else " " + word
+                    yield (index, delta) if n > 1 else delta
+            stats.finished_at = time.perf_counter()
+            finished = True
+        finally:
+            if not finished:
+                self.abandoned_streams += 1
+
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+
+    with TestClient(main.app) as test_client:  # runs startup: schema, search index
+        yield test_client
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    from llm_client import llm
+
+    fake = FakeLLM()
+    monkeypatch.setattr(llm, "chat_completion", fake.chat_completion)
+    monkeypatch.setattr(llm, "stream_chat_completion", fake.stream_chat_completion)
+    return fake
+
+
+@pytest.fixture
+def run(client):
+    """Run a coroutine function on the app's event loop (where admission and single-flight live)."""
+    return lambda fn, *args: client.portal.call(fn, *args)
+
+
+@pytest.fixture
+def make_user(client):
+    """Factory for fresh verified users, each with its own rate bucket and history."""
+    from auth import create_access_token, hash_password
+    from database import SessionLocal
+    from models import User
+
+    def make() -> SimpleNamespace:
+        email = f"user{next(_emails)}@example.com"
+        db = SessionLocal()
+        try:
+            row = User(name="Test User", email=email, hashed_password=hash_password("password123"), is_verified=True)
+            db.add(row)
+            db.commit()
+            user_id = row.id
+        finally:
+            db.close()
+        token = create_access_token({"sub": email})
+        return SimpleNamespace(id=user_id, email=email, headers={"Authorization": f"Bearer {token}"})
+
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def add_emails():
+    """Insert history rows directly; returns their ids in insertion order."""
+    from database import SessionLocal
+    from models import EmailRequest
+
+    def add(user_id, prompts, body="Generated body"):
+        db = SessionLocal()
+        try:
+            rows = [EmailRequest(user_id=user_id, prompt=p, tone="formal", length="short", generated_email=body)
+                    for p in prompts]
+            db.add_all(rows)
+            db.commit()
+            return [row.id for row in rows]
+        finally:
+            db.close()
+
+    return add
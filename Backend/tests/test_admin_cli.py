@@ -0,0 +1,66 @@
+# tests/test_admin_cli.py
+import csv
+import json
+
+import pytest
+
+import admin_cli
+
+BODY = "Dear team,\n\n" + "Please send the signed contract by Friday. " * 12 + "\n\nThanks"
+
+
+@pytest.fixture
+def emails(user, add_emails):
+    """Five emails (compressed bodies) for `user`; returns their ids."""
+    return add_emails(user.id, [f"Contract reminder number {i}" for i in range(5)], body=BODY)
+
+
+def test_jsonl_export_streams_every_row_in_id_order(tmp_path, user, emails, make_user, add_emails):
+    add_emails(make_user().id, ["Someone else's email"])
+    out = tmp_path / "emails.jsonl"
+
+    admin_cli.main(["export", "--format", "jsonl", "--out", str(out), "--user", user.email, "--batch-size", "2"])
+
+    rows = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [row["id"] for row in rows] == emails
+    assert set(rows[0]) == set(admin_cli.EXPORT_COLUMNS)
+    assert all(row["user_email"] == user.email and row["generated_email"] == BODY for row in rows)
+
+
+def test_csv_export_without_bodies(tmp_path, user, emails):
+    out = tmp_path / "emails.csv"
+
+    admin_cli.main(["export", "--format", "csv", "--out", str(out), "--user", user.email, "--no-body"])
+
+    header, *rows = list(csv.reader(out.open(encoding="utf-8")))
+    assert header == list(admin_cli.EXPORT_COLUMNS[:-1])
+    assert [int(row[0]) for row in rows] == emails
+    assert rows[0][header.index("prompt")] == "Contract reminder number 0"
+
+
+def test_parquet_export_writes_one_row_group_per_batch(tmp_path, user, emails):
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = tmp_path / "emails.parquet"
+
+    admin_cli.main(["export", "--format", "parquet", "--out", str(out), "--user", user.email, "--batch-size", "2"])
+
+    table = pq.read_table(out)
+    assert table.column("id").to_pylist() == emails
+    assert table.column("generated_email").to_pylist() == [BODY] * 5
+    assert pq.ParquetFile(out).num_row_groups == 3
+
+
+def test_date_filters_are_half_open(tmp_path, user, emails):
+    out = tmp_path / "none.jsonl"
+
+    admin_cli.main(["export", "--out", str(out), "--user", user.email, "--until", "2000-01-01"])
+
+    assert out.read_text() == ""
+
+
+def test_stats_are_computed_per_user_tone_and_day(capsys, user, emails):
+    admin_cli.main(["stats", "--user", user.email, "--json"])
+
+    result = json.loads(capsys.readouterr().out)
+    assert result["tone_length"] == [{"tone": "formal", "length": "short", "emails": 5}]
+    assert sum(day["emails"] for day in result["per_day"]) == 5
@@ -0,0 +1,63 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+import admission
+
+
+@pytest.fixture
+def small_bucket(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "USER_RATE_PER_MIN", 1.0)
+    monkeypatch.setattr(admission, "USER_BURST", 2.0)
+
+
+def generate(client, user, prompt):
+    body = {"prompt": prompt, "tone": "friendly", "length": "short"}
+    return client.post("/api/generate", json=body, headers=user.headers)
+
+
+def test_rate_limit_answers_429_with_retry_after(client, fake_llm, user, small_bucket):
+    assert generate(client, user, "Invite the team to lunch").status_code == 200
+    assert generate(client, user, "Invite the team to lunch").status_code == 200  # cache hits count too
+
+    rejected = generate(client, user, "Invite the team to lunch")
+
+    assert rejected.status_code == 429
+    assert rejected.json()["detail"] == "Rate limit exceeded"
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert len(fake_llm.calls) == 1
+
+
+def test_rate_limit_is_per_user(client, fake_llm, make_user, small_bucket):
+    first, second = make_user(), make_user()
+    for _ in range(2):
+        generate(client, first, "Confirm the delivery date")
+
+    assert generate(client, first, "Confirm the delivery date").status_code == 429
+    assert generate(client, second, "Confirm the delivery date").status_code == 200
+
+
+def test_freed_slots_rotate_between_users(run, monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "USER_MAX_CONCURRENCY", 0)
+    controller = admission.AdmissionController(admission.MemoryAdmissionStore(), max_concurrency=1)
+
+    async def scenario():
+        granted = []
+
+        async def wait(user):
+            ticket = await controller.acquire(user)
+            granted.append(user)
+            await asyncio.sleep(0)
+            await ticket.release()
+
+        first = await controller.acquire("busy")
+        waiters = [asyncio.create_task(wait(user)) for user in ("busy", "busy", "busy", "quiet")]
+        await asyncio.sleep(0)
+        await first.release()
+        await asyncio.gather(*waiters)
+        return granted
+
+    assert run(scenario) == ["busy", "quiet", "busy", "busy"]  # not behind the whole burst
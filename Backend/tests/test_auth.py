@@ -0,0 +1,71 @@
+# tests/test_auth.py
+import time
+
+from jose import jwt
+
+import auth
+from auth import VerifiedTokenCache, create_access_token, decode_access_token
+from schemas import TokenData
+
+
+def refresh(client, token):
+    return client.post("/api/auth/refresh", headers={"X-Refresh-Token": f"Bearer {token}"})
+
+
+def test_refresh_token_is_single_use(client):
+    registered = client.post("/api/auth/register", json={
+        "name": "Refresh User", "email": "refresh@example.com", "password": "password123",
+    })
+    assert registered.status_code == 200
+    token = registered.json()["refresh_token"]
+
+    rotated = refresh(client, token)
+    assert rotated.status_code == 200
+
+    replayed = refresh(client, token)
+    assert replayed.status_code == 403
+    assert replayed.json()["detail"] == "Refresh token already used"
+
+    assert refresh(client, rotated.json()["refresh_token"]).status_code == 200
+
+
+def test_access_token_is_not_a_refresh_token(client, user):
+    access = user.headers["Authorization"][len("Bearer "):]
+
+    assert refresh(client, access).status_code == 403
+
+
+def test_verified_token_is_decoded_once(monkeypatch):
+    auth.token_cache.clear()
+    token = create_access_token({"sub": "cache@example.com"})
+    decodes = []
+    original = jwt.decode
+    monkeypatch.setattr(jwt, "decode", lambda *a, **kw: decodes.append(1) or original(*a, **kw))
+
+    first, second = decode_access_token(token), decode_access_token(token)
+
+    assert first.sub == second.sub == "cache@example.com"
+    assert len(decodes) == 1
+
+
+def test_tampered_token_misses_the_cache_and_fails():
+    token = create_access_token({"sub": "cache@example.com"})
+    assert decode_access_token(token) is not None
+
+    header, body, signature = token.split(".")
+    assert decode_access_token(f"{header}.{body}.{signature[::-1]}") is None
+
+
+def test_cache_is_bounded_and_drops_expired_entries():
+    now = int(time.time())
+    cache = VerifiedTokenCache(max_entries=2)
+    cache.put(b"a", TokenData(sub="a", exp=now + 60))
+    cache.put(b"b", TokenData(sub="b", exp=now + 60))
+    cache.get(b"a")
+    cache.put(b"c", TokenData(sub="c", exp=now + 60))
+
+    assert cache.get(b"b") is None  # least recently used
+    assert cache.get(b"a").sub == "a"
+
+    cache.put(b"d", TokenData(sub="d", exp=now - 1))
+    assert cache.get(b"d") is None
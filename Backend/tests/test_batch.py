@@ -0,0 +1,76 @@
+# tests/test_batch.py
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PROMPTS = ["Thank the speaker for the talk", "Remind the team about the offsite", "Ask for the budget numbers"]
+
+
+@pytest.fixture
+def commits():
+    """Counts session commits while the test runs."""
+    count = []
+
+    def after_commit(session):
+        count.append(session)
+
+    event.listen(Session, "after_commit", after_commit)
+    yield count
+    event.remove(Session, "after_commit", after_commit)
+
+
+@pytest.fixture
+def failing_prompt(fake_llm, monkeypatch):
+    """The upstream call fails for prompts mentioning "budget"."""
+    from llm_client import llm
+
+    async def chat_completion(messages, **params):
+        if "budget" in messages[-1]["content"]:
+            raise RuntimeError("upstream down")
+        return await fake_llm.chat_completion(messages, **params)
+
+    monkeypatch.setattr(llm, "chat_completion", chat_completion)
+
+
+def batch(client, user, stream=False):
+    items = [{"prompt": prompt, "tone": "neutral", "length": "short"} for prompt in PROMPTS]
+    return client.post("/api/generate/batch", json={"items": items}, params={"stream": stream},
+                       headers=user.headers)
+
+
+def test_ndjson_lines_then_one_transaction_for_the_saved_rows(client, user, failing_prompt, commits):
+    response = batch(client, user, stream=True)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    *items, summary = lines
+    assert sorted(line["index"] for line in items) == [0, 1, 2]
+    assert {line["index"]: line["type"] for line in items} == {0: "item", 1: "item", 2: "error"}
+    assert summary["type"] == "summary" and (summary["succeeded"], summary["failed"]) == (2, 1)
+    assert len(commits) == 1
+    history = client.get("/api/emails", headers=user.headers).json()
+    assert sorted(email["id"] for email in history) == sorted(summary["ids"].values())
+    assert {email["prompt"] for email in history} == set(PROMPTS[:2])
+
+
+def test_json_results_are_in_input_order(client, user, failing_prompt):
+    response = batch(client, user)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    assert [result["index"] for result in body["results"]] == [0, 1, 2]
+    assert [result["email"]["prompt"] for result in body["results"][:2]] == PROMPTS[:2]
+    assert body["results"][2]["email"] is None and body["results"][2]["error"]
+
+
+def test_repeated_items_share_one_upstream_call(client, fake_llm, user):
+    items = [{"prompt": "Book a table for four", "tone": "friendly", "length": "short"}] * 3
+
+    body = client.post("/api/generate/batch", json={"items": items}, headers=user.headers).json()
+
+    assert body["succeeded"] == 3
+    assert len(fake_llm.calls) == 1
+    assert len({result["email"]["id"] for result in body["results"]}) == 3  # every item still gets its row
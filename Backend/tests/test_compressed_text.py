@@ -0,0 +1,137 @@
+# tests/test_compressed_text.py
+import pytest
+from sqlalchemy import text
+
+from compressed_text import MARKER, ZLIB, ZSTD, compress_text, decompress_text, is_compressed
+from database import SessionLocal
+from models import EmailRequest
+
+LONG = "Dear team,\n\n" + "Thank you for the quick turnaround on the quarterly report. " * 20 + "\n\nBest, Sam ✉"
+
+
+def test_long_text_is_compressed_and_round_trips():
+    raw = compress_text(LONG, codec=ZLIB)
+
+    assert raw.startswith(MARKER + ZLIB) and len(raw) < len(LONG.encode())
+    assert decompress_text(raw) == LONG
+
+
+def test_short_and_legacy_values_stay_readable():
+    assert compress_text("Hi", codec=ZLIB) == b"Hi"
+    assert not is_compressed(compress_text("Hi", codec=ZLIB))
+    assert decompress_text(b"Hi") == "Hi"
+    assert decompress_text("legacy TEXT value") == "legacy TEXT value"
+    assert decompress_text(compress_text(LONG, codec=None)) == LONG
+
+
+def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+
+    raw = compress_text(LONG, codec=ZSTD)
+
+    assert raw.startswith(MARKER + ZSTD)
+    assert decompress_text(raw) == LONG
+
+
+def test_column_stores_compressed_bytes_and_reads_text(client, user):
+    db = SessionLocal()
+    try:
+        row = EmailRequest(user_id=user.id, prompt="Thank the team", tone="formal", length="long", generated_email=LONG)
+        db.add(row)
+        db.commit()
+        email_id = row.id
+        db.expunge_all()
+
+        stored = db.execute(text("SELECT generated_email FROM email_requests WHERE id = :id"), {"id": email_id}).scalar()
+        assert is_compressed(stored)
+        assert db.get(EmailRequest, email_id).generated_email == LONG
+    finally:
+        db.close()
+
+    history = client.get("/api/emails", headers=user.headers).json()
+    assert [email["generated_email"] for email in history] == [LONG]
+
+
+def stored(sql, **params):
+    db = SessionLocal()
+    try:
+        return db.execute(text(sql), params).all()
+    finally:
+        db.close()
+
+
+def search(client, user, q):
+    return [hit["id"] for hit in client.get("/api/emails/search", params={"q": q}, headers=user.headers).json()["items"]]
+
+
+def test_prompts_are_compressed_and_the_index_keeps_no_copy(client, user, add_emails):
+    (email_id,) = add_emails(user.id, [LONG], body=LONG)
+
+    ((prompt, body),) = stored("SELECT prompt, generated_email FROM email_requests WHERE id = :id", id=email_id)
+    assert is_compressed(prompt) and is_compressed(body)
+    tables = {name for (name,) in stored("SELECT name FROM sqlite_master WHERE name LIKE 'email_requests_fts%'")}
+    assert "email_requests_fts_content" not in tables  # contentless: no plain-text shadow table
+    assert stored("SELECT prompt, generated_email FROM email_requests_fts WHERE rowid = :id", id=email_id) == \
+        [(None, None)]
+    assert search(client, user, "turnaround") == [email_id]
+
+
+def test_index_follows_updates_and_deletes(client, user, add_emails):
+    keep, drop = add_emails(user.id, ["Plan the offsite", "Cancel the offsite"])
+    db = SessionLocal()
+    try:
+        db.get(EmailRequest, keep).generated_email = "The venue is booked for Thursday."
+        db.commit()
+        db.query(EmailRequest).filter(EmailRequest.id == drop).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    assert search(client, user, "venue") == [keep]
+    assert search(client, user, "offsite") == [keep]
+
+
+def test_contentful_index_is_replaced_and_rebuilt(client, user, add_emails):
+    from database import engine
+    from search import FTS_TABLE, ensure_search_index
+
+    (email_id,) = add_emails(user.id, ["Renew the parking permit"])
+    with engine.begin() as conn:  # the table as earlier versions created it, empty
+        conn.exec_driver_sql(f"DROP TRIGGER {FTS_TABLE}_ai")
+        conn.exec_driver_sql(f"DROP TRIGGER {FTS_TABLE}_au")
+        conn.exec_driver_sql(f"DROP TRIGGER {FTS_TABLE}_ad")
+        conn.exec_driver_sql(f"DROP TABLE {FTS_TABLE}")
+        conn.exec_driver_sql(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(prompt, generated_email, "
+                             f"tokenize='porter unicode61')")
+
+    ensure_search_index(engine)
+
+    ((sql,),) = stored(f"SELECT sql FROM sqlite_master WHERE name = '{FTS_TABLE}'")
+    assert "content=''" in sql
+    assert search(client, user, "parking") == [email_id]
+
+
+def test_job_results_and_legacy_prompts_are_stored_as_bytes(client, run, fake_llm, user, add_emails):
+    from database import engine
+    from db_migrations import compress_bodies
+    from jobs import job_worker
+
+    body = '{"prompt": "Welcome the new hire", "tone": "friendly", "length": "short"}\n'
+    client.post("/api/jobs", content=body, headers={**user.headers, "Content-Type": "application/x-ndjson"})
+    run(job_worker.drain)
+    assert {kind for (kind,) in stored("SELECT typeof(generated_email) FROM generation_job_items "
+                                       "WHERE generated_email IS NOT NULL")} == {"blob"}
+
+    (email_id,) = add_emails(user.id, ["placeholder"])
+    db = SessionLocal()
+    try:  # a prompt written while the column was TEXT
+        db.execute(text("UPDATE email_requests SET prompt = :p WHERE id = :id"), {"p": LONG, "id": email_id})
+        db.commit()
+    finally:
+        db.close()
+
+    compress_bodies(engine)
+
+    ((prompt,),) = stored("SELECT prompt FROM email_requests WHERE id = :id", id=email_id)
+    assert is_compressed(prompt)
+    assert search(client, user, "turnaround") == [email_id]
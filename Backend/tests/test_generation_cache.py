@@ -0,0 +1,29 @@
+# tests/test_generation_cache.py
+
+
+def generate(client, user, prompt, **params):
+    body = {"prompt": prompt, "tone": "professional", "length": "short"}
+    return client.post("/api/generate", json=body, params=params, headers=user.headers)
+
+
+def test_repeated_prompt_is_served_from_cache(client, fake_llm, user):
+    first = generate(client, user, "Ask the landlord to fix the heater")
+    second = generate(client, user, "ask the landlord   to fix the heater ")
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json()["generated_email"] == first.json()["generated_email"]
+    assert len(fake_llm.calls) == 1
+
+
+def test_fresh_bypasses_and_refreshes_cache(client, fake_llm, user):
+    first = generate(client, user, "Thank the team for the release")
+    fresh = generate(client, user, "Thank the team for the release", fresh="true")
+    again = generate(client, user, "Thank the team for the release")
+
+    assert fresh.headers["X-Cache"] == "MISS"
+    assert fresh.json()["generated_email"] != first.json()["generated_email"]
+    assert again.headers["X-Cache"] == "HIT"
+    assert again.json()["generated_email"] == fresh.json()["generated_email"]
+    assert len(fake_llm.calls) == 2
@@ -0,0 +1,77 @@
+# tests/test_jobs.py
+import json
+import time
+
+from database import run_db
+from jobs import _checkpoint, _claim, ItemOutcome, job_worker
+
+PROMPTS = ["Announce the new office hours", "Welcome the new hire", "Remind everyone about the survey"]
+
+
+def submit(client, user):
+    body = "\n".join(json.dumps({"prompt": p, "tone": "friendly", "length": "short"}) for p in PROMPTS)
+    response = client.post("/api/jobs", content=body, headers={**user.headers, "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 202
+    return response.json()["id"]
+
+
+def results(client, user, job_id):
+    response = client.get(f"/api/jobs/{job_id}/results", headers=user.headers)
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_leased_items_resume_after_a_crash(client, run, fake_llm, user):
+    job_id = submit(client, user)
+
+    async def crash_after_claim():
+        # A worker claims everything with a short lease and dies before checkpointing.
+        return await run_db(_claim, 10, 1.0)
+
+    stale = run(crash_after_claim)
+    assert len(stale) == len(PROMPTS)
+    assert run(job_worker.drain) == 0  # still leased: nobody else may take them
+    assert client.get(f"/api/jobs/{job_id}", headers=user.headers).json()["status"] == "running"
+
+    time.sleep(1.1)
+    assert run(job_worker.drain) == len(PROMPTS)
+
+    job = client.get(f"/api/jobs/{job_id}", headers=user.headers).json()
+    assert job["status"] == "completed" and job["completed_items"] == len(PROMPTS)
+    rows = results(client, user, job_id)
+    assert [row["index"] for row in rows] == [0, 1, 2]
+    assert all(row["status"] == "done" and row["generated_email"] for row in rows)
+
+    async def late_checkpoint():
+        # The crashed worker's lease is gone, so its late write-back changes nothing.
+        return await run_db(_checkpoint, [ItemOutcome(item, text="stale") for item in stale])
+
+    run(late_checkpoint)
+    assert all(row["generated_email"] != "stale" for row in results(client, user, job_id))
+    assert client.get(f"/api/jobs/{job_id}", headers=user.headers).json()["completed_items"] == len(PROMPTS)
+
+
+def test_invalid_rows_are_rejected_with_line_numbers(client, user):
+    body = '{"prompt": "Short", "tone": "friendly", "length": "short"}\nnot json\n'
+    response = client.post("/api/jobs", content=body, headers={**user.headers, "Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 422
+    assert [error["line"] for error in response.json()["detail"]] == [2]
+
+
+def test_cancelled_job_is_not_worked_and_exports_its_items(client, run, fake_llm, user):
+    job_id = submit(client, user)
+
+    cancelled = client.post(f"/api/jobs/{job_id}/cancel", headers=user.headers)
+
+    assert cancelled.status_code == 200 and cancelled.json()["status"] == "cancelled"
+    assert run(job_worker.drain) == 0
+    assert fake_llm.calls == []
+    assert [row["status"] for row in results(client, user, job_id)] == ["cancelled"] * len(PROMPTS)
+
+
+def test_jobs_are_private_to_their_owner(client, user, make_user):
+    job_id = submit(client, user)
+    other = make_user()
+
+    assert client.get(f"/api/jobs/{job_id}", headers=other.headers).status_code == 404
+    assert client.post(f"/api/jobs/{job_id}/cancel", headers=other.headers).status_code == 404
@@ -0,0 +1,133 @@
+# tests/test_llm_router.py
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from llm_client import StreamStats
+from llm_router import CircuitBreaker, LLMRouter, NoBackendAvailable
+
+
+class FakeBackend:
+    """An LLMBackend stand-in: answers with its own name after `delay`, or raises `error`
+    (for streams: after `fail_after` deltas). `waiting` biases the router's choice."""
+
+    def __init__(self, name, delay=0.0, error=None, fail_after=0, waiting=0):
+        self.name, self.model, self.base_url = name, "test-model", f"http://{name}/v1"
+        self.delay, self.error, self.fail_after = delay, error, fail_after
+        self.max_concurrency, self.in_flight, self.waiting = 4, 0, waiting
+        self.ewma_latency_s = self.ewma_ttft_s = None
+        self.calls = 0
+        self.cancelled = 0
+
+    async def chat_completion(self, messages, **params):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.name))])
+
+    async def stream_chat_completion(self, messages, stats, **params):
+        self.calls += 1
+        for i, word in enumerate([self.name, " says", " hi"]):
+            await asyncio.sleep(self.delay)
+            if self.error and i == self.fail_after:
+                raise self.error
+            yield word
+
+
+def bad_request():
+    response = httpx.Response(400, request=httpx.Request("POST", "http://a/v1/chat/completions"))
+    return openai.BadRequestError("bad request", response=response, body=None)
+
+
+def complete(router):
+    return asyncio.run(router.chat_completion([{"role": "user", "content": "Hi"}]))
+
+
+def stream(router):
+    async def collect():
+        return [delta async for delta in router.stream_chat_completion(
+            [{"role": "user", "content": "Hi"}], StreamStats())]
+    return asyncio.run(collect())
+
+
+def test_backend_failure_fails_over_to_another_node():
+    down, up = FakeBackend("a", error=RuntimeError("connection refused")), FakeBackend("b", waiting=1)
+    router = LLMRouter([down, up], hedge_after_ms=0, max_attempts=2)
+
+    assert complete(router).choices[0].message.content == "b"
+    assert (down.calls, up.calls, router.failovers) == (1, 1, 1)
+    assert router.breakers["a"].failures == 1
+
+
+def test_client_errors_are_not_retried_elsewhere():
+    rejecting, other = FakeBackend("a", error=bad_request()), FakeBackend("b", waiting=1)
+    router = LLMRouter([rejecting, other], hedge_after_ms=0, max_attempts=2)
+
+    with pytest.raises(openai.BadRequestError):
+        complete(router)
+    assert other.calls == 0 and router.breakers["a"].state == "closed"
+
+
+def test_open_circuit_is_skipped_until_its_trial_call():
+    down, up = FakeBackend("a", error=RuntimeError("timeout")), FakeBackend("b", waiting=1)
+    router = LLMRouter([down, up], hedge_after_ms=0, max_attempts=2)
+    router.breakers["a"] = CircuitBreaker("a", threshold=2, open_seconds=0.05)
+
+    complete(router)
+    complete(router)
+    assert router.breakers["a"].state == "open"
+    complete(router)
+    assert down.calls == 2  # skipped while open
+
+    asyncio.run(asyncio.sleep(0.06))
+    down.error = None
+    assert complete(router).choices[0].message.content == "a"  # the half-open trial
+    assert router.breakers["a"].state == "closed"
+
+
+def test_half_open_trial_failure_reopens_the_circuit():
+    breaker = CircuitBreaker("a", threshold=1, open_seconds=0.0)
+    breaker.on_failure()
+    breaker.on_attempt()
+    assert breaker.state == "half_open" and not breaker.available()  # one trial at a time
+
+    breaker.on_failure()
+
+    assert breaker.state == "open"
+
+
+def test_no_backend_available_when_every_circuit_is_open():
+    router = LLMRouter([FakeBackend("a")], hedge_after_ms=0)
+    router.breakers["a"] = CircuitBreaker("a", threshold=1, open_seconds=60)
+    router.breakers["a"].on_failure()
+
+    with pytest.raises(NoBackendAvailable):
+        complete(router)
+
+
+def test_stream_fails_over_only_before_the_first_delta():
+    early, up = FakeBackend("a", error=RuntimeError("reset"), fail_after=0), FakeBackend("b", waiting=1)
+    assert stream(LLMRouter([early, up], hedge_after_ms=0, max_attempts=2)) == ["b", " says", " hi"]
+
+    late, up = FakeBackend("a", error=RuntimeError("reset"), fail_after=1), FakeBackend("b", waiting=1)
+    with pytest.raises(RuntimeError):
+        stream(LLMRouter([late, up], hedge_after_ms=0, max_attempts=2))
+    assert up.calls == 0  # text was already sent from "a"
+
+
+def test_slow_call_is_hedged_on_another_node():
+    slow, fast = FakeBackend("a", delay=0.3), FakeBackend("b")
+    router = LLMRouter([slow, fast], hedge_after_ms=20, max_attempts=2)
+    router._choose = lambda exclude, stream: next(b for b in (slow, fast) if b.name not in exclude)
+
+    assert complete(router).choices[0].message.content == "b"
+    assert (router.hedges, router.hedge_wins) == (1, 1)
+    assert slow.cancelled == 1 and router.breakers["a"].state == "closed"  # the loser is not blamed
@@ -0,0 +1,138 @@
+# tests/test_mail_queue.py
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import aiosmtplib
+import pytest
+
+import mail_queue
+from database import SessionLocal
+from mail_queue import MailWorker, RateLimiter, backoff_seconds, enqueue_email
+from models import OutboundEmail
+
+
+class FakeSMTPPool:
+    """Stands in for SMTPPool: what happens to a message depends on its recipient's local part."""
+
+    size = 1
+
+    def __init__(self):
+        self.sent = []
+        self.fresh_connections = 0
+        self._stale_once = True
+
+    @asynccontextmanager
+    async def connection(self):
+        # The first connection handed out is a pooled one the server has already dropped.
+        reused, self._stale_once = self._stale_once, False
+        if not reused:
+            self.fresh_connections += 1
+        yield self, reused
+
+    async def send_message(self, message):
+        local = message["To"].split("@")[0]
+        if local.startswith("dropped") and self.fresh_connections == 0:
+            raise aiosmtplib.SMTPServerDisconnected("idle connection closed")
+        if local.startswith("busy"):
+            raise aiosmtplib.SMTPResponseException(451, "try again later")
+        if local.startswith("unknown"):
+            raise aiosmtplib.SMTPResponseException(550, "no such user")
+        self.sent.append(message["To"])
+
+    async def aclose(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def worker(client):
+    db = SessionLocal()
+    try:  # start from an empty queue (registrations elsewhere enqueue mail)
+        db.query(OutboundEmail).delete()
+        db.commit()
+    finally:
+        db.close()
+    return MailWorker(FakeSMTPPool(), RateLimiter(0, 1))
+
+
+def enqueue(*recipients):
+    db = SessionLocal()
+    try:
+        rows = [enqueue_email(db, to, "Subject", "Body") for to in recipients]
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+def load(email_id):
+    db = SessionLocal()
+    try:
+        return db.get(OutboundEmail, email_id)
+    finally:
+        db.close()
+
+
+def test_outcomes_are_sent_retried_with_backoff_or_failed(run, worker):
+    ok, busy, unknown = enqueue("ok@example.com", "busy@example.com", "unknown@example.com")
+    before = datetime.utcnow()
+
+    assert run(worker.run_once) == 3
+
+    assert load(ok).status == "sent" and load(ok).attempts == 1
+    retried = load(busy)
+    assert retried.status == "pending" and retried.attempts == 1 and "451" in retried.last_error
+    delay = (retried.next_attempt_at - before).total_seconds()
+    assert mail_queue.MAIL_BACKOFF_BASE * 0.5 - 1 <= delay <= mail_queue.MAIL_BACKOFF_BASE + 1
+    assert load(unknown).status == "failed"  # 5xx: never retried
+    assert (worker.sent, worker.retried, worker.failed) == (1, 1, 1)
+    assert run(worker.run_once) == 0  # the retry is not due yet
+
+
+def test_transient_failures_give_up_after_max_attempts(run, worker):
+    (busy,) = enqueue("busy@example.com")
+    db = SessionLocal()
+    try:
+        db.query(OutboundEmail).filter(OutboundEmail.id == busy).update(
+            {OutboundEmail.attempts: mail_queue.MAIL_MAX_ATTEMPTS - 1})
+        db.commit()
+    finally:
+        db.close()
+
+    run(worker.run_once)
+
+    row = load(busy)
+    assert row.status == "failed" and row.attempts == mail_queue.MAIL_MAX_ATTEMPTS
+
+
+def test_dropped_pooled_connection_is_retried_on_a_fresh_one(run, worker):
+    (dropped,) = enqueue("dropped@example.com")
+
+    run(worker.run_once)
+
+    assert load(dropped).status == "sent"
+    assert worker.pool.sent == ["dropped@example.com"]
+
+
+def test_lapsed_lease_is_claimed_again(run, worker):
+    (stuck,) = enqueue("ok@example.com")
+    db = SessionLocal()
+    try:  # a worker died mid-send: still "sending", lease already over
+        db.query(OutboundEmail).filter(OutboundEmail.id == stuck).update(
+            {OutboundEmail.status: "sending", OutboundEmail.next_attempt_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+    finally:
+        db.close()
+
+    assert run(worker.run_once) == 1
+    assert load(stuck).status == "sent"
+
+
+def test_backoff_doubles_and_is_capped(monkeypatch):
+    monkeypatch.setattr(mail_queue.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(mail_queue, "MAIL_BACKOFF_BASE", 30)
+    monkeypatch.setattr(mail_queue, "MAIL_BACKOFF_MAX", 200)
+
+    assert [backoff_seconds(n) for n in range(1, 6)] == [30, 60, 120, 200, 200]
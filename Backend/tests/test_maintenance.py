@@ -0,0 +1,123 @@
+# tests/test_maintenance.py
+import asyncio
+import gzip
+import json
+
+import maintenance
+from database import SessionLocal
+from maintenance import MaintenanceScheduler, Task, _delete_emails_over_cap
+from models import EmailRequest, MaintenanceTask
+
+
+def scheduler(name, run, interval=3600, holder=None):
+    worker = MaintenanceScheduler([Task(name, interval, run)])
+    if holder:
+        worker.holder = holder
+    return worker
+
+
+def task_row(name):
+    db = SessionLocal()
+    try:
+        return db.get(MaintenanceTask, name)
+    finally:
+        db.close()
+
+
+def test_only_one_worker_runs_a_task_per_lease(run):
+    calls = []
+
+    async def slow(_, task_run):
+        calls.append(task_run.scheduler.holder)
+        await asyncio.sleep(0.1)
+
+    first, second = scheduler("test-lease", slow, holder="a:1"), scheduler("test-lease", slow, holder="b:2")
+
+    async def both():
+        return await asyncio.gather(first.run_due(), second.run_due())
+
+    results = run(both)
+
+    assert len(calls) == 1 and sum(len(r) for r in results) == 1
+    row = task_row("test-lease")
+    assert row.holder is None and row.lease_until is None and row.last_run_at is not None
+
+
+def test_task_runs_again_only_when_due_or_forced(run):
+    calls = []
+
+    async def count(_, task_run):
+        calls.append(1)
+
+    worker = scheduler("test-interval", count)
+
+    assert len(run(worker.run_due)) == 1
+    assert run(worker.run_due) == []  # ran less than an interval ago
+    assert len(run(lambda: worker.run_due(["test-interval"], force=True))) == 1
+    assert len(calls) == 2
+
+
+def test_lost_lease_stops_the_run_and_leaves_the_new_holder_alone(run):
+    async def taken_over(worker, task_run):
+        db = SessionLocal()
+        try:  # another worker took the lease (ours lapsed during a long pause)
+            db.query(MaintenanceTask).filter(MaintenanceTask.name == "test-takeover").update(
+                {MaintenanceTask.holder: "other:9"})
+            db.commit()
+        finally:
+            db.close()
+        await worker.renew(task_run.name)
+
+    worker = scheduler("test-takeover", taken_over)
+
+    (result,) = run(worker.run_due)
+
+    assert result["error"].startswith("LeaseLost")
+    assert task_row("test-takeover").holder == "other:9"  # our _finish did not clear their lease
+
+
+def test_per_user_cap_deletes_oldest_in_batches_and_archives_them(run, user, add_emails, tmp_path, monkeypatch):
+    monkeypatch.setattr(maintenance, "MAINTENANCE_BATCH_SIZE", 2)
+    monkeypatch.setattr(maintenance, "MAINTENANCE_BATCH_PAUSE", 0)
+    monkeypatch.setattr(maintenance, "EMAIL_ARCHIVE_DIR", str(tmp_path))
+    ids = add_emails(user.id, [f"Status update {i}" for i in range(5)])
+    renewals = []
+
+    async def cap(worker, task_run):
+        original = worker.renew
+
+        async def renew(name):
+            renewals.append(name)
+            await original(name)
+
+        worker.renew = renew
+        await task_run.batched("emails_over_cap", _delete_emails_over_cap, user.id, 2)
+
+    (result,) = run(scheduler("test-retention", cap).run_due)
+
+    assert result["rows"] == {"emails_over_cap": 3}
+    assert len(renewals) == 1  # renewed between the full first batch and the short second one
+    db = SessionLocal()
+    try:
+        kept = db.query(EmailRequest.id).filter(EmailRequest.user_id == user.id).order_by(EmailRequest.id).all()
+    finally:
+        db.close()
+    assert [row.id for row in kept] == ids[3:]
+    (archive,) = tmp_path.iterdir()
+    with gzip.open(archive, "rt") as f:
+        archived = [json.loads(line) for line in f]
+    assert sorted(row["id"] for row in archived) == ids[:3]
+    assert archived[0]["prompt"].startswith("Status update")
+
+
+def test_stats_list_every_task_row(run):
+    async def noop(_, task_run):
+        pass
+
+    worker = scheduler("test-stats", noop)
+    run(worker.run_due)
+
+    stats = run(worker.stats)
+
+    assert "test-stats" in [row["task"] for row in stats["tasks"]]
+    assert stats["runs"] == 1 and stats["last_here"]["test-stats"]["error"] is None
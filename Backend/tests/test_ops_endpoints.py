@@ -0,0 +1,24 @@
+# tests/test_ops_endpoints.py
+import pytest
+
+OPS_PATHS = ["/metrics", "/api/llm/stats", "/api/llm/admission", "/api/llm/cache", "/api/startup",
+             "/api/mail/stats", "/api/maintenance", "/api/jobs/worker"]
+
+
+@pytest.mark.parametrize("path", OPS_PATHS)
+def test_ops_endpoints_need_the_ops_token(client, user, path):
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers=user.headers).status_code == 403  # a user token is not enough
+    assert client.get(path, headers={"X-Ops-Token": "wrong"}).status_code == 403
+    assert client.get(path, headers={"X-Ops-Token": "test-ops"}).status_code == 200
+
+
+def test_verification_url_is_logged_at_info(monkeypatch, caplog):
+    import email_utils
+
+    monkeypatch.setattr(email_utils, "LOG_VERIFICATION_URLS", True)
+    with caplog.at_level("INFO", logger="email_utils"):
+        email_utils.log_verification_url("new@example.com", "tok123")
+
+    assert [r.levelname for r in caplog.records] == ["INFO"]
+    assert "token=tok123" in caplog.records[0].getMessage()
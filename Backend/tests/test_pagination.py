@@ -0,0 +1,76 @@
+# tests/test_pagination.py
+from database import SessionLocal
+from models import EmailRequest
+
+
+def delete_email(email_id):
+    db = SessionLocal()
+    try:
+        db.query(EmailRequest).filter(EmailRequest.id == email_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def pages(client, user, limit, on_page=None):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"before": cursor} if cursor else {})}
+        response = client.get("/api/emails", params=params, headers=user.headers)
+        assert response.status_code == 200
+        page = [row["id"] for row in response.json()]
+        ids += page
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+        if on_page:
+            on_page(page)
+
+
+def test_cursor_pages_cover_history_newest_first(client, user, add_emails):
+    # Inserted in one second, so created_at ties and the id breaks them.
+    ids = add_emails(user.id, [f"prompt number {i}" for i in range(7)])
+
+    assert pages(client, user, limit=3) == sorted(ids, reverse=True)
+
+
+def test_cursor_survives_deleted_anchor(client, user, add_emails):
+    ids = add_emails(user.id, [f"prompt number {i}" for i in range(7)])
+    deleted = []
+
+    def delete_anchor(page):
+        deleted.append(page[-1])
+        delete_email(page[-1])
+
+    seen = pages(client, user, limit=2, on_page=delete_anchor)
+
+    assert seen == sorted(ids, reverse=True)
+    assert len(deleted) == 3
+
+
+def test_summary_page_and_invalid_cursor(client, user, add_emails):
+    add_emails(user.id, [f"prompt number {i}" for i in range(3)])
+
+    page = client.get("/api/emails/summary", params={"limit": 2}, headers=user.headers).json()
+    assert len(page["items"]) == 2 and page["next_cursor"]
+    assert "generated_email" not in page["items"][0]
+    rest = client.get("/api/emails/summary", params={"limit": 2, "before": page["next_cursor"]},
+                      headers=user.headers).json()
+    assert len(rest["items"]) == 1 and rest["next_cursor"] is None
+
+    assert client.get("/api/emails", params={"before": "not-a-cursor"}, headers=user.headers).status_code == 400
+
+
+def test_history_is_paged_by_default(client, user, add_emails):
+    import main
+
+    ids = sorted(add_emails(user.id, [f"prompt number {i}" for i in range(main.DEFAULT_PAGE_SIZE + 1)]),
+                 reverse=True)
+
+    default = client.get("/api/emails", headers=user.headers)
+    assert [row["id"] for row in default.json()] == ids[:main.DEFAULT_PAGE_SIZE]
+    assert default.headers["X-Next-Cursor"]
+
+    full = client.get("/api/emails", params={"all": "true", "limit": 2}, headers=user.headers)
+    assert [row["id"] for row in full.json()] == ids
+    assert "X-Next-Cursor" not in full.headers
@@ -0,0 +1,54 @@
+# tests/test_prompts.py
+import pytest
+
+import prompts
+from prompts import LENGTH_SPECS, STOP_SEQUENCES, PromptTooLong, build_prompt, count_tokens
+from schemas import EmailLength, PromptRequest
+
+
+def request(length="short", tone="formal", prompt="Ask the supplier for an updated quote"):
+    return PromptRequest(prompt=prompt, tone=tone, length=length)
+
+
+def test_decode_budget_follows_the_requested_length():
+    budgets = [build_prompt(request(length)).params["max_tokens"] for length in ("short", "medium", "long")]
+
+    assert budgets == [LENGTH_SPECS[EmailLength(length)].max_tokens for length in ("short", "medium", "long")]
+    assert budgets == sorted(budgets)
+
+
+def test_system_prompt_spells_out_tone_and_length():
+    built = build_prompt(request("medium", tone="friendly"))
+
+    system, user = built.messages
+    assert system["role"] == "system" and "friendly" in system["content"]
+    assert LENGTH_SPECS[EmailLength.MEDIUM].words in system["content"]
+    assert user == {"role": "user", "content": "Ask the supplier for an updated quote"}
+    assert built.params["stop"] == STOP_SEQUENCES
+
+
+def test_budget_is_trimmed_to_what_the_context_has_left(monkeypatch):
+    prompt_tokens = build_prompt(request("long")).prompt_tokens
+    monkeypatch.setattr(prompts, "LLM_CONTEXT_TOKENS", prompt_tokens + 100)
+
+    assert build_prompt(request("long")).params["max_tokens"] == 100
+
+
+def test_prompt_that_leaves_no_room_to_reply_is_rejected(client, fake_llm, user, monkeypatch):
+    prompt_tokens = build_prompt(request()).prompt_tokens
+    monkeypatch.setattr(prompts, "LLM_CONTEXT_TOKENS", prompt_tokens + prompts.MIN_COMPLETION_TOKENS - 1)
+
+    with pytest.raises(PromptTooLong):
+        build_prompt(request())
+    body = {"prompt": "Ask the supplier for an updated quote", "tone": "formal", "length": "short"}
+    response = client.post("/api/generate", json=body, headers=user.headers)
+
+    assert response.status_code == 413
+    assert "tokens" in response.json()["detail"]
+    assert fake_llm.calls == []
+
+
+def test_token_estimate_without_a_tokenizer_rounds_up(monkeypatch):
+    monkeypatch.setattr(prompts, "get_tokenizer", lambda: None)
+
+    assert count_tokens("abcdefg") == 3  # ~3 characters per token, never under
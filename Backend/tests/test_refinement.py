@@ -0,0 +1,88 @@
+# tests/test_refinement.py
+import refinement
+from database import SessionLocal
+from models import EmailRequest
+
+
+def generate(client, user, prompt):
+    body = {"prompt": prompt, "tone": "formal", "length": "short"}
+    return client.post("/api/generate", json=body, headers=user.headers).json()
+
+
+def refine(client, user, email_id, instruction, **changes):
+    return client.post(f"/api/emails/{email_id}/refine", json={"instruction": instruction, **changes},
+                       headers=user.headers)
+
+
+def update(email_id, **values):
+    db = SessionLocal()
+    try:
+        db.query(EmailRequest).filter(EmailRequest.id == email_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_each_step_replays_the_conversation_and_extends_it(client, fake_llm, user):
+    original = generate(client, user, "Ask for a deadline extension")
+    first = refine(client, user, original["id"], "Make it shorter")
+    second = refine(client, user, first.json()["id"], "Mention Friday", tone="friendly")
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["parent_id"] == original["id"] and second.json()["parent_id"] == first.json()["id"]
+    assert second.json()["prompt"] == "Ask for a deadline extension"  # the original prompt, not the instruction
+    assert [first.json()["metrics"]["step"], second.json()["metrics"]["step"]] == [1, 2]
+
+    generated, step1, step2 = (call["messages"] for call in fake_llm.calls)
+    assert step1[:len(generated)] == generated and step2[:len(step1)] == step1
+    assert step2[len(step1)] == {"role": "assistant", "content": first.json()["generated_email"]}
+    assert "Make it friendly." in step2[-1]["content"] and "Mention Friday." in step2[-1]["content"]
+    assert second.json()["metrics"]["prefix_tokens"] > first.json()["metrics"]["prefix_tokens"]
+
+
+def test_chain_with_a_deleted_draft_is_refused(client, fake_llm, user):
+    original = generate(client, user, "Request a new laptop")
+    first = refine(client, user, original["id"], "Make it shorter").json()
+    second = refine(client, user, first["id"], "Add a budget").json()
+    db = SessionLocal()
+    try:  # as retention would: the refinement keeps its row, parent_id goes NULL
+        db.query(EmailRequest).filter(EmailRequest.id == first["id"]).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    response = refine(client, user, second["id"], "Sign off with my name")
+
+    assert response.status_code == 409
+    assert "deleted" in response.json()["detail"]
+    assert refine(client, user, original["id"], "Sign off with my name").status_code == 200
+
+
+def test_original_from_another_prompt_version_is_refused(client, fake_llm, user):
+    original = generate(client, user, "Book the meeting room")
+    update(original["id"], prompt_version="0")
+
+    response = refine(client, user, original["id"], "Make it shorter")
+
+    assert response.status_code == 409
+    assert "older prompt template" in response.json()["detail"]
+    update(original["id"], prompt_version=None)  # written before the column existed
+    assert refine(client, user, original["id"], "Make it shorter").status_code == 200
+
+
+def test_chain_stops_at_max_steps(client, fake_llm, user, monkeypatch):
+    monkeypatch.setattr(refinement, "REFINE_MAX_STEPS", 2)
+    email_id = generate(client, user, "Thank the caterers")["id"]
+    for _ in range(2):
+        email_id = refine(client, user, email_id, "Make it warmer").json()["id"]
+
+    response = refine(client, user, email_id, "Make it warmer")
+
+    assert response.status_code == 409
+    assert "refined 2 times" in response.json()["detail"]
+
+
+def test_refining_someone_elses_email_is_not_found(client, fake_llm, user, make_user):
+    original = generate(client, make_user(), "Order office supplies")
+
+    assert refine(client, user, original["id"], "Make it shorter").status_code == 404
@@ -0,0 +1,33 @@
+# tests/test_search.py
+
+
+def test_search_ranks_own_emails_with_snippets(client, user, make_user, add_emails):
+    budget, _ = add_emails(user.id, ["Quarterly budget review with finance", "Team offsite logistics"])
+    add_emails(make_user().id, ["Budget approval for another account"])
+
+    response = client.get("/api/emails/search", params={"q": "budget"}, headers=user.headers)
+
+    assert response.status_code == 200
+    hits = response.json()["items"]
+    assert [hit["id"] for hit in hits] == [budget]
+    assert "<mark>" in hits[0]["snippet"]
+
+
+def test_search_matches_stemmed_words_in_bodies(client, user, add_emails):
+    (email_id,) = add_emails(user.id, ["Plain prompt"], body="We are rescheduling the meetings to Friday.")
+
+    hits = client.get("/api/emails/search", params={"q": "meeting"}, headers=user.headers).json()["items"]
+
+    assert [hit["id"] for hit in hits] == [email_id]
+
+
+def test_snippet_highlights_matches_around_the_first_hit():
+    from search import highlight
+
+    body = " ".join(["filler"] * 30 + ["The", "meetings", "move", "to", "Friday."] + ["filler"] * 30)
+
+    snippet = highlight("meeting fri", body)
+
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "<mark>meetings</mark>" in snippet and "<mark>Friday</mark>." in snippet
+    assert highlight("absent", "Short body", "Prompt") == "Short body"
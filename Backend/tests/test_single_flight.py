@@ -0,0 +1,84 @@
+# tests/test_single_flight.py
+import asyncio
+
+import pytest
+
+from admission import AdmissionRejected, Ticket, admission
+from generation import generate_text
+from prompts import build_prompt
+from schemas import PromptRequest
+
+
+def test_concurrent_identical_prompts_share_one_call(run, fake_llm, user):
+    fake_llm.delay = 0.2
+    prompt = build_prompt(PromptRequest(prompt="Follow up on the unpaid invoice", tone="formal", length="short"))
+
+    async def burst():
+        return await asyncio.gather(*(generate_text(prompt, user.id) for _ in range(5)))
+
+    results = run(burst)
+
+    assert len(fake_llm.calls) == 1
+    assert len({text for text, _ in results}) == 1
+    assert sorted(source for _, source in results) == ["COALESCED"] * 4 + ["MISS"]
+
+
+def test_fresh_never_joins_an_in_flight_call(run, fake_llm, user):
+    fake_llm.delay = 0.2
+    prompt = build_prompt(PromptRequest(prompt="Reschedule the design review", tone="neutral", length="short"))
+
+    async def burst():
+        return await asyncio.gather(generate_text(prompt, user.id), generate_text(prompt, user.id, fresh=True))
+
+    results = run(burst)
+
+    assert len(fake_llm.calls) == 2
+    assert [source for _, source in results] == ["MISS", "MISS"]
+
+
+def test_follower_does_not_inherit_the_leaders_rejection(run, fake_llm, make_user, monkeypatch):
+    leader, follower = make_user(), make_user()
+    fake_llm.delay = 0.1
+    prompt = build_prompt(PromptRequest(prompt="Decline the vendor's offer", tone="formal", length="short"))
+
+    async def acquire(user):
+        await asyncio.sleep(0.05)  # the follower joins while the leader is still queued
+        if user == leader.id:
+            raise AdmissionRejected("Too many queued generations", 1.0)
+        return Ticket()
+
+    monkeypatch.setattr(admission, "acquire", acquire)
+
+    async def burst():
+        first = asyncio.ensure_future(generate_text(prompt, leader.id))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(generate_text(prompt, follower.id))
+        with pytest.raises(AdmissionRejected):
+            await first
+        return await second
+
+    text, source = run(burst)
+
+    assert source == "MISS" and text.startswith("Draft")
+    assert len(fake_llm.calls) == 1
+
+
+def test_only_the_caller_that_reached_the_llm_is_charged(run, fake_llm, make_user, monkeypatch):
+    leader, follower = make_user(), make_user()
+    fake_llm.delay = 0.1
+    prompt = build_prompt(PromptRequest(prompt="Order more printer paper", tone="neutral", length="short"))
+    charged = []
+
+    async def charge(user, cost=1.0):
+        charged.append(user)
+
+    monkeypatch.setattr(admission, "charge", charge)
+
+    async def burst():
+        return await asyncio.gather(generate_text(prompt, leader.id, charge=True),
+                                    generate_text(prompt, follower.id, charge=True))
+
+    results = run(burst)
+
+    assert [source for _, source in results] == ["MISS", "COALESCED"]
+    assert charged == [leader.id]
@@ -0,0 +1,89 @@
+# tests/test_streaming.py
+import asyncio
+import json
+
+import admission
+
+
+def events(response):
+    """The (event, data) pairs of an SSE body."""
+    parsed = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+def stream(client, user, prompt):
+    body = {"prompt": prompt, "tone": "friendly", "length": "short"}
+    return client.post("/api/generate/stream", json=body, headers=user.headers)
+
+
+def test_tokens_then_done_with_the_saved_email(client, fake_llm, user):
+    response = stream(client, user, "Invite the team to the summer party")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    sent = events(response)
+    tokens = [data["text"] for event, data in sent if event == "token"]
+    (done,) = [data for event, data in sent if event == "done"]
+    assert sent[-1][0] == "done" and len(tokens) > 1
+    assert "".join(tokens) == done["email"]["generated_email"]
+    assert done["cached"] is False
+    assert done["metrics"]["ttft_ms"] is not None and done["metrics"]["completion_tokens"] == len(tokens)
+    history = client.get("/api/emails", headers=user.headers).json()
+    assert [email["id"] for email in history] == [done["email"]["id"]]
+
+
+def test_repeat_is_streamed_from_the_cache_in_one_event(client, fake_llm, user):
+    first = events(stream(client, user, "Confirm the catering order"))
+    again = events(stream(client, user, "Confirm the catering order"))
+
+    assert [event for event, _ in again] == ["token", "done"]
+    assert again[-1][1]["cached"] is True
+    assert again[0][1]["text"] == first[-1][1]["email"]["generated_email"]
+    assert len(fake_llm.calls) == 1
+
+
+def test_client_disconnect_cancels_upstream_and_frees_the_slot(client, run, fake_llm, user):
+    import main
+
+    fake_llm.delay = 0.05
+    payload = json.dumps({"prompt": "Write a long update about the migration plan for every team",
+                          "tone": "formal", "length": "short"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/generate/stream", "raw_path": b"/api/generate/stream", "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"),
+                    (b"authorization", user.headers["Authorization"].encode())],
+        "client": ("testclient", 50000), "server": ("testserver", 80),
+    }
+
+    async def disconnect_after_first_token():
+        sent, first_token = [], asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": payload, "more_body": False}
+            await first_token.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body" and message.get("body"):
+                first_token.set()
+
+        await asyncio.wait_for(main.app(scope, receive, send), timeout=5)
+        await asyncio.sleep(0.1)  # let the cancelled generator unwind
+        return sent, await admission.admission.stats()
+
+    sent, slots = run(disconnect_after_first_token)
+
+    assert sent[0]["status"] == 200
+    assert b"event: done" not in b"".join(message.get("body", b"") for message in sent)
+    assert fake_llm.abandoned_streams == 1
+    assert slots["in_flight"] == 0
+    assert client.get("/api/emails", headers=user.headers).json() == []
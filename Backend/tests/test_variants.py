@@ -0,0 +1,73 @@
+# tests/test_variants.py
+import json
+
+import admission
+from schemas import MAX_VARIANTS
+
+BODY = {"prompt": "Announce the new parking rules", "tone": "neutral", "length": "short"}
+
+
+def events(response):
+    """The (event, data) pairs of an SSE body."""
+    parsed = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+def generate(client, user, variants, path="/api/generate"):
+    return client.post(path, json={**BODY, "variants": variants}, headers=user.headers)
+
+
+def test_drafts_come_from_one_call_and_are_saved_as_a_group(client, fake_llm, user):
+    response = generate(client, user, 3)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert len(fake_llm.calls) == 1 and fake_llm.calls[0]["n"] == 3
+    assert body["id"] == body["variants"][0]["id"]
+    assert [draft["variant_group"] for draft in body["variants"]] == [body["id"]] * 3
+    history = client.get("/api/emails", headers=user.headers).json()
+    assert sorted(email["id"] for email in history) == sorted(draft["id"] for draft in body["variants"])
+
+
+def test_server_ignoring_n_is_topped_up(client, fake_llm, user, monkeypatch):
+    from llm_client import llm
+
+    async def one_choice(messages, **params):
+        params.pop("n", None)
+        return await fake_llm.chat_completion(messages, **params)
+
+    monkeypatch.setattr(llm, "chat_completion", one_choice)
+
+    body = generate(client, user, 3).json()
+
+    assert len(body["variants"]) == 3 and len(fake_llm.calls) == 3
+    assert len({draft["generated_email"] for draft in body["variants"]}) == 3
+
+
+def test_each_draft_costs_one_rate_token(client, fake_llm, user, monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "USER_RATE_PER_MIN", 1.0)
+    monkeypatch.setattr(admission, "USER_BURST", 3.0)
+
+    assert generate(client, user, 3).status_code == 200
+    assert generate(client, user, 1).status_code == 429
+
+
+def test_streamed_drafts_are_interleaved_and_all_saved(client, fake_llm, user):
+    sent = events(generate(client, user, 2, path="/api/generate/stream"))
+
+    tokens = [data for event, data in sent if event == "token"]
+    (done,) = [data for event, data in sent if event == "done"]
+    assert {token["variant"] for token in tokens} == {0, 1}
+    assert len(fake_llm.calls) == 1 and fake_llm.calls[0]["n"] == 2
+    for index, draft in enumerate(done["variants"]):
+        assert "".join(t["text"] for t in tokens if t["variant"] == index) == draft["generated_email"]
+    assert done["email"]["id"] == done["variants"][0]["id"]
+
+
+def test_variant_count_is_bounded(client, fake_llm, user):
+    assert generate(client, user, MAX_VARIANTS + 1).status_code == 422
+    assert fake_llm.calls == []
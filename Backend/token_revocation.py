@@ -0,0 +1,70 @@
+# token_revocation.py
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from metrics import Counter
+from models import RevokedToken
+
+# Each worker remembers the jtis it has seen revoked, so repeat checks skip the database.
+LOCAL_MAX_ENTRIES = 10000
+
+revocations_total = Counter("refresh_token_rotations_total", "Refresh token rotations by outcome.", ["outcome"])
+
+_recent: "OrderedDict[str, datetime]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(jti: str, expires_at: datetime) -> None:
+    with _lock:
+        _recent[jti] = expires_at
+        while len(_recent) > LOCAL_MAX_ENTRIES:
+            _recent.popitem(last=False)
+
+
+def _seen_locally(jti: str) -> bool:
+    with _lock:
+        return jti in _recent
+
+
+def revoke(db: Session, jti: str, expires_at: datetime) -> bool:
+    """Mark a refresh token used. Returns False if it already was: the primary key makes
+    this atomic across workers, so only one of two concurrent /refresh calls wins."""
+    if _seen_locally(jti):
+        revocations_total.labels("replayed").inc()
+        return False
+    db.add(RevokedToken(jti=jti, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        _remember(jti, expires_at)
+        revocations_total.labels("replayed").inc()
+        return False
+    _remember(jti, expires_at)
+    revocations_total.labels("rotated").inc()
+    return True
+
+
+def is_revoked(db: Session, jti: str) -> bool:
+    if _seen_locally(jti):
+        return True
+    return db.query(RevokedToken.jti).filter(RevokedToken.jti == jti).first() is not None
+
+
+def purge_expired(db: Session) -> int:
+    """Drop entries whose tokens have expired anyway; the list only ever holds live tokens."""
+    now = datetime.utcnow()
+    removed = db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+    db.commit()
+    forget_expired(now)
+    return removed
+
+
+def forget_expired(now: datetime) -> None:
+    with _lock:
+        for jti in [jti for jti, expires_at in _recent.items() if expires_at <= now]:
+            del _recent[jti]
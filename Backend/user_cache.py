@@ -0,0 +1,120 @@
+# user_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from settings import load_env
+from fastapi import Depends, HTTPException, status
+
+from auth import get_current_token
+from database import SessionLocal
+from metrics import Gauge, span
+from models import User
+from schemas import TokenData
+
+load_env()
+
+USER_CACHE_TTL         = float(os.getenv("USER_CACHE_TTL", 60))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10000))
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """What protected handlers need to know about the caller, without an ORM round trip."""
+    id: int
+    email: str
+    name: str
+    is_verified: bool
+    created_at: datetime
+
+
+class UserIdentityCache:
+    """Bounded LRU of email -> CurrentUser with a TTL. Sync handlers run in the threadpool, hence the lock.
+
+    The TTL bounds staleness across workers; within a worker, writes call `invalidate`.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, CurrentUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email: str) -> Optional[CurrentUser]:
+        with self._lock:
+            item = self._entries.get(email)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._entries[email]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return item[1]
+
+    def put(self, user: CurrentUser) -> None:
+        with self._lock:
+            self._entries[user.email] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str) -> None:
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl}
+
+
+user_cache = UserIdentityCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL)
+Gauge("user_cache_entries", "Resolved identities held by the auth cache.", fn=lambda: {(): len(user_cache._entries)})
+
+
+def to_identity(user: User) -> CurrentUser:
+    return CurrentUser(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        is_verified=bool(user.is_verified),
+        created_at=user.created_at,
+    )
+
+
+def lookup_user(email: str) -> Optional[CurrentUser]:
+    cached = user_cache.get(email)
+    if cached is not None:
+        return cached
+    db = SessionLocal()
+    try:
+        with span("db_user_lookup"):
+            user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            return None
+        identity = to_identity(user)
+    finally:
+        db.close()
+    user_cache.put(identity)
+    return identity
+
+
+def invalidate_user(email: str) -> None:
+    """Call after anything that changes the cached fields (profile, password, verification, deletion)."""
+    user_cache.invalidate(email)
+
+
+def get_current_user_identity(token: TokenData = Depends(get_current_token)) -> CurrentUser:
+    user = lookup_user(token.sub) if token.sub else None
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
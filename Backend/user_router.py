@@ -3,23 +3,17 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
-from schemas import UserProfileUpdate, PasswordUpdate, TokenData
-from auth import get_current_token, verify_password, hash_password
+from schemas import UserProfileUpdate, PasswordUpdate
+from auth import verify_password, hash_password
+from user_cache import CurrentUser, get_current_user_identity, invalidate_user
 
 router = APIRouter()  # mounted at /api/user
 
 @router.get("/profile")
-def get_user_profile(
-    db: Session = Depends(get_db),
-    token: TokenData = Depends(get_current_token)
-):
-    user = db.query(User).filter(User.email == token.sub).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+def get_user_profile(current: CurrentUser = Depends(get_current_user_identity)):
     return {
-        "name": user.name,
-        "email": user.email,
+        "name": current.name,
+        "email": current.email,
         "is_verified": True,
     }
 
@@ -27,9 +21,9 @@ def get_user_profile(
 def update_profile(
     profile_data: UserProfileUpdate,
     db: Session = Depends(get_db),
-    token: TokenData = Depends(get_current_token)
+    current: CurrentUser = Depends(get_current_user_identity)
 ):
-    user = db.query(User).filter(User.email == token.sub).first()
+    user = db.get(User, current.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -37,15 +31,16 @@ def update_profile(
         user.name = profile_data.name
 
     db.commit()
+    invalidate_user(user.email)
     return {"message": "Profile updated successfully"}
 
 @router.post("/change-password")
 def change_password(
     password_data: PasswordUpdate,
     db: Session = Depends(get_db),
-    token: TokenData = Depends(get_current_token)
+    current: CurrentUser = Depends(get_current_user_identity)
 ):
-    user = db.query(User).filter(User.email == token.sub).first()
+    user = db.get(User, current.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -54,4 +49,5 @@ def change_password(
 
     user.hashed_password = hash_password(password_data.new_password)
     db.commit()
+    invalidate_user(user.email)
     return {"message": "Password changed successfully"}
\ No newline at end of file
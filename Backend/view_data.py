@@ -1,16 +1,9 @@
+# view_data.py
+# Kept so the old command still works; it is now `python admin_cli.py show`, which streams
+# users and their emails as a single outer-join query read in batches.
+import sys
 
-from database import SessionLocal
-from models import User, EmailRequest
+from admin_cli import main
 
-db = SessionLocal()
-
-users = db.query(User).all()
-for user in users:
-    print(f"\nUser: {user.name} ({user.email})")
-    print(f"Created at: {user.created_at}")
-    print(f"Verified: {user.is_verified}")
-    print("Generated Emails:")
-    for email in user.emails:
-        print(f"  - Prompt: {email.prompt}")
-        print(f"    → Generated: {email.generated_email}")
-        print(f"    Created at: {email.created_at}")
+if __name__ == "__main__":
+    main(["show", *sys.argv[1:]])
@@ -23,6 +23,7 @@ export class HistoryComponent implements OnInit {
   emails: EmailResponse[] = [];
   filtered: EmailResponse[] = [];
   copiedId: number | null = null;
+  nextCursor: string | null = null;
 
   
   search = '';
@@ -47,10 +48,11 @@ export class HistoryComponent implements OnInit {
 
   fetchEmails() {
     this.loading = true;
-    this.api.getEmails().subscribe({
-      next: (list) => {
-        this.emails = list || [];
-        this.filtered = this.emails.slice();
+    this.api.getEmails(this.nextCursor).subscribe({
+      next: (page) => {
+        this.emails = this.emails.concat(page.items);
+        this.nextCursor = page.nextCursor;
+        this.onSearchChange();
         this.loading = false;
       },
       error: (err) => {
@@ -60,6 +62,10 @@ export class HistoryComponent implements OnInit {
     });
   }
 
+  loadMore() {
+    if (this.nextCursor && !this.loading) this.fetchEmails();
+  }
+
  
   toggleProfile() { this.showProfile = !this.showProfile; }
   goGenerate() { this.router.navigateByUrl('/generate'); }
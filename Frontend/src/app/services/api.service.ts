@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
 import { HttpClient, HttpHeaders, HttpParams } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, map } from 'rxjs';
 
 export interface AuthResponse {
   access_token: string;
@@ -17,6 +17,11 @@ export interface EmailResponse {
   created_at: string;
 }
 
+export interface EmailPage {
+  items: EmailResponse[];
+  nextCursor: string | null;
+}
+
 export interface UserProfile {
   id: number;
   name: string;
@@ -65,9 +70,14 @@ export class ApiService {
     return this.http.post<EmailResponse>(`${this.BASE_URL}/api/generate`, payload, { headers });
   }
 
-  getEmails(): Observable<EmailResponse[]> {
+  // One page of history, newest first; pass nextCursor back as `before` for the next page.
+  getEmails(before?: string | null, limit = 50): Observable<EmailPage> {
     const headers = this.getAuthHeaders();
-    return this.http.get<EmailResponse[]>(`${this.BASE_URL}/api/emails`, { headers });
+    let params = new HttpParams().set('limit', limit);
+    if (before) params = params.set('before', before);
+    return this.http
+      .get<EmailResponse[]>(`${this.BASE_URL}/api/emails`, { headers, params, observe: 'response' })
+      .pipe(map((res) => ({ items: res.body || [], nextCursor: res.headers.get('X-Next-Cursor') })));
   }
 
   // Profile